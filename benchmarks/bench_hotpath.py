@@ -0,0 +1,99 @@
+'''Microbenchmark of the per-event cost of spnav_poll_event().
+
+Compares the current implementation with the original one, which built
+a new spnav_event union and pointer() on every call, read the ctypes
+fields one at a time and returned dict-backed event objects.
+
+libspnav itself is replaced by spnav.bench.FakeLib, whose
+spnav_poll_event() copies a canned motion event into the buffer it is
+given, so the benchmark runs without a device or daemon.  If libspnav
+is installed, the cost of an empty spnav_poll_event() call with and
+without declared argtypes is measured as well.
+
+Run with:
+
+  python benchmarks/bench_hotpath.py [iterations]
+'''
+
+import ctypes
+import sys
+import time
+import tracemalloc
+
+import spnav
+from spnav.bench import fake_libspnav
+
+### The original implementation, for comparison
+
+class LegacyEvent(object):
+    def __init__(self, ev_type):
+        self.ev_type = ev_type
+
+class LegacyMotionEvent(LegacyEvent):
+    def __init__(self, translation, rotation, period):
+        LegacyEvent.__init__(self, spnav.SPNAV_EVENT_MOTION)
+        self.translation = tuple(translation)
+        self.rotation = tuple(rotation)
+        self.period = period
+
+def legacy_convert(c_event):
+    if c_event.type == spnav.SPNAV_EVENT_MOTION:
+        motion = c_event.motion
+        return LegacyMotionEvent(translation=(motion.x, motion.y, motion.z),
+                                 rotation=(motion.rx, motion.ry, motion.rz),
+                                 period=motion.period)
+
+def legacy_poll_event():
+    event = spnav.spnav_event()
+    ret = spnav.libspnav.spnav_poll_event(ctypes.pointer(event))
+    if ret == 0:
+        return None
+    else:
+        return legacy_convert(event)
+
+
+def time_per_call(func, iterations):
+    '''Returns the mean time of func() in nanoseconds.'''
+    start = time.perf_counter()
+    for i in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1e9 / iterations
+
+def bytes_per_result(func, iterations):
+    '''Returns the memory held by each result of func() in bytes,
+    including its slot in the list the results are kept in.'''
+    tracemalloc.start()
+    results = [func() for i in range(iterations)]
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return held / float(iterations)
+
+def report(name, func, iterations):
+    ns = time_per_call(func, iterations)
+    held = bytes_per_result(func, min(iterations, 100000))
+    print('%-28s %9.0f ns/event %7.0f bytes/event held' % (name, ns, held))
+
+def main(iterations=200000):
+    with fake_libspnav() as real_lib:
+        report('legacy spnav_poll_event', legacy_poll_event, iterations)
+        report('spnav_poll_event', spnav.spnav_poll_event, iterations)
+        report('spnav_poll_raw', spnav.spnav_poll_raw, iterations)
+
+    if real_lib is not None:
+        # Empty queue without a daemon: measures only the ctypes call
+        event = spnav.spnav_event()
+        undeclared = ctypes.CDLL(real_lib._name).spnav_poll_event
+        declared = real_lib.spnav_poll_event
+        print('%-28s %9.0f ns/call' % ('libspnav call, undeclared',
+              time_per_call(lambda: undeclared(ctypes.pointer(event)),
+                            iterations)))
+        print('%-28s %9.0f ns/call' % ('libspnav call, declared',
+              time_per_call(lambda: declared(spnav._event_ptr),
+                            iterations)))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
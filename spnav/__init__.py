@@ -1,23 +1,36 @@
 '''spnav: a ctypes wrapper for libspnav, a Space Navigator 3D mouse client'''
 
-from ctypes import cdll, c_int, c_uint, c_void_p, py_object, pointer, \
-    Structure, Union, pythonapi
-
-# OMG CALLING CPYTHON FUNCTIONS FROM INSIDE PYTHON
-pythonapi.PyCapsule_GetPointer.restype = c_void_p
-pythonapi.PyCapsule_GetPointer.argtypes = [py_object]
+from ctypes import cdll, c_char_p, c_int, c_uint, c_ulong, c_void_p, \
+    py_object, pointer, POINTER, Structure, Union
 
 import os
-on_rtd = os.environ.get('READTHEDOCS', None) == 'True'
-if on_rtd:
-    libspnav = None
-else:
-    libspnav = cdll.LoadLibrary('libspnav.so')
+import select
+import struct
+import sys
+import time
+
+# libspnav is loaded by load_libspnav() on the first connection, not on
+# import, so that programs using only the event classes, recordings or
+# the pure-Python backend never need it.
+libspnav = None
+_libspnav_missing = False
+
+# Environment variable with the path or name of the libspnav shared
+# library to load, or "none" to always use the pure-Python backend
+SPNAV_LIBRARY_ENV = 'SPNAV_LIBRARY'
+
+# Names tried before asking ctypes.util.find_library(), which is slow
+_LIBRARY_NAMES = ('libspnav.so.0', 'libspnav.so', 'libspnav.dylib')
 
 SPNAV_EVENT_ANY = 0
 SPNAV_EVENT_MOTION = 1
 SPNAV_EVENT_BUTTON = 2
 
+# Ways of merging a run of consecutive motion events into one
+SPNAV_COALESCE_LATEST = 'latest'
+SPNAV_COALESCE_SUM = 'sum'
+SPNAV_COALESCE_AVERAGE = 'average'
+
 ### Python event classes
 
 class SpnavEvent(object):
@@ -26,9 +39,18 @@ class SpnavEvent(object):
       `ev_type`: **int**
          Type of events.  Either ``SPANV_EVENT_MOTION`` or 
          ``SPNAV_EVENT_BUTTON``.
+      `timestamp`: **int**
+         ``time.monotonic_ns()`` at which the event was received from
+         libspnav or the daemon, or None if unknown.
+
+    Event classes use ``__slots__``, so events cannot be given extra
+    attributes.
     '''
-    def __init__(self, ev_type):
+    __slots__ = ('ev_type', 'timestamp')
+
+    def __init__(self, ev_type, timestamp=None):
         self.ev_type = ev_type
+        self.timestamp = timestamp
 
 class SpnavMotionEvent(SpnavEvent):
     '''Space Navigator Motion Event class
@@ -38,11 +60,17 @@ class SpnavMotionEvent(SpnavEvent):
       `rotation`: 3-tuple of ints
         Rotation torque around axes in arbitrary integer units
       `period`: **int**
-        Corresponds to spnav_event_motion.period in libspnav.
-        No idea what the meaning of the field is.
+        Corresponds to spnav_event_motion.period in libspnav: the
+        milliseconds since the previous motion event, as measured by
+        the daemon.
+      `timestamp`: **int**
+        Receive time, see ``SpnavEvent``.
     '''
-    def __init__(self, translation, rotation, period):
-        SpnavEvent.__init__(self, SPNAV_EVENT_MOTION)
+    __slots__ = ('translation', 'rotation', 'period')
+
+    def __init__(self, translation, rotation, period, timestamp=None):
+        self.ev_type = SPNAV_EVENT_MOTION
+        self.timestamp = timestamp
         self.translation = tuple(translation)
         self.rotation = tuple(rotation)
         self.period = period
@@ -61,9 +89,14 @@ class SpnavButtonEvent(SpnavEvent):
         Button number
       `press`: **bool**
         If True, button pressed down, else button released.
+      `timestamp`: **int**
+        Receive time, see ``SpnavEvent``.
     '''
-    def __init__(self, bnum, press):
-        SpnavEvent.__init__(self, SPNAV_EVENT_BUTTON)
+    __slots__ = ('bnum', 'press')
+
+    def __init__(self, bnum, press, timestamp=None):
+        self.ev_type = SPNAV_EVENT_BUTTON
+        self.timestamp = timestamp
         self.bnum = bnum
         self.press = press
 
@@ -92,7 +125,7 @@ class spnav_event_motion(Structure):
         Rotation force around each axis.  Sign of value indicates direction.
 
       `period`: **c_uint**
-        No idea what this is.
+        Milliseconds since the previous motion event.
 
       `data`: **c_void_p**
         Raw event data.  Ignore this field.
@@ -146,19 +179,272 @@ class spnav_event(Union):
                 ('motion', spnav_event_motion),
                 ('button', spnav_event_button) ]
 
-def convert_spnav_event(c_event):
+def declare_signatures(lib):
+    '''Set ``argtypes`` and ``restype`` of the libspnav functions, so
+    ctypes does not have to guess how to convert arguments on each
+    call.'''
+    event_ptr = POINTER(spnav_event)
+    signatures = [('spnav_open', [], c_int),
+                  ('spnav_close', [], c_int),
+                  ('spnav_fd', [], c_int),
+                  ('spnav_x11_open', [c_void_p, c_ulong], c_int),
+                  ('spnav_x11_window', [c_ulong], c_int),
+                  ('spnav_x11_event', [c_void_p, event_ptr], c_int),
+                  ('spnav_wait_event', [event_ptr], c_int),
+                  ('spnav_poll_event', [event_ptr], c_int),
+                  ('spnav_remove_events', [c_int], c_int)]
+    for name, argtypes, restype in signatures:
+        func = getattr(lib, name)
+        func.argtypes = argtypes
+        func.restype = restype
+
+def _library_candidates():
+    override = os.environ.get(SPNAV_LIBRARY_ENV)
+    if override:
+        if override.lower() != 'none':
+            yield override
+        return
+    for name in _LIBRARY_NAMES:
+        yield name
+    from ctypes.util import find_library
+    found = find_library('spnav')
+    if found is not None:
+        yield found
+
+def load_libspnav():
+    '''Loads libspnav, unless already loaded, and returns it.  Returns
+    None if the library cannot be found.
+
+    The library named by the ``SPNAV_LIBRARY`` environment variable is
+    loaded if set, or none at all if it is set to ``none``.  Otherwise
+    the usual shared library names are tried, then the library found by
+    ``ctypes.util.find_library('spnav')``.  Connection functions call
+    this themselves; calling it directly only tells whether libspnav is
+    available.
+    '''
+    global libspnav, _libspnav_missing
+    if libspnav is not None or _libspnav_missing:
+        return libspnav
+    for name in _library_candidates():
+        try:
+            lib = cdll.LoadLibrary(name)
+        except OSError:
+            continue
+        declare_signatures(lib)
+        libspnav = lib
+        return lib
+    _libspnav_missing = True
+    return None
+
+def _require_libspnav():
+    lib = load_libspnav()
+    if lib is None:
+        raise SpnavConnectionException('libspnav could not be loaded')
+    return lib
+
+def _open_libspnav():
+    if libspnav is None:
+        raise SpnavConnectionException(
+            'no connection open to the space navigator daemon')
+    return libspnav
+
+# Event buffer reused by every call into libspnav.  libspnav keeps a
+# single global connection and is not thread-safe, so one buffer is
+# enough.  The pointer to it is created once as well.
+_event = spnav_event()
+_event_ptr = pointer(_event)
+
+# spnav.stats.SpnavStats of the events read, while enabled by spnav_stats()
+_stats = None
+
+# spnav.unixsock, when spnav_open() fell back to it for lack of libspnav
+_fallback = None
+
+# True while the connection was opened with spnav_x11_open()
+_x11 = False
+
+def _load_numpy():
+    '''Imports NumPy on first use and defines the module attributes
+    ``numpy`` and ``spnav_event_dtype``, which are None if NumPy is not
+    installed.'''
+    global numpy, spnav_event_dtype
+    if 'numpy' in globals():
+        return numpy
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+        spnav_event_dtype = None
+        return None
+    # One Space Navigator event of either type per array element.  The
+    # x to period fields are zero for button events, and bnum and press
+    # are zero for motion events.  timestamp is the time.monotonic_ns()
+    # receive time, 0 if unknown.
+    spnav_event_dtype = numpy.dtype([('type', numpy.int32),
+                                     ('x', numpy.int32),
+                                     ('y', numpy.int32),
+                                     ('z', numpy.int32),
+                                     ('rx', numpy.int32),
+                                     ('ry', numpy.int32),
+                                     ('rz', numpy.int32),
+                                     ('period', numpy.uint32),
+                                     ('bnum', numpy.int32),
+                                     ('press', numpy.bool_),
+                                     ('timestamp', numpy.int64)])
+    return numpy
+
+def __getattr__(name):
+    # NumPy takes far longer to import than everything else, so it is
+    # only imported once something asks for it.  Afterwards both names
+    # are ordinary module attributes.
+    if name in ('numpy', 'spnav_event_dtype'):
+        _load_numpy()
+        return globals()[name]
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+def _is_array(events):
+    '''Returns True if `events` is a NumPy array, without importing
+    NumPy: nothing can be an array before it was imported.'''
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(events, np.ndarray)
+
+def events_to_array(events):
+    '''Convert a sequence of ``SpnavMotionEvent`` and ``SpnavButtonEvent``
+    instances to a NumPy array of ``spnav_event_dtype``.'''
+    if _load_numpy() is None:
+        raise SpnavException('NumPy is required to return events as an array')
+    rows = []
+    for event in events:
+        timestamp = event.timestamp or 0
+        if event.ev_type == SPNAV_EVENT_MOTION:
+            rows.append((SPNAV_EVENT_MOTION,) + event.translation
+                        + event.rotation + (event.period, 0, False,
+                                            timestamp))
+        else:
+            rows.append((SPNAV_EVENT_BUTTON, 0, 0, 0, 0, 0, 0, 0,
+                         event.bnum, event.press, timestamp))
+    return numpy.array(rows, dtype=spnav_event_dtype)
+
+_coalesce_modes = (SPNAV_COALESCE_LATEST, SPNAV_COALESCE_SUM,
+                   SPNAV_COALESCE_AVERAGE)
+
+def _merge_motion(run, mode):
+    '''Merge a list of consecutive motion events into one event.'''
+    if len(run) == 1:
+        return run[0]
+    period = sum(event.period for event in run)
+    timestamp = run[-1].timestamp
+    if mode == SPNAV_COALESCE_LATEST:
+        return SpnavMotionEvent(run[-1].translation, run[-1].rotation, period,
+                                timestamp)
+    columns = list(zip(*[event.translation + event.rotation
+                         for event in run]))
+    if mode == SPNAV_COALESCE_SUM:
+        axes = [sum(column) for column in columns]
+    else:
+        if period:
+            weights = [event.period for event in run]
+        else:
+            weights = [1] * len(run)
+        total = float(sum(weights))
+        axes = [int(round(sum(w * v for w, v in zip(weights, column))
+                          / total))
+                for column in columns]
+    return SpnavMotionEvent(axes[:3], axes[3:], period, timestamp)
+
+def _coalesce_array(events, mode):
+    _load_numpy()
+    if len(events) == 0:
+        return events.copy()
+    is_motion = events['type'] == SPNAV_EVENT_MOTION
+    # Every button event starts a new group, as does a motion event
+    # that does not follow another motion event
+    starts = numpy.ones(len(events), dtype=bool)
+    starts[1:] = ~(is_motion[1:] & is_motion[:-1])
+    starts = numpy.flatnonzero(starts)
+    ends = numpy.append(starts[1:], len(events)) - 1
+    result = events[ends]
+    period = numpy.add.reduceat(events['period'].astype(numpy.int64), starts)
+    result['period'] = period
+    if mode == SPNAV_COALESCE_LATEST:
+        return result
+    if mode == SPNAV_COALESCE_AVERAGE:
+        weights = events['period'].astype(numpy.float64)
+        # Runs without period information are averaged evenly
+        counts = numpy.add.reduceat(numpy.ones(len(events)), starts)
+        unweighted = numpy.repeat(period == 0, ends - starts + 1)
+        weights[unweighted] = 1.0
+        total = numpy.where(period == 0, counts, period)
+    for name in ('x', 'y', 'z', 'rx', 'ry', 'rz'):
+        if mode == SPNAV_COALESCE_SUM:
+            values = numpy.add.reduceat(events[name].astype(numpy.int64),
+                                        starts)
+        else:
+            values = numpy.rint(numpy.add.reduceat(events[name] * weights,
+                                                   starts) / total)
+        result[name] = values
+    return result
+
+def coalesce_events(events, mode=SPNAV_COALESCE_LATEST):
+    '''Merge each run of consecutive motion events into a single motion
+    event, leaving button events and their order relative to motion
+    untouched.  Unlike ``spnav_remove_events()``, no input is thrown away
+    entirely.
+
+      `events`: list or NumPy array
+        Events in arrival order, as returned by ``spnav_drain()``.  None
+        entries, such as the result of ``spnav_x11_event()`` for non-Space
+        Navigator X events, are skipped.
+      `mode`: **str**
+        ``SPNAV_COALESCE_LATEST`` keeps the most recent motion values.
+        ``SPNAV_COALESCE_SUM`` adds the values of all merged events.
+        ``SPNAV_COALESCE_AVERAGE`` averages them, weighted by `period`.
+        The merged event always has the total `period` of its run and
+        the `timestamp` of its last event.
+
+    Returns: a list or array of the same kind as `events`.
+    '''
+    if mode not in _coalesce_modes:
+        raise SpnavException('Invalid coalesce mode: %r' % (mode,))
+    if _is_array(events):
+        return _coalesce_array(events, mode)
+    result = []
+    run = []
+    for event in events:
+        if event is None:
+            continue
+        if event.ev_type == SPNAV_EVENT_MOTION:
+            run.append(event)
+        else:
+            if run:
+                result.append(_merge_motion(run, mode))
+                run = []
+            result.append(event)
+    if run:
+        result.append(_merge_motion(run, mode))
+    return result
+
+# The leading fields of spnav_event: type, x, y, z, rx, ry, rz and period
+# of a motion event, or type, press and bnum of a button event.  Unpacking
+# them in one go is much faster than reading the ctypes fields one by one.
+_event_fields = struct.Struct('7iI')
+
+def convert_spnav_event(c_event, timestamp=None):
     '''Convert an instance of the spnav_event C union to a pure Python
-    instance of SpnavMotionEvent or SpnavButtonEvent.'''
-    if c_event.type == SPNAV_EVENT_MOTION:
-        motion = c_event.motion
-        return SpnavMotionEvent(translation=(motion.x, motion.y, motion.z),
-                                rotation=(motion.rx, motion.ry, motion.rz),
-                                period=motion.period)
-    elif c_event.type == SPNAV_EVENT_BUTTON:
-        button = c_event.button
-        return SpnavButtonEvent(bnum=button.bnum, press=bool(button.press))
+    instance of SpnavMotionEvent or SpnavButtonEvent, received at
+    `timestamp`.'''
+    fields = _event_fields.unpack_from(c_event)
+    ev_type = fields[0]
+    if ev_type == SPNAV_EVENT_MOTION:
+        return SpnavMotionEvent(translation=fields[1:4],
+                                rotation=fields[4:7],
+                                period=fields[7],
+                                timestamp=timestamp)
+    elif ev_type == SPNAV_EVENT_BUTTON:
+        return SpnavButtonEvent(bnum=fields[2], press=bool(fields[1]),
+                                timestamp=timestamp)
     else:
-        raise SpnavException('Invalid spnav event type: %d' % c_event.type)
+        raise SpnavException('Invalid spnav event type: %d' % ev_type)
 
 class SpnavException(Exception):
     '''Base class for all ``spnav`` exceptions.'''
@@ -183,9 +469,21 @@ def spnav_open():
     connexion driver. If you wish to remain compatible, use the X11
     protocol (spnav_x11_open, see below).
 
+    If libspnav cannot be loaded, the connection is made with the
+    pure-Python ``spnav.unixsock`` backend instead, and the functions of
+    this module use it until ``spnav_close()``.
+
     Raises ``SpnavConnectionException`` if connection cannot be established.
     '''
-    if libspnav.spnav_open() == -1:
+    global _fallback, _x11
+    _x11 = False
+    lib = load_libspnav()
+    if lib is None:
+        from spnav import unixsock
+        unixsock.spnav_open()
+        unixsock._connection.stats = _stats
+        _fallback = unixsock
+    elif lib.spnav_open() == -1:
         raise SpnavConnectionException(
             'failed to connect to the space navigator daemon')
 
@@ -196,29 +494,60 @@ def spnav_fd():
     server is returned, so the result of this function is always
     reliable.  If AF_UNIX mode is used, the fd of the socket is
     returned or -1 if no connection is open / failure occured.'''
+    if _fallback is not None:
+        return _fallback.spnav_fd()
+    if libspnav is None:
+        return -1
     return libspnav.spnav_fd()
 
 def spnav_close():
     '''Closes connection to the daemon.'''
-    libspnav.spnav_close()
+    global _fallback, _x11
+    _x11 = False
+    if _fallback is not None:
+        _fallback.spnav_close()
+        _fallback = None
+    elif libspnav is not None:
+        libspnav.spnav_close()
+
+def _display_pointer(display):
+    '''Returns the address held by a ``PyCapsule``, or `display` itself
+    if it is already an address.'''
+    if isinstance(display, int):
+        return display
+    if type(display).__name__ != 'PyCapsule':
+        raise SpnavException('X11 display must be a PyCapsule or an '
+                             'address, not %s' % type(display).__name__)
+    from ctypes import pythonapi
+    # OMG CALLING CPYTHON FUNCTIONS FROM INSIDE PYTHON
+    pythonapi.PyCapsule_GetName.restype = c_char_p
+    pythonapi.PyCapsule_GetName.argtypes = [py_object]
+    pythonapi.PyCapsule_GetPointer.restype = c_void_p
+    pythonapi.PyCapsule_GetPointer.argtypes = [py_object, c_char_p]
+    # The pointer can only be read back with the capsule's own name
+    name = pythonapi.PyCapsule_GetName(display)
+    return pythonapi.PyCapsule_GetPointer(display, name)
 
 def spnav_x11_open(display, window):
     '''Opens a connection to the daemon, using the original magellan
     X11 protocol.  Any application using this protocol should be
     compatible with the proprietary 3D connexion driver too.
 
-      `display`: ``PyCObject`` containing X11 Display struct
-          X11 display pointer
+      `display`: ``PyCapsule`` or **int**
+          X11 display pointer, such as
+          ``pygame.display.get_wm_info()['display']``
       `window`: **int**
           X11 window handle
 
       Raises ``SpnavConnectionException`` if Space Navigator daemon
       cannot be contacted.
     '''
-    display_ptr = pythonapi.PyCObject_AsVoidPtr(display)
-    if libspnav.spnav_x11_open(display_ptr, window) == -1:
+    global _x11
+    lib = _require_libspnav()
+    if lib.spnav_x11_open(_display_pointer(display), window) == -1:
         raise SpnavConnectionException(
             'failed to connect to the space navigator daemon')
+    _x11 = True
 
 def spnav_x11_window(window):
     '''Sets the application window, that is to receive events by the driver.
@@ -233,37 +562,233 @@ def spnav_x11_window(window):
       `window`: **int**
         X11 window handle
     '''
-    libspnav.spnav_x11_window(window)
+    _require_libspnav().spnav_x11_window(window)
+
+def _deadline(timeout):
+    if timeout is None:
+        return None
+    return time.monotonic() + timeout
 
-def spnav_wait_event():
+def _wait_readable(fd, deadline):
+    """Waits until `fd` is readable or the ``time.monotonic()`` `deadline`
+    (None for no deadline) has passed.  Returns False on timeout."""
+    if deadline is None:
+        timeout = None
+    else:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return False
+    try:
+        return bool(select.select([fd], [], [], timeout)[0])
+    except (OSError, ValueError) as e:
+        raise SpnavWaitException('cannot wait for space navigator events: %s'
+                                 % e)
+
+def _connection_fd():
+    fd = spnav_fd()
+    if fd == -1:
+        raise SpnavWaitException(
+            'no connection open to the space navigator daemon')
+    return fd
+
+def _wait_x11(timeout):
+    '''Blocks in libspnav until an event is read into the shared buffer
+    and returns its receive time.  With the X11 protocol ``spnav_fd()``
+    is the X server connection, which is not readable while Xlib already
+    holds the events, so it cannot be waited on with ``select()``.'''
+    if timeout is not None:
+        raise SpnavWaitException('waiting with a timeout is not supported '
+                                 'with the X11 protocol')
+    if libspnav.spnav_wait_event(_event_ptr) == 0:
+        raise SpnavWaitException('zero return code from spnav_wait_event()')
+    timestamp = time.monotonic_ns()
+    if _stats is not None:
+        _stats.record_received(timestamp)
+    return timestamp
+
+def spnav_wait_event(timeout=None):
     '''Blocks waiting for Space Navigator events.
 
-       Note that the block happens inside the libspnav library, so you
-       will not be able to interrupt this function with Ctrl-C.  It is
-       almost always better to use ``spnav_poll_event()`` instead.
+       With the UNIX socket protocol, the wait happens in ``select()`` on
+       the connection file descriptor, so it uses no CPU and can be
+       interrupted with Ctrl-C.  After ``spnav_x11_open()`` it blocks
+       inside libspnav as it always did, which cannot be interrupted and
+       does not support a timeout.
+
+      `timeout`: **float**
+        Maximum time to wait in seconds.  None waits forever.
+
+       Returns: None if the timeout expired, otherwise an instance of
+       ``SpnavMotionEvent`` or ``SpnavButtonEvent``.
 
-       Returns: An instance of ``SpnavMotionEvent`` or
-       ``SpnavButtonEvent``.
+       Raises ``SpnavWaitException`` if no connection is open, or if a
+       `timeout` is given with the X11 protocol.
     '''
-    event = spnav_event()
-    ret = libspnav.spnav_wait_event(pointer(event))
-    if ret:
-        return convert_spnav_event(event)
-    else:
-        raise SpnavWaitException('zero return code from spnav_wait_event()')
+    if _x11:
+        timestamp = _wait_x11(timeout)
+        if _stats is not None:
+            _stats.record_delivered(None, timestamp)
+        return convert_spnav_event(_event, timestamp)
+    deadline = _deadline(timeout)
+    fd = _connection_fd()
+    while True:
+        event = spnav_poll_event()
+        if event is not None:
+            return event
+        if not _wait_readable(fd, deadline):
+            return None
+
+def spnav_wait_events(timeout=None, max_events=None, as_array=None,
+                      coalesce=None):
+    '''Blocks until at least one Space Navigator event is waiting, then
+    returns all waiting events like ``spnav_poll_events()``.
+
+      `timeout`: **float**
+        Maximum time to wait in seconds.  None waits forever.
+
+    See ``spnav_poll_events()`` for the other arguments.
+
+       Returns: None if the timeout expired, otherwise the events in
+       arrival order.
+
+       Raises ``SpnavWaitException`` if no connection is open, or if a
+       `timeout` is given with the X11 protocol.
+    '''
+    if _x11:
+        use_array = _use_array(as_array)
+        timestamp = _wait_x11(timeout)
+        if use_array:
+            first = _event_row(timestamp)
+        else:
+            first = convert_spnav_event(_event, timestamp)
+        if max_events is not None:
+            max_events -= 1
+        result = [first] + _read_libspnav(libspnav.spnav_poll_event,
+                                          max_events, use_array)
+        return _finish_batch(result, use_array, coalesce)
+    deadline = _deadline(timeout)
+    fd = _connection_fd()
+    while True:
+        events = spnav_poll_events(max_events, as_array, coalesce)
+        if len(events):
+            return events
+        if not _wait_readable(fd, deadline):
+            return None
 
 def spnav_poll_event():
     '''Polls for waiting for Space Navigator events.
 
        Returns: None if no waiting events, otherwise an instance of
        ``SpnavMotionEvent`` or ``SpnavButtonEvent``.
+
+       Raises ``SpnavConnectionException`` if no connection is open.
     '''
-    event = spnav_event()
-    ret = libspnav.spnav_poll_event(pointer(event))
+    if _fallback is not None:
+        return _fallback.spnav_poll_event()
+    ret = _open_libspnav().spnav_poll_event(_event_ptr)
     if ret == 0:
         return None
-    else:
-        return convert_spnav_event(event)
+    timestamp = time.monotonic_ns()
+    if _stats is not None:
+        _stats.record_received(timestamp)
+        _stats.record_delivered(None, timestamp)
+    return convert_spnav_event(_event, timestamp)
+
+def spnav_poll_raw():
+    '''Polls for waiting Space Navigator events without creating any
+    Python objects for them.
+
+       Returns: None if no waiting events, otherwise the ``spnav_event``
+       C union the event was read into.  The same union is reused by
+       every call, so its contents are only valid until the next call
+       into the ``spnav`` module.
+
+       Raises ``SpnavException`` if the connection was made without
+       libspnav.
+    '''
+    if _fallback is not None:
+        raise SpnavException('spnav_poll_raw() requires libspnav')
+    if _open_libspnav().spnav_poll_event(_event_ptr) == 0:
+        return None
+    return _event
+
+def _use_array(as_array):
+    if as_array is None:
+        return _load_numpy() is not None
+    if as_array and _load_numpy() is None:
+        raise SpnavException('NumPy is required to return events as an array')
+    return as_array
+
+def spnav_poll_events(max_events=None, as_array=None, coalesce=None):
+    '''Polls for all waiting Space Navigator events at once.
+
+      `max_events`: **int**
+        Maximum number of events to return.  If None, the whole queue
+        is drained.
+      `as_array`: **bool**
+        If True, return a NumPy array of ``spnav_event_dtype``.  If False,
+        return a list of ``SpnavMotionEvent`` and ``SpnavButtonEvent``
+        instances.  The default is to return an array when NumPy is
+        installed.
+      `coalesce`: **str**
+        If given, merge consecutive motion events with this
+        ``coalesce_events()`` mode.  `max_events` limits the number of
+        events read before merging.
+
+       Returns: the waiting events in arrival order, empty if there are
+       none.
+
+       Raises ``SpnavConnectionException`` if no connection is open.
+    '''
+    if _fallback is not None:
+        return _fallback.spnav_poll_events(max_events, as_array, coalesce)
+    poll_event = _open_libspnav().spnav_poll_event
+    use_array = _use_array(as_array)
+    result = _read_libspnav(poll_event, max_events, use_array)
+    return _finish_batch(result, use_array, coalesce)
+
+def _read_libspnav(poll_event, max_events, use_array):
+    '''Reads up to `max_events` waiting events from libspnav, as event
+    objects or rows of ``spnav_event_dtype`` fields.'''
+    result = []
+    while max_events is None or len(result) < max_events:
+        if poll_event(_event_ptr) == 0:
+            break
+        timestamp = time.monotonic_ns()
+        if _stats is not None:
+            _stats.record_received(timestamp)
+        if use_array:
+            result.append(_event_row(timestamp))
+        else:
+            result.append(convert_spnav_event(_event, timestamp))
+    return result
+
+def _event_row(timestamp):
+    '''Returns the event in the shared buffer as a tuple of
+    ``spnav_event_dtype`` fields.'''
+    fields = _event_fields.unpack_from(_event)
+    if fields[0] == SPNAV_EVENT_MOTION:
+        return fields + (0, False, timestamp)
+    elif fields[0] == SPNAV_EVENT_BUTTON:
+        return (SPNAV_EVENT_BUTTON, 0, 0, 0, 0, 0, 0, 0,
+                fields[2], bool(fields[1]), timestamp)
+    raise SpnavException('Invalid spnav event type: %d' % fields[0])
+
+def _finish_batch(result, use_array, coalesce):
+    if use_array:
+        result = numpy.array(result, dtype=spnav_event_dtype)
+    depth = len(result)
+    if coalesce is not None:
+        result = coalesce_events(result, coalesce)
+    if _stats is not None:
+        _stats.coalesced += depth - len(result)
+        _stats.record_drain(result, time.monotonic_ns(), depth)
+    return result
+
+def spnav_drain(as_array=None, coalesce=None):
+    '''Returns every waiting Space Navigator event, emptying the queue.
+    Equivalent to ``spnav_poll_events(None, as_array, coalesce)``.'''
+    return spnav_poll_events(None, as_array, coalesce)
 
 def spnav_remove_events(event_type):
     '''Removes pending Space Navigator events from the queue.
@@ -277,7 +802,31 @@ def spnav_remove_events(event_type):
         ``SPNAV_EVENT_BUTTON`` removes just motion or button events,
         respectively.  ``SPNAV_EVENT_ANY`` removes both types of events.
     '''
-    return libspnav.spnav_remove_events(event_type)
+    if _fallback is not None:
+        return _fallback.spnav_remove_events(event_type)
+    removed = _open_libspnav().spnav_remove_events(event_type)
+    if _stats is not None and removed > 0:
+        _stats.removed += removed
+    return removed
+
+def spnav_stats(enable=True):
+    '''Returns the ``spnav.stats.SpnavStats`` collecting statistics of
+    the events read through this module, starting the collection first
+    if needed.  Statistics cost a little time per event, so they are
+    not collected until this is called.
+
+      `enable`: **bool**
+        If False, stop collecting statistics and return None.
+    '''
+    global _stats
+    if not enable:
+        _stats = None
+    elif _stats is None:
+        from spnav.stats import SpnavStats
+        _stats = SpnavStats()
+    if _fallback is not None:
+        _fallback._connection.stats = _stats
+    return _stats
 
 def spnav_x11_event(xevent):
     '''Examines an arbitrary X11 event to see if it is a Space
@@ -287,9 +836,48 @@ def spnav_x11_event(xevent):
        instance of ``SpnavMotionEvent`` or ``SpnavButtonEvent`` is
        returned.
     '''
-    event = spnav_event()
-    ret = libspnav.spnav_x11_event(xevent, pointer(event))
+    ret = _require_libspnav().spnav_x11_event(xevent, _event_ptr)
     if ret == 0:
         return None
-    else:
-        return convert_spnav_event(event)
+    timestamp = time.monotonic_ns()
+    if _stats is not None:
+        _stats.record_received(timestamp)
+        _stats.record_delivered(None, timestamp)
+    return convert_spnav_event(_event, timestamp)
+
+def spnav_x11_events(xevents, as_array=None, coalesce=None):
+    '''Converts a batch of X11 events, such as everything returned by
+    ``pygame.event.get(pygame.SYSWMEVENT)``, in one call.
+
+      `xevents`: sequence
+        X11 events, or objects with the X11 event in their `event`
+        attribute like Pygame ``SYSWMEVENT`` events.  Those that are not
+        Space Navigator events are skipped.
+      `as_array`: **bool**
+        If True, return a NumPy array of ``spnav_event_dtype``, as in
+        ``spnav_poll_events()``.  The default is a list of event
+        objects.
+      `coalesce`: **str**
+        If given, merge consecutive motion events with this
+        ``coalesce_events()`` mode.  Button events are always kept.
+
+    Every event is converted through the same C buffer, and all of them
+    get the time of the call as their `timestamp`.
+
+    Returns: the Space Navigator events, in the order of `xevents`.
+    '''
+    use_array = bool(as_array) and _use_array(as_array)
+    x11_event = _require_libspnav().spnav_x11_event
+    event_ptr = _event_ptr
+    timestamp = time.monotonic_ns()
+    result = []
+    for xevent in xevents:
+        if x11_event(getattr(xevent, 'event', xevent), event_ptr) == 0:
+            continue
+        if use_array:
+            result.append(_event_row(timestamp))
+        else:
+            result.append(convert_spnav_event(_event, timestamp))
+    if _stats is not None and result:
+        _stats.record_received(timestamp, len(result))
+    return _finish_batch(result, use_array, coalesce)
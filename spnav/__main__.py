@@ -1,14 +1,371 @@
-from spnav import spnav_open, spnav_poll_event, spnav_close
+'''Command line tools for the spnav module.
 
-if __name__ == '__main__':
-    spnav_open()
+  python -m spnav [--format text|json|csv|binary] [--stats]
+    Print events from the Space Navigator, or statistics every second.
+  python -m spnav record FILE
+    Record events to a binary recording.
+  python -m spnav replay FILE
+    Serve a recording on a fake spacenavd socket.
+  python -m spnav proxy PATH
+    Share one connection with other programs through a socket at PATH.
+  python -m spnav publish NAME
+    Publish the device state in the shared memory block NAME.
+  python -m spnav forward FD
+    Send events in batches to the connected socket FD, as the child
+    process of ``spnav.process.ProcessReader``.
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import spnav
+from spnav import SPNAV_EVENT_MOTION, spnav_open
+from spnav.stats import _AXES as AXES
+
+def open_backend(socket_path):
+    '''Opens a connection and returns the backend module.  The
+    pure-Python ``spnav.unixsock`` backend is used if `socket_path` is
+    given or ``libspnav`` is not installed.'''
+    if socket_path is None and spnav.load_libspnav() is not None:
+        spnav_open()
+        return spnav
+    from spnav import unixsock
+    if socket_path is None:
+        socket_path = unixsock.SPNAV_SOCK_PATH
+    unixsock.spnav_open(socket_path)
+    return unixsock
+
+# Bytes of output buffered before it is written, and seconds output may
+# wait in the buffer
+OUTPUT_BLOCK = 65536
+OUTPUT_DELAY = 0.05
+
+class Output(object):
+    '''Collects output and writes it to the binary file `file` in
+    blocks of `block` bytes, or once the oldest data has waited `delay`
+    seconds.  `due` is the ``time.monotonic()`` by which ``flush()``
+    must be called, None if nothing is buffered.'''
+    def __init__(self, file, block=OUTPUT_BLOCK, delay=OUTPUT_DELAY):
+        self.file = file
+        self.block = block
+        self.delay = delay
+        self.due = None
+        self._chunks = []
+        self._size = 0
+
+    def write(self, data):
+        if not data:
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.block:
+            self.flush()
+        elif self.due is None:
+            self.due = time.monotonic() + self.delay
+
+    def flush(self):
+        if self._chunks:
+            self.file.write(b''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+        self.file.flush()
+        self.due = None
+
+def format_text(events):
+    return ''.join('%s\n' % event for event in events).encode()
+
+_JSON_MOTION = ('{"type": "motion", "timestamp": %d, '
+                '"translation": [%d, %d, %d], "rotation": [%d, %d, %d], '
+                '"period": %d}\n')
+_JSON_BUTTON = ('{"type": "button", "timestamp": %d, "bnum": %d, '
+                '"press": %s}\n')
+
+def format_json(events):
+    '''Formats events as JSON Lines, one object per event.'''
+    lines = []
+    for event in events:
+        if event.ev_type == SPNAV_EVENT_MOTION:
+            lines.append(_JSON_MOTION % ((event.timestamp or 0,)
+                                         + event.translation + event.rotation
+                                         + (event.period,)))
+        else:
+            lines.append(_JSON_BUTTON % (event.timestamp or 0, event.bnum,
+                                         'true' if event.press else 'false'))
+    return ''.join(lines).encode()
+
+CSV_HEADER = 'timestamp,type,x,y,z,rx,ry,rz,period,bnum,press\n'
+
+def format_csv(events):
+    '''Formats events as CSV rows with the fields of
+    ``spnav_event_dtype``, zero where they do not apply.'''
+    lines = []
+    for event in events:
+        if event.ev_type == SPNAV_EVENT_MOTION:
+            lines.append('%d,motion,%d,%d,%d,%d,%d,%d,%d,0,0\n'
+                         % ((event.timestamp or 0,) + event.translation
+                            + event.rotation + (event.period,)))
+        else:
+            lines.append('%d,button,0,0,0,0,0,0,0,%d,%d\n'
+                         % (event.timestamp or 0, event.bnum, event.press))
+    return ''.join(lines).encode()
+
+def format_binary(events):
+    '''Formats events as records of a ``spnav.record`` recording.'''
+    from spnav.record import record, encode_record
+    now = time.monotonic_ns()
+    return b''.join(record.pack(*encode_record(event.timestamp or now,
+                                                event))
+                    for event in events)
+
+FORMATS = {'text': format_text,
+           'json': format_json,
+           'csv': format_csv,
+           'binary': format_binary}
+
+def format_stats(summary, as_json):
+    '''Formats an ``IntervalStats.as_dict()`` summary.'''
+    if as_json:
+        return (json.dumps(summary, sort_keys=True) + '\n').encode()
+    depth = summary['queue_depth']
+    arrival = summary['inter_arrival_ns']
+    line = ('motion %.1f/s  button %.1f/s  queue depth mean %s max %s  '
+            'interval %s  jitter %s\n'
+            % (summary['motion_rate'] or 0, summary['button_rate'] or 0,
+               _number(depth['mean']), _number(depth['max']),
+               _ms(arrival['mean']), _ms(arrival['jitter'])))
+    axes = []
+    for name in AXES:
+        axis = summary['axes'][name]
+        if axis['mean'] is None:
+            axes.append('%s -' % name)
+        else:
+            axes.append('%s %d..%d mean %.1f'
+                        % (name, axis['min'], axis['max'], axis['mean']))
+    return (line + '  ' + '  '.join(axes) + '\n').encode()
+
+def _number(value):
+    return '-' if value is None else '%.3g' % value
+
+def _ms(ns):
+    return '-' if ns is None else '%.2f ms' % (ns / 1e6)
+
+def monitor(args):
+    from spnav.stats import IntervalStats
+    if args.stats and args.format not in ('text', 'json'):
+        sys.exit('python -m spnav: --stats prints text or json')
+    stdout = sys.stdout.buffer
+    if args.format == 'binary' and not args.stats and stdout.isatty():
+        sys.exit('python -m spnav: not writing binary data to a terminal')
+    backend = open_backend(args.socket)
+    output = Output(stdout)
+    summary = None
+    if args.stats:
+        summary = IntervalStats()
+        report = time.monotonic() + args.interval
+    elif args.format == 'binary':
+        from spnav.record import header, MAGIC, VERSION, RECORD_SIZE
+        output.write(header.pack(MAGIC, VERSION, RECORD_SIZE))
+    elif args.format == 'csv':
+        output.write(CSV_HEADER.encode())
+    encode = FORMATS[args.format]
+    end = None if args.duration is None else time.monotonic() + args.duration
+    count = 0
+    fd = backend.spnav_fd()
     try:
-        while True:
-            event = spnav_poll_event()
-            if event is not None:
-                print(event)
+        while args.count is None or count < args.count:
+            wake = [when for when in (output.due, end) if when is not None]
+            if summary is not None:
+                wake.append(report)
+            if spnav._wait_readable(fd, min(wake) if wake else None):
+                events = backend.spnav_drain(as_array=False)
+                if args.count is not None:
+                    events = events[:args.count - count]
+                count += len(events)
+                if summary is not None:
+                    summary.add(events)
+                else:
+                    output.write(encode(events))
+            now = time.monotonic()
+            if summary is not None and now >= report:
+                output.write(format_stats(summary.as_dict(),
+                                          args.format == 'json'))
+                summary.reset()
+                # Skip reports missed while stopped, say in a pager
+                while report <= now:
+                    report += args.interval
+            if output.due is not None and now >= output.due:
+                output.flush()
+            if end is not None and now >= end:
+                break
+        output.flush()
     except KeyboardInterrupt:
-        print('\nQuitting...')
+        output.flush()
+        sys.stderr.write('\nQuitting...\n')
+    except BrokenPipeError:
+        # The reader went away, as with "| head".  Point stdout at
+        # /dev/null so Python does not fail flushing it at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        backend.spnav_close()
+
+def record(args):
+    from spnav.record import record_events
+    backend = open_backend(args.socket)
+    try:
+        count = record_events(args.file, backend, args.count, args.duration)
+    finally:
+        backend.spnav_close()
+    print('Recorded %d events to %s' % (count, args.file))
+
+def replay(args):
+    from spnav.record import Replay
+    speed = None if args.max_speed else args.speed
+    with Replay(args.file, speed, args.socket, args.clients) as player:
+        print('Serving %s on %s' % (args.file, player.path))
+        try:
+            player.wait()
+        except KeyboardInterrupt:
+            print('\nQuitting...')
+
+def proxy(args):
+    from spnav.proxy import Proxy
+    backend = open_backend(args.socket)
+    try:
+        with Proxy(backend, args.path, args.max_pending,
+                   args.coalesce) as server:
+            print('Serving events on %s' % args.path)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                print('\nQuitting...')
+    finally:
+        backend.spnav_close()
+
+def publish(args):
+    from spnav.shm import StatePublisher, publish_events
+    backend = open_backend(args.socket)
+    try:
+        with StatePublisher(args.name) as publisher:
+            print('Publishing device state in %s' % publisher.name)
+            publish_events(backend, publisher)
+    finally:
+        backend.spnav_close()
+
+def forward(args):
+    import socket
+    from spnav.process import forward_events
+    sock = socket.socket(fileno=args.fd)
+    try:
+        backend = open_backend(args.socket)
+        try:
+            forward_events(backend, sock, args.max_batch)
+        finally:
+            backend.spnav_close()
+    except spnav.SpnavException as e:
+        # The parent starts a new process, a traceback would only repeat
+        # this
+        sys.exit('spnav forward: %s' % e)
+    except (BrokenPipeError, ConnectionResetError):
+        # The parent went away
+        pass
     finally:
-        spnav_close()
+        sock.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m spnav')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='read from this spacenavd socket with the '
+                        'pure-Python backend')
+    parser.add_argument('-f', '--format', default='text',
+                        choices=sorted(FORMATS),
+                        help='output format: event text, JSON Lines, CSV '
+                        'or a spnav.record recording (default: '
+                        '%(default)s)')
+    parser.add_argument('--stats', action='store_true',
+                        help='print event rates, axis ranges, queue depth '
+                        'and jitter instead of events')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between statistics (default: '
+                        '%(default)s)')
+    parser.add_argument('-n', '--count', type=int,
+                        help='stop after this many events')
+    parser.add_argument('-d', '--duration', type=float,
+                        help='stop after this many seconds')
+    parser.set_defaults(command=monitor)
+    commands = parser.add_subparsers(title='commands')
+
+    parser_record = commands.add_parser(
+        'record', help='record events to a file')
+    parser_record.add_argument('file')
+    parser_record.add_argument('--socket', metavar='PATH',
+                               help='read from this spacenavd socket with '
+                               'the pure-Python backend')
+    parser_record.add_argument('-n', '--count', type=int,
+                               help='stop after this many events')
+    parser_record.add_argument('-d', '--duration', type=float,
+                               help='stop after this many seconds')
+    parser_record.set_defaults(command=record)
+
+    parser_replay = commands.add_parser(
+        'replay', help='serve a recording on a fake spacenavd socket')
+    parser_replay.add_argument('file')
+    parser_replay.add_argument('--socket', metavar='PATH',
+                               help='socket path to serve on '
+                               '(default: a temporary path)')
+    parser_replay.add_argument('--speed', type=float, default=1.0,
+                               help='playback speed relative to the '
+                               'recording (default: %(default)s)')
+    parser_replay.add_argument('--max-speed', action='store_true',
+                               help='send all events as fast as possible')
+    parser_replay.add_argument('--clients', type=int, default=1,
+                               help='clients to wait for before playing '
+                               '(default: %(default)s)')
+    parser_replay.set_defaults(command=replay)
 
+    parser_proxy = commands.add_parser(
+        'proxy', help='share one connection with other programs')
+    parser_proxy.add_argument('path',
+                              help='socket path to serve subscribers on')
+    parser_proxy.add_argument('--socket', metavar='PATH',
+                              help='read from this spacenavd socket with '
+                              'the pure-Python backend')
+    parser_proxy.add_argument('--max-pending', type=int, default=256,
+                              help='events queued for a slow subscriber '
+                              'before motion is coalesced '
+                              '(default: %(default)s)')
+    parser_proxy.add_argument('--coalesce', default=spnav.SPNAV_COALESCE_LATEST,
+                              choices=[spnav.SPNAV_COALESCE_LATEST,
+                                       spnav.SPNAV_COALESCE_SUM,
+                                       spnav.SPNAV_COALESCE_AVERAGE],
+                              help='how to merge motion for slow '
+                              'subscribers (default: %(default)s)')
+    parser_proxy.set_defaults(command=proxy)
+
+    parser_publish = commands.add_parser(
+        'publish', help='publish the device state in shared memory')
+    parser_publish.add_argument('name', help='shared memory block name')
+    parser_publish.add_argument('--socket', metavar='PATH',
+                                help='read from this spacenavd socket with '
+                                'the pure-Python backend')
+    parser_publish.set_defaults(command=publish)
+
+    parser_forward = commands.add_parser(
+        'forward', help='send events in batches to a socket')
+    parser_forward.add_argument('fd', type=int,
+                                help='file descriptor of a connected socket')
+    parser_forward.add_argument('--socket', metavar='PATH',
+                                help='read from this spacenavd socket with '
+                                'the pure-Python backend')
+    parser_forward.add_argument('--max-batch', type=int, default=256,
+                                help='events sent in one batch at most '
+                                '(default: %(default)s)')
+    parser_forward.set_defaults(command=forward)
+
+    args = parser.parse_args(argv)
+    args.command(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+'''spnav.aio: asyncio integration for Space Navigator events
+
+Events are read when the connection file descriptor from ``spnav_fd()``
+becomes readable, so no thread or busy loop is needed::
+
+  >>> import spnav, spnav.aio
+  >>> spnav.spnav_open()
+  >>> async def main():
+  ...     async for event in spnav.aio.events():
+  ...         print(event)
+
+The functions in this module work with any module that provides
+``spnav_fd()`` and ``spnav_drain()``, which is selected with the
+`backend` argument.  The default is the ``libspnav`` based ``spnav``
+module, ``spnav.unixsock`` may be used instead.
+'''
+
+import asyncio
+import collections
+import weakref
+
+import spnav
+from spnav import SpnavException
+
+class EventReader(object):
+    '''Delivers Space Navigator events to coroutines running in an
+    asyncio event loop.
+
+    Whenever a coroutine is waiting for an event, the connection file
+    descriptor is watched with ``loop.add_reader()``.  When it becomes
+    readable all waiting events are drained at once into a queue, from
+    which they are handed out in order.
+
+      `backend`: module
+        ``spnav`` or ``spnav.unixsock``, with an open connection.
+      `loop`: asyncio event loop
+        Defaults to the running event loop.  The reader only keeps a
+        weak reference to it.
+      `coalesce`: **str**
+        If given, merge consecutive motion events in each drained batch
+        with this ``spnav.coalesce_events()`` mode.
+    '''
+    def __init__(self, backend=spnav, loop=None, coalesce=None):
+        self.backend = backend
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        # Weak, so that the reader shared through _readers does not keep
+        # its loop alive
+        self._loop = weakref.ref(loop)
+        self.coalesce = coalesce
+        self.queue = collections.deque()
+        self._waiters = collections.deque()
+        self._fd = None
+
+    @property
+    def loop(self):
+        '''The event loop of the reader, None once it was collected.'''
+        return self._loop()
+
+    def _start_reading(self):
+        if self._fd is None:
+            self._fd = self.backend.spnav_fd()
+            self.loop.add_reader(self._fd, self._on_readable)
+
+    def _stop_reading(self):
+        if self._fd is not None:
+            loop = self.loop
+            if loop is not None:
+                loop.remove_reader(self._fd)
+            self._fd = None
+
+    def _drain(self):
+        self.queue.extend(self.backend.spnav_drain(as_array=False,
+                                                   coalesce=self.coalesce))
+
+    def _on_readable(self):
+        try:
+            self._drain()
+        except SpnavException as e:
+            self._stop_reading()
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        while self._waiters and self.queue:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(self.queue.popleft())
+        if not self._waiters:
+            self._stop_reading()
+
+    async def next_event(self, timeout=None):
+        '''Waits for the next Space Navigator event.
+
+          `timeout`: **float**
+            Maximum time to wait in seconds.  None waits forever.
+
+        Returns: None if the timeout expired, otherwise an instance of
+        ``SpnavMotionEvent`` or ``SpnavButtonEvent``.
+        '''
+        if not self.queue and not self._waiters:
+            # Events may already be buffered by the backend without the
+            # file descriptor being readable.
+            self._drain()
+        if self.queue and not self._waiters:
+            return self.queue.popleft()
+        waiter = self.loop.create_future()
+        self._waiters.append(waiter)
+        self._start_reading()
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if not self._waiters:
+                self._stop_reading()
+
+    async def events(self):
+        '''Asynchronous iterator over all future Space Navigator events.'''
+        while True:
+            yield await self.next_event()
+
+    def close(self):
+        '''Stops watching the connection.  Queued events are discarded,
+        and ``get_reader()`` creates a new reader afterwards.'''
+        self._stop_reading()
+        self.queue.clear()
+        loop = self.loop
+        readers = _readers.get(loop, {}) if loop is not None else {}
+        if readers.get(self.backend) is self:
+            del readers[self.backend]
+
+
+# One shared reader per event loop and backend, so that events drained
+# for one call are not lost to the next.  Entries go away with their
+# loop, as readers only hold weak references to it.
+_readers = weakref.WeakKeyDictionary()
+
+def get_reader(backend=spnav):
+    '''Returns the ``EventReader`` for `backend` shared by all coroutines
+    in the running event loop.'''
+    loop = asyncio.get_running_loop()
+    readers = _readers.setdefault(loop, {})
+    reader = readers.get(backend)
+    if reader is None:
+        reader = readers[backend] = EventReader(backend, loop)
+    return reader
+
+async def next_event(timeout=None, backend=spnav):
+    '''Waits for the next Space Navigator event from `backend`.
+
+      `timeout`: **float**
+        Maximum time to wait in seconds.  None waits forever.
+
+    Returns: None if the timeout expired, otherwise an instance of
+    ``SpnavMotionEvent`` or ``SpnavButtonEvent``.
+    '''
+    return await get_reader(backend).next_event(timeout)
+
+def events(backend=spnav):
+    '''Returns an asynchronous iterator over all future Space Navigator
+    events from `backend`, for use with ``async for``.'''
+    return get_reader(backend).events()
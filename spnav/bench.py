@@ -0,0 +1,335 @@
+'''spnav.bench: benchmark of the different ways of reading events
+
+Every read path is driven by a synthetic event source and measured for
+throughput, delivery latency, CPU time and memory per event::
+
+  python -m spnav.bench [-n COUNT] [--rate RATE] [--json] [CASE ...]
+
+Socket based cases read from a ``spnav.testing.FakeDaemon`` running in a
+child process, so its CPU use is not counted.  The daemon stamps every
+event with its send time, from which the delivery latency is computed.
+Without ``--rate`` the daemon sends as fast as it can, and the latency
+includes the time events spend queued behind each other.
+
+The libspnav cases (``libspnav_poll``, ``x11_event`` and ``convert``)
+replace libspnav with an in-process fake that copies a canned event, so
+they measure only the cost of the Python wrapper and have no latency.
+
+Results:
+
+  `events_per_sec`
+    Events delivered per second of wall time
+  `latency_p50_us`, `latency_p99_us`
+    Median and 99th percentile time from send to delivery
+  `cpu_sec_per_million`
+    CPU seconds used by this process per million events
+  `bytes_per_event`
+    Memory held per delivered event, measured with ``tracemalloc`` in a
+    separate, shorter run that keeps all events
+'''
+
+import argparse
+import asyncio
+import contextlib
+import ctypes
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import spnav
+from spnav import unixsock, SPNAV_EVENT_MOTION
+from spnav.testing import FakeDaemon, synthetic_events, period_timestamp
+
+### Collecting results
+
+class Sink(object):
+    '''Counts delivered events and the latency of motion events.
+
+      `keep`: **bool**
+        If True, keep every delivered event instead of recording
+        latencies, for memory measurements.
+    '''
+    def __init__(self, keep=False):
+        self.count = 0
+        self.latencies = []
+        self.kept = [] if keep else None
+
+    def one(self, event, now=None):
+        self.count += 1
+        if self.kept is not None:
+            self.kept.append(event)
+        elif event.ev_type == SPNAV_EVENT_MOTION:
+            if now is None:
+                now = period_timestamp()
+            self.latencies.append((now - event.period) & 0xffffffff)
+
+    def batch(self, events):
+        now = period_timestamp()
+        for event in events:
+            self.one(event, now)
+
+    def array(self, events):
+        now = period_timestamp()
+        self.count += len(events)
+        if self.kept is not None:
+            self.kept.append(events)
+            return
+        periods = events['period'][events['type'] == SPNAV_EVENT_MOTION]
+        self.latencies.extend(((now - periods.astype('int64'))
+                               & 0xffffffff).tolist())
+
+def percentile(values, fraction):
+    '''Returns the value below which `fraction` of `values` lie, or None
+    if there are no values.'''
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+### Socket read paths, fed by a FakeDaemon in a child process
+
+def _serve(path, count, rate, ready, done):
+    daemon = FakeDaemon(path, timestamp=True)
+    daemon.start()
+    ready.set()
+    try:
+        daemon.wait_for_clients(1)
+        daemon.play(synthetic_events(count), rate)
+        daemon.wait_playback()
+        daemon.flush()
+        done.wait()
+    finally:
+        daemon.stop()
+
+class _PathBackend(object):
+    '''``spnav.unixsock`` opening a given socket path.'''
+    def __init__(self, path):
+        self.path = path
+
+    def spnav_open(self):
+        unixsock.spnav_open(self.path)
+
+    def __getattr__(self, name):
+        return getattr(unixsock, name)
+
+def read_poll(path, count, sink):
+    unixsock.spnav_open(path)
+    while sink.count < count:
+        event = unixsock.spnav_poll_event()
+        if event is not None:
+            sink.one(event)
+
+def read_wait(path, count, sink):
+    unixsock.spnav_open(path)
+    while sink.count < count:
+        sink.one(unixsock.spnav_wait_event())
+
+def read_batch(path, count, sink):
+    unixsock.spnav_open(path)
+    while sink.count < count:
+        sink.batch(unixsock.spnav_wait_events(as_array=False))
+
+def read_batch_numpy(path, count, sink):
+    unixsock.spnav_open(path)
+    while sink.count < count:
+        sink.array(unixsock.spnav_wait_events(as_array=True))
+
+def read_async(path, count, sink):
+    from spnav import aio
+    async def consume():
+        async for event in aio.events(backend=unixsock):
+            sink.one(event)
+            if sink.count >= count:
+                break
+    unixsock.spnav_open(path)
+    asyncio.run(consume())
+
+def read_threaded(path, count, sink):
+    from spnav.reader import SpnavReader
+    reader = SpnavReader(_PathBackend(path), capacity=max(count, 1))
+    reader.start()
+    try:
+        while sink.count < count:
+            event = reader.wait_event()
+            sink.one(event)
+            sink.batch(reader.drain())
+    finally:
+        reader.stop()
+
+def run_socket_case(read, count, rate, keep=False):
+    '''Runs one socket read path against a fresh daemon.  Returns the
+    sink and the wall and CPU seconds used.'''
+    tmpdir = tempfile.mkdtemp(prefix='spnav-bench-')
+    path = os.path.join(tmpdir, 'spnav.sock')
+    context = multiprocessing.get_context('fork')
+    ready, done = context.Event(), context.Event()
+    daemon = context.Process(target=_serve,
+                             args=(path, count, rate, ready, done))
+    daemon.start()
+    try:
+        ready.wait()
+        sink = Sink(keep)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            read(path, count, sink)
+        finally:
+            unixsock.spnav_close()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+    finally:
+        done.set()
+        daemon.join()
+        shutil.rmtree(tmpdir)
+    return sink, wall, cpu
+
+### libspnav read paths, with libspnav replaced by an in-process fake
+
+class FakeLib(object):
+    '''Stands in for libspnav, always returning the same motion event.'''
+    def __init__(self):
+        self.template = spnav.spnav_event()
+        self.template.type = SPNAV_EVENT_MOTION
+        motion = self.template.motion
+        motion.x, motion.y, motion.z = 1, -2, 3
+        motion.rx, motion.ry, motion.rz = -10, 20, -30
+        motion.period = period_timestamp()
+        self.size = ctypes.sizeof(spnav.spnav_event)
+
+    def spnav_poll_event(self, event_ptr):
+        ctypes.memmove(event_ptr, ctypes.byref(self.template), self.size)
+        return 1
+
+    def spnav_x11_event(self, xevent, event_ptr):
+        ctypes.memmove(event_ptr, ctypes.byref(self.template), self.size)
+        return 1
+
+def read_libspnav_poll(count, sink):
+    while sink.count < count:
+        sink.one(spnav.spnav_poll_event(), 0)
+
+def read_x11_event(count, sink):
+    xevent = b'\0' * 192
+    while sink.count < count:
+        sink.one(spnav.spnav_x11_event(xevent), 0)
+
+def read_convert(count, sink):
+    c_event = spnav.libspnav.template
+    while sink.count < count:
+        sink.one(spnav.convert_spnav_event(c_event), 0)
+
+@contextlib.contextmanager
+def fake_libspnav():
+    '''Replaces libspnav with a ``FakeLib`` for the duration of the
+    ``with`` block, and yields the real library, None if it is not
+    installed.'''
+    # Loading is lazy, so libspnav is only there once asked for
+    real_lib = spnav.load_libspnav()
+    spnav.libspnav = FakeLib()
+    try:
+        yield real_lib
+    finally:
+        spnav.libspnav = real_lib
+
+def run_fake_lib_case(read, count, rate, keep=False):
+    with fake_libspnav():
+        sink = Sink(keep)
+        wall, cpu = time.perf_counter(), time.process_time()
+        read(count, sink)
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+    # Latencies of the canned event are meaningless
+    sink.latencies = []
+    return sink, wall, cpu
+
+CASES = [('poll', run_socket_case, read_poll),
+         ('wait', run_socket_case, read_wait),
+         ('batch', run_socket_case, read_batch),
+         ('batch_numpy', run_socket_case, read_batch_numpy),
+         ('async', run_socket_case, read_async),
+         ('threaded', run_socket_case, read_threaded),
+         ('libspnav_poll', run_fake_lib_case, read_libspnav_poll),
+         ('x11_event', run_fake_lib_case, read_x11_event),
+         ('convert', run_fake_lib_case, read_convert)]
+
+def available_cases():
+    '''Returns the names of the cases that can run here.'''
+    return [name for name, runner, read in CASES
+            if name != 'batch_numpy' or spnav.numpy is not None]
+
+def run_case(name, count, rate=None, memory_count=10000):
+    '''Benchmarks the read path `name` with `count` events sent at `rate`
+    events per second (as fast as possible if None).  Returns a dict of
+    results.'''
+    runner, read = dict((n, (r, f)) for n, r, f in CASES)[name]
+    sink, wall, cpu = runner(read, count, rate)
+
+    memory_count = min(count, memory_count)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = runner(read, memory_count, rate, keep=True)[0]
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+
+    return {'case': name,
+            'events': sink.count,
+            'seconds': wall,
+            'events_per_sec': sink.count / wall,
+            'latency_p50_us': percentile(sink.latencies, 0.5),
+            'latency_p99_us': percentile(sink.latencies, 0.99),
+            'cpu_sec_per_million': cpu * 1e6 / sink.count,
+            'bytes_per_event': held / float(memory_count)}
+
+def format_table(results):
+    lines = ['%-14s %12s %10s %10s %12s %10s'
+             % ('case', 'events/s', 'p50 us', 'p99 us', 'cpu s/M', 'B/event')]
+    for r in results:
+        latency = ['-' if r[key] is None else '%d' % r[key]
+                   for key in ('latency_p50_us', 'latency_p99_us')]
+        lines.append('%-14s %12.0f %10s %10s %12.2f %10.0f'
+                     % (r['case'], r['events_per_sec'], latency[0],
+                        latency[1], r['cpu_sec_per_million'],
+                        r['bytes_per_event']))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m spnav.bench',
+        description='Benchmark the spnav event read paths.')
+    parser.add_argument('cases', nargs='*', metavar='CASE',
+                        help='cases to run (default: all of %s)'
+                        % ', '.join(available_cases()))
+    parser.add_argument('-n', '--count', type=int, default=100000,
+                        help='events per case (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='events per second sent by the fake daemon '
+                        '(default: as fast as possible)')
+    parser.add_argument('--json', action='store_true',
+                        help='write results as JSON')
+    args = parser.parse_args(argv)
+    names = args.cases or available_cases()
+    for name in names:
+        if name not in available_cases():
+            parser.error('unknown or unavailable case: %s' % name)
+
+    results = [run_case(name, args.count, args.rate) for name in names]
+    if args.json:
+        json.dump({'python': platform.python_version(),
+                   'implementation': platform.python_implementation(),
+                   'count': args.count,
+                   'rate': args.rate,
+                   'results': results}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        print(format_table(results))
+
+if __name__ == '__main__':
+    main()
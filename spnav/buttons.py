@@ -0,0 +1,213 @@
+'''spnav.buttons: button state and gestures
+
+Button events only report transitions.  A ``ButtonState`` consumes
+them, singly or in batches, and keeps the buttons held down as a
+bitmask, together with when each button was last pressed and released,
+so queries never scan a history::
+
+  >>> from spnav.buttons import ButtonState
+  >>> buttons = ButtonState(chords=[(0, 1)], long_press=0.5)
+  >>> mark = buttons.tick
+  >>> for gesture in buttons.update(spnav_drain()):
+  ...     print(gesture.kind, gesture.buttons)
+  >>> buttons.is_down(0), buttons.pressed_since(mark, 1)
+
+``update()`` also reports gestures: chords of buttons pressed together,
+long presses and double presses.  Long presses are detected by time
+rather than by an event, so ``update()`` should be called regularly,
+with an empty batch if there is nothing new; ``check()`` does just the
+time-based part.  Every call costs a few integer operations per button
+event and per button held down, and nothing per motion event, so it can
+run inline in a reader thread.
+
+Times are ``time.monotonic_ns()`` values.  Events are placed at their
+`timestamp`, or at the time of the call if they have none.
+'''
+
+import collections
+import time
+
+from spnav import SPNAV_EVENT_BUTTON, SpnavException, _is_array
+
+GESTURE_CHORD = 'chord'
+GESTURE_LONG_PRESS = 'long_press'
+GESTURE_DOUBLE_PRESS = 'double_press'
+
+class Gesture(collections.namedtuple('Gesture', 'kind buttons timestamp')):
+    '''A gesture recognized by ``ButtonState``.
+
+      `kind`: **str**
+        ``GESTURE_CHORD``, ``GESTURE_LONG_PRESS`` or
+        ``GESTURE_DOUBLE_PRESS``
+      `buttons`: tuple of ints
+        The buttons of the chord, or the one button pressed
+      `timestamp`: **int**
+        Time at which the gesture was completed
+    '''
+    __slots__ = ()
+
+class ButtonState(object):
+    '''Tracks the buttons held down and recognizes gestures.
+
+      `chords`: sequence of sequences of ints
+        Button combinations to report as ``GESTURE_CHORD`` when all of
+        their buttons are held down together.
+      `chord_window`: **float**
+        Seconds within which all buttons of a chord must be pressed.
+      `long_press`: **float**
+        Seconds a button must be held to report ``GESTURE_LONG_PRESS``,
+        or None to not report long presses.
+      `double_press`: **float**
+        Maximum seconds between two presses of a button reported as
+        ``GESTURE_DOUBLE_PRESS``, or None to not report double presses.
+
+    `buttons` is the bitmask of buttons held down, bit `n` for button
+    number `n`.  `tick` counts the calls to ``update()``; the
+    ``pressed_since()`` and ``released_since()`` queries compare against
+    a value of it saved earlier.
+    '''
+    def __init__(self, chords=(), chord_window=0.1, long_press=0.5,
+                 double_press=0.3):
+        self.chords = []
+        for chord in chords:
+            chord = tuple(sorted(set(chord)))
+            if len(chord) < 2:
+                raise SpnavException('A chord needs at least two buttons')
+            mask = 0
+            for bnum in chord:
+                mask |= 1 << bnum
+            self.chords.append((mask, chord))
+        self.chord_window_ns = int(chord_window * 1e9)
+        self.long_press_ns = (None if long_press is None
+                              else int(long_press * 1e9))
+        self.double_press_ns = (None if double_press is None
+                                else int(double_press * 1e9))
+        self.reset()
+
+    def reset(self):
+        '''Forgets all buttons and pending gestures.'''
+        self.buttons = 0
+        self.tick = 0
+        # Per button: tick of its last press and release, and time of
+        # its last press, None once it completed a double press
+        self._press_tick = {}
+        self._release_tick = {}
+        self._press_time = {}
+        # Press time of each button held down
+        self._down_since = {}
+        # Held buttons whose long press has not been reported yet
+        self._long_pending = {}
+        # Masks of the chords reported and still held
+        self._chords_held = set()
+
+    def is_down(self, bnum):
+        '''Returns True if button `bnum` is held down.'''
+        return bool(self.buttons & (1 << bnum))
+
+    def pressed_since(self, tick, bnum=None):
+        '''Returns True if button `bnum` was pressed in an ``update()``
+        after the one that left `tick` at the given value.  Without
+        `bnum`, returns the bitmask of all such buttons.'''
+        return self._since(self._press_tick, tick, bnum)
+
+    def released_since(self, tick, bnum=None):
+        '''Like ``pressed_since()``, for releases.'''
+        return self._since(self._release_tick, tick, bnum)
+
+    def _since(self, ticks, tick, bnum):
+        if bnum is not None:
+            return ticks.get(bnum, 0) > tick
+        mask = 0
+        for bnum, last in ticks.items():
+            if last > tick:
+                mask |= 1 << bnum
+        return mask
+
+    def update(self, events, now=None):
+        '''Applies a single event or a batch of events, as a list or an
+        array of ``spnav_event_dtype``, and returns the list of
+        ``Gesture`` completed, oldest first.  Motion events are
+        ignored.
+
+          `now`: **int**
+            Current time, ``time.monotonic_ns()`` if None.
+        '''
+        if now is None:
+            now = time.monotonic_ns()
+        self.tick += 1
+        gestures = []
+        if hasattr(events, 'ev_type'):
+            if events.ev_type == SPNAV_EVENT_BUTTON:
+                self._button(events.bnum, events.press,
+                             events.timestamp or now, gestures)
+        elif _is_array(events):
+            buttons = events[events['type'] == SPNAV_EVENT_BUTTON]
+            for bnum, press, timestamp in zip(buttons['bnum'].tolist(),
+                                              buttons['press'].tolist(),
+                                              buttons['timestamp'].tolist()):
+                self._button(bnum, press, timestamp or now, gestures)
+        else:
+            for event in events:
+                if event is not None and event.ev_type == SPNAV_EVENT_BUTTON:
+                    self._button(event.bnum, event.press,
+                                 event.timestamp or now, gestures)
+        if self._long_pending:
+            self._check_long(now, gestures)
+        return gestures
+
+    def check(self, now=None):
+        '''Returns the long presses completed by `now` without any new
+        events.'''
+        gestures = []
+        if self._long_pending:
+            self._check_long(time.monotonic_ns() if now is None else now,
+                             gestures)
+        return gestures
+
+    def _button(self, bnum, press, timestamp, gestures):
+        bit = 1 << bnum
+        if not press:
+            self.buttons &= ~bit
+            self._release_tick[bnum] = self.tick
+            self._down_since.pop(bnum, None)
+            pressed = self._long_pending.pop(bnum, None)
+            if (pressed is not None
+                    and timestamp - pressed >= self.long_press_ns):
+                # Held long enough, but released before a check
+                gestures.append(Gesture(GESTURE_LONG_PRESS, (bnum,),
+                                        pressed + self.long_press_ns))
+            if self._chords_held:
+                self._chords_held = set(mask for mask in self._chords_held
+                                        if not mask & bit)
+            return
+        if self.buttons & bit:
+            # A repeated press without a release in between
+            return
+        self.buttons |= bit
+        self._press_tick[bnum] = self.tick
+        self._down_since[bnum] = timestamp
+        previous = self._press_time.get(bnum)
+        self._press_time[bnum] = timestamp
+        if self.long_press_ns is not None:
+            self._long_pending[bnum] = timestamp
+        if (self.double_press_ns is not None and previous is not None
+                and timestamp - previous <= self.double_press_ns):
+            gestures.append(Gesture(GESTURE_DOUBLE_PRESS, (bnum,),
+                                    timestamp))
+            # A third press starts a new double press
+            self._press_time[bnum] = None
+        for mask, chord in self.chords:
+            if (mask & bit and self.buttons & mask == mask
+                    and mask not in self._chords_held):
+                first = min(self._down_since[b] for b in chord)
+                if timestamp - first <= self.chord_window_ns:
+                    self._chords_held.add(mask)
+                    gestures.append(Gesture(GESTURE_CHORD, chord, timestamp))
+
+    def _check_long(self, now, gestures):
+        due = [(pressed, bnum) for bnum, pressed in self._long_pending.items()
+               if now - pressed >= self.long_press_ns]
+        for pressed, bnum in sorted(due):
+            del self._long_pending[bnum]
+            gestures.append(Gesture(GESTURE_LONG_PRESS, (bnum,),
+                                    pressed + self.long_press_ns))
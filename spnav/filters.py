@@ -0,0 +1,329 @@
+'''spnav.filters: conditioning of motion values
+
+A ``Pipeline`` chains filter stages and runs them over the six motion
+axes x, y, z, rx, ry and rz::
+
+  >>> from spnav.filters import *
+  >>> pipeline = Pipeline(Deadzone(20), Sensitivity(0.5), Invert('y'),
+  ...                     Expo(0.3), EMA(time_constant=0.05))
+  >>> values = pipeline(spnav_drain())     # (N, 6) float array
+  >>> values = pipeline(spnav_wait_event())   # 6-tuple of floats
+
+Batches, either lists of events or arrays of ``spnav_event_dtype``, are
+processed with NumPy, one vectorized step per stage.  Single events
+take a scalar path in plain Python, which is faster for six values and
+works without NumPy.  Button events are ignored.  Filters with state,
+such as ``EMA`` and ``OneEuro``, carry it from one call to the next,
+whichever path is used.
+
+The time step of each motion event is taken from its `period`, in
+milliseconds.  ``Pipeline(default_period=...)`` is used for events
+without one.
+'''
+
+import math
+
+from spnav import SPNAV_EVENT_MOTION, SpnavException, numpy
+
+AXES = ('x', 'y', 'z', 'rx', 'ry', 'rz')
+
+def _axis_index(axis):
+    if isinstance(axis, int):
+        return axis
+    try:
+        return AXES.index(axis)
+    except ValueError:
+        raise SpnavException('Invalid axis: %r' % (axis,))
+
+def _per_axis(value):
+    '''Returns a 6-tuple of floats from a number or a sequence of six.'''
+    if isinstance(value, (int, float)):
+        return (float(value),) * 6
+    value = tuple(float(v) for v in value)
+    if len(value) != 6:
+        raise SpnavException('Expected a value for each of the 6 axes')
+    return value
+
+def _axis_mask(axes):
+    mask = [False] * 6
+    for axis in axes:
+        mask[_axis_index(axis)] = True
+    return tuple(mask)
+
+class Filter(object):
+    '''Base class of pipeline stages.
+
+    ``apply()`` processes an (N, 6) float array of motion values with the
+    time step of each row in seconds, ``apply_one()`` a list of six
+    floats.  Both return the result, and may modify their input.
+    '''
+    def apply(self, values, dt):
+        raise NotImplementedError
+
+    def apply_one(self, values, dt):
+        raise NotImplementedError
+
+    def reset(self):
+        '''Forgets any state carried over from earlier input.'''
+        pass
+
+class Deadzone(Filter):
+    '''Zeroes values within `threshold` of zero and moves the others
+    towards zero by `threshold`, so there is no step at its edge.
+
+      `threshold`: number or 6 numbers
+        Dead zone size, for all axes or per axis.
+    '''
+    def __init__(self, threshold):
+        self.threshold = _per_axis(threshold)
+
+    def apply(self, values, dt):
+        magnitude = numpy.maximum(numpy.abs(values) - self.threshold, 0.0)
+        return numpy.copysign(magnitude, values)
+
+    def apply_one(self, values, dt):
+        return [math.copysign(max(abs(v) - t, 0.0), v)
+                for v, t in zip(values, self.threshold)]
+
+class Sensitivity(Filter):
+    '''Multiplies values by `scale`, a number or one per axis.'''
+    def __init__(self, scale):
+        self.scale = _per_axis(scale)
+
+    def apply(self, values, dt):
+        values *= self.scale
+        return values
+
+    def apply_one(self, values, dt):
+        return [v * s for v, s in zip(values, self.scale)]
+
+class Invert(Filter):
+    '''Reverses the sign of the given axes, by name (``'x'`` to ``'rz'``)
+    or index.'''
+    def __init__(self, *axes):
+        self.scale = tuple(-1.0 if inverted else 1.0
+                           for inverted in _axis_mask(axes))
+
+    apply = Sensitivity.apply
+    apply_one = Sensitivity.apply_one
+
+class Lock(Filter):
+    '''Zeroes the given axes, by name (``'x'`` to ``'rz'``) or index.'''
+    def __init__(self, *axes):
+        self.scale = tuple(0.0 if locked else 1.0
+                           for locked in _axis_mask(axes))
+
+    apply = Sensitivity.apply
+    apply_one = Sensitivity.apply_one
+
+class Expo(Filter):
+    '''Exponential response curve, giving finer control near zero
+    without reducing the full-scale output.
+
+    A value `v` becomes ``v * ((1 - amount) + amount * (v / full_scale)**2)``,
+    a blend of a linear and a cubic response.
+
+      `amount`: number or 6 numbers
+        0 for a linear response, up to 1 for a purely cubic one.
+      `full_scale`: **float**
+        Value left unchanged by the curve, about the largest value the
+        device reports.
+    '''
+    def __init__(self, amount, full_scale=350.0):
+        self.amount = _per_axis(amount)
+        self.full_scale = float(full_scale)
+
+    def apply(self, values, dt):
+        amount = numpy.asarray(self.amount)
+        normalized = values / self.full_scale
+        return values * ((1.0 - amount) + amount * normalized * normalized)
+
+    def apply_one(self, values, dt):
+        f = self.full_scale
+        return [v * ((1.0 - k) + k * (v / f) * (v / f))
+                for v, k in zip(values, self.amount)]
+
+# Number of rows solved at once by _recurrence.  The running product of
+# the decay factors, which are at least _MIN_DECAY, must not underflow
+# within a chunk.
+_CHUNK = 16
+_MIN_DECAY = 1e-12
+
+def _recurrence(decay, inputs, state):
+    '''Solves ``y[k] = decay[k] * y[k-1] + inputs[k]`` for all rows,
+    starting from ``y[-1] = state``, without a Python loop per row.'''
+    decay = numpy.maximum(decay, _MIN_DECAY)[:, None]
+    result = numpy.empty_like(inputs)
+    for start in range(0, len(inputs), _CHUNK):
+        stop = start + _CHUNK
+        product = numpy.cumprod(decay[start:stop], axis=0)
+        result[start:stop] = product * (
+            state + numpy.cumsum(inputs[start:stop] / product, axis=0))
+        state = result[min(stop, len(inputs)) - 1]
+    return result
+
+class EMA(Filter):
+    '''Exponential moving average.
+
+    Give either a fixed `alpha`, the weight of each new value, or a
+    `time_constant` in seconds, from which the weight is computed for
+    the time step of every event.  The first value passes unchanged.
+    '''
+    def __init__(self, alpha=None, time_constant=None):
+        if (alpha is None) == (time_constant is None):
+            raise SpnavException('Give either alpha or time_constant')
+        self.alpha = alpha
+        self.time_constant = time_constant
+        self._state = None
+
+    def reset(self):
+        self._state = None
+
+    def _alpha(self, dt):
+        if self.alpha is not None:
+            return self.alpha
+        return 1.0 - math.exp(-dt / self.time_constant)
+
+    def apply(self, values, dt):
+        if not len(values):
+            return values
+        if self.alpha is not None:
+            alpha = numpy.full(len(values), float(self.alpha))
+        else:
+            alpha = 1.0 - numpy.exp(-dt / self.time_constant)
+        state = self._state
+        if state is None:
+            state = values[0]
+        result = _recurrence(1.0 - alpha, alpha[:, None] * values,
+                             numpy.asarray(state, dtype=numpy.float64))
+        self._state = result[-1].tolist()
+        return result
+
+    def apply_one(self, values, dt):
+        state = self._state
+        if state is None:
+            self._state = list(values)
+            return values
+        alpha = self._alpha(dt)
+        self._state = state = [y + alpha * (v - y)
+                               for v, y in zip(values, state)]
+        return list(state)
+
+class OneEuro(Filter):
+    '''One-euro filter: a low-pass filter whose cutoff rises with the
+    speed of change, smoothing out jitter at rest while keeping lag low
+    during fast motion.
+
+      `min_cutoff`: **float**
+        Cutoff frequency in Hz at rest.  Lower values smooth more.
+      `beta`: **float**
+        Increase of the cutoff per unit of speed.  Higher values reduce
+        lag during fast motion.
+      `d_cutoff`: **float**
+        Cutoff frequency in Hz of the speed estimate.
+
+    Each step depends on the previous result, so batches are processed
+    row by row with the scalar path.
+    '''
+    def __init__(self, min_cutoff=1.0, beta=0.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self._state = None
+
+    def reset(self):
+        self._state = None
+
+    def apply(self, values, dt):
+        for i, row_dt in enumerate(dt.tolist()):
+            values[i] = self.apply_one(values[i].tolist(), row_dt)
+        return values
+
+    def apply_one(self, values, dt):
+        if self._state is None:
+            self._state = (list(values), [0.0] * 6)
+            return values
+        previous, speeds = self._state
+        tau_d = 2 * math.pi * self.d_cutoff * dt
+        alpha_d = tau_d / (tau_d + 1)
+        result = []
+        new_speeds = []
+        for v, p, s in zip(values, previous, speeds):
+            s = s + alpha_d * ((v - p) / dt - s)
+            tau = 2 * math.pi * (self.min_cutoff + self.beta * abs(s)) * dt
+            result.append(p + tau / (tau + 1) * (v - p))
+            new_speeds.append(s)
+        self._state = (result, new_speeds)
+        return list(result)
+
+def motion_arrays(events, default_period=16):
+    '''Returns the motion values of `events` as an (N, 6) float array and
+    their time steps in seconds as an array of N.
+
+      `events`: list or NumPy array
+        Event objects or an array of ``spnav_event_dtype``.  Button
+        events are skipped.
+      `default_period`: **int**
+        Period in milliseconds assumed for events with a period of 0.
+    '''
+    if isinstance(events, numpy.ndarray):
+        motion = events[events['type'] == SPNAV_EVENT_MOTION]
+        values = numpy.empty((len(motion), 6))
+        for i, name in enumerate(AXES):
+            values[:, i] = motion[name]
+        period = motion['period']
+    else:
+        motion = [event for event in events
+                  if event is not None
+                  and event.ev_type == SPNAV_EVENT_MOTION]
+        values = numpy.array([event.translation + event.rotation
+                              for event in motion],
+                             dtype=numpy.float64).reshape(-1, 6)
+        period = numpy.array([event.period for event in motion],
+                             dtype=numpy.float64)
+    dt = numpy.where(period > 0, period, default_period) / 1000.0
+    return values, dt
+
+class Pipeline(object):
+    '''Runs motion values through filter stages in order.
+
+      `stages`: ``Filter`` instances
+      `default_period`: **int**
+        Period in milliseconds assumed for events with a period of 0.
+    '''
+    def __init__(self, *stages, default_period=16):
+        self.stages = list(stages)
+        self.default_period = default_period
+
+    def __call__(self, events):
+        '''Filters a single ``SpnavMotionEvent``, returning a 6-tuple of
+        floats, or a batch of events, returning an (N, 6) float array
+        for the motion events in it.'''
+        if getattr(events, 'ev_type', None) == SPNAV_EVENT_MOTION:
+            dt = (events.period or self.default_period) / 1000.0
+            return self.process_one(events.translation + events.rotation, dt)
+        if numpy is None:
+            raise SpnavException('NumPy is required to filter batches')
+        return self.process(*motion_arrays(events, self.default_period))
+
+    def process(self, values, dt):
+        '''Filters an (N, 6) array of motion values, given the time step
+        of each row in seconds.  Returns a new float array.'''
+        values = numpy.array(values, dtype=numpy.float64)
+        dt = numpy.asarray(dt, dtype=numpy.float64)
+        for stage in self.stages:
+            values = stage.apply(values, dt)
+        return values
+
+    def process_one(self, values, dt):
+        '''Filters the six motion values of one event, with a time step
+        of `dt` seconds.  Returns a 6-tuple of floats.'''
+        values = [float(v) for v in values]
+        for stage in self.stages:
+            values = stage.apply_one(values, dt)
+        return tuple(values)
+
+    def reset(self):
+        '''Resets the state of every stage.'''
+        for stage in self.stages:
+            stage.reset()
@@ -0,0 +1,148 @@
+'''spnav.multiplex: reading several devices from one thread
+
+libspnav, and the module-level functions built after it, keep a single
+connection per process.  A ``Multiplexer`` instead holds any number of
+``spnav.unixsock.Connection`` objects, for example to daemons serving
+different devices at different socket paths, and waits for all of them
+in one ``selectors`` loop::
+
+  >>> from spnav.multiplex import Multiplexer
+  >>> with Multiplexer() as mux:
+  ...     left = mux.open('/var/run/spnav-left.sock', name='left')
+  ...     right = mux.open('/var/run/spnav-right.sock', name='right')
+  ...     for connection, events in mux.wait_batches():
+  ...         print(connection.name, len(events))
+
+Each wakeup returns one batch per connection with waiting events, so
+every event is tagged with the connection it came from.
+'''
+
+import selectors
+import time
+
+from spnav import SpnavConnectionException, SpnavWaitException, _deadline
+from spnav.unixsock import Connection, SPNAV_SOCK_PATH
+
+class Multiplexer(object):
+    '''Waits for events on several connections at once.
+
+      `connections`: sequence
+        ``spnav.unixsock.Connection`` objects to read from.  More can be
+        added with ``add()`` or ``open()``.
+
+    If a daemon hangs up, its connection is closed and removed, and the
+    ``SpnavConnectionException`` is raised once the events already read
+    from the other connections have been returned.  The remaining
+    connections can still be read afterwards.
+    '''
+    def __init__(self, connections=()):
+        self.selector = selectors.DefaultSelector()
+        self.connections = []
+        self._error = None
+        for connection in connections:
+            self.add(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self, path=SPNAV_SOCK_PATH, name=None):
+        '''Connects to the daemon at `path` and adds the connection.
+        Returns the new ``spnav.unixsock.Connection``.'''
+        connection = Connection(path, name=name)
+        self.add(connection)
+        return connection
+
+    def add(self, connection):
+        '''Starts reading from `connection`.'''
+        self.selector.register(connection.fileno(), selectors.EVENT_READ,
+                               connection)
+        self.connections.append(connection)
+
+    def remove(self, connection):
+        '''Stops reading from `connection`, without closing it.'''
+        self.selector.unregister(connection.fileno())
+        self.connections.remove(connection)
+
+    def close(self):
+        '''Closes all connections and the selector.'''
+        for connection in list(self.connections):
+            self.remove(connection)
+            connection.close()
+        self.selector.close()
+
+    def _ready(self, timeout):
+        '''Returns the connections with buffered or readable data.'''
+        if not self.connections:
+            raise SpnavWaitException(
+                'no connection open to the space navigator daemon')
+        ready = [c for c in self.connections if c.pending()]
+        if ready:
+            timeout = 0
+        try:
+            keys = self.selector.select(timeout)
+        except OSError as e:
+            raise SpnavWaitException(
+                'cannot wait for space navigator events: %s' % e)
+        for key, mask in keys:
+            if key.data not in ready:
+                ready.append(key.data)
+        return ready
+
+    def poll_batches(self, max_events=None, as_array=None, coalesce=None):
+        '''Returns a list of ``(connection, events)`` pairs, one for every
+        connection with waiting events, without blocking.  See
+        ``spnav.unixsock.spnav_poll_events()`` for the arguments, which
+        apply to each connection separately.'''
+        return self._read(0, max_events, as_array, coalesce)
+
+    def _read(self, timeout, max_events, as_array, coalesce):
+        self._raise_error()
+        batches = []
+        for connection in self._ready(timeout):
+            try:
+                events = connection.poll_events(max_events, as_array,
+                                                coalesce)
+            except SpnavConnectionException as e:
+                self.remove(connection)
+                connection.close()
+                self._error = e
+                continue
+            if len(events):
+                batches.append((connection, events))
+        if not batches:
+            self._raise_error()
+        return batches
+
+    def wait_batches(self, timeout=None, max_events=None, as_array=None,
+                     coalesce=None):
+        '''Blocks until at least one connection has events, then returns
+        them like ``poll_batches()``.  Returns None if `timeout` seconds
+        pass first.'''
+        deadline = _deadline(timeout)
+        while True:
+            batches = self._read(timeout, max_events, as_array, coalesce)
+            if batches:
+                return batches
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    return None
+
+    def wait_events(self, timeout=None, coalesce=None):
+        '''Like ``wait_batches()``, but returns a flat list of
+        ``(connection, event)`` pairs, oldest first for each
+        connection.'''
+        batches = self.wait_batches(timeout, as_array=False,
+                                    coalesce=coalesce)
+        if batches is None:
+            return None
+        return [(connection, event) for connection, events in batches
+                for event in events]
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -0,0 +1,263 @@
+'''spnav.pose: integrating motion events into a pose
+
+A ``PoseIntegrator`` treats the translation and rotation of every motion
+event as linear and angular velocities, and accumulates them over the
+event's `period` into a position vector and an orientation quaternion,
+for moving a camera or robot::
+
+  >>> from spnav.pose import PoseIntegrator
+  >>> pose = PoseIntegrator(translation_scale=0.001, frame='local',
+  ...                       reset_button=0)
+  >>> pose.update(spnav_drain())
+  >>> pose.position, pose.orientation
+  >>> camera.set_transform(pose.matrix())
+
+Batches are integrated with NumPy.  The orientations after every event
+are combined with a parallel prefix product of quaternions, so a batch
+takes a number of vectorized steps logarithmic in its length rather
+than one Python step per event.  Single events use a pure-Python path.
+
+Quaternions are ``(w, x, y, z)`` tuples.
+'''
+
+import math
+
+from spnav import SPNAV_EVENT_MOTION, SPNAV_EVENT_BUTTON, SpnavException, \
+    numpy
+
+FRAME_WORLD = 'world'
+FRAME_LOCAL = 'local'
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0)
+
+### Scalar quaternion math
+
+def quat_multiply(a, b):
+    '''Returns the quaternion product `a` * `b`.'''
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw)
+
+def quat_rotate(q, v):
+    '''Returns the vector `v` rotated by the unit quaternion `q`.'''
+    w, x, y, z = q
+    vx, vy, vz = v
+    # v + 2 * cross(u, cross(u, v) + w * v), with u the vector part of q
+    cx = y * vz - z * vy + w * vx
+    cy = z * vx - x * vz + w * vy
+    cz = x * vy - y * vx + w * vz
+    return (vx + 2 * (y * cz - z * cy),
+            vy + 2 * (z * cx - x * cz),
+            vz + 2 * (x * cy - y * cx))
+
+def quat_from_rotation_vector(r):
+    '''Returns the quaternion rotating by ``|r|`` radians about `r`.'''
+    angle = math.sqrt(r[0] * r[0] + r[1] * r[1] + r[2] * r[2])
+    if angle < 1e-12:
+        return IDENTITY
+    s = math.sin(angle / 2) / angle
+    return (math.cos(angle / 2), r[0] * s, r[1] * s, r[2] * s)
+
+### Vectorized quaternion math on (N, 4) arrays
+
+# Component i of a quaternion product is the sum over j of
+# _SIGN[i, j] * a[_A[i, j]] * b[_B[i, j]], as written out in
+# quat_multiply().  Indexing with these tables takes a few large NumPy
+# operations instead of sixteen small ones.
+if numpy is not None:
+    _A = numpy.array([[0, 1, 2, 3]] * 4)
+    _B = numpy.array([[0, 1, 2, 3], [1, 0, 3, 2], [2, 3, 0, 1],
+                      [3, 2, 1, 0]])
+    _SIGN = numpy.array([[1., -1., -1., -1.], [1., 1., 1., -1.],
+                         [1., -1., 1., 1.], [1., 1., -1., 1.]])
+    _NEXT = numpy.array([1, 2, 0])
+    _PREV = numpy.array([2, 0, 1])
+
+def _quat_multiply_array(a, b):
+    # Either argument may be a single (1, 4) row, which is broadcast
+    return (a[:, _A] * b[:, _B] * _SIGN).sum(axis=2)
+
+def _cross_array(u, v):
+    return u[:, _NEXT] * v[:, _PREV] - u[:, _PREV] * v[:, _NEXT]
+
+def _quat_rotate_array(q, v):
+    w = q[:, :1]
+    u = q[:, 1:]
+    return v + 2 * _cross_array(u, _cross_array(u, v) + w * v)
+
+def _quats_from_rotation_vectors(r):
+    angle = numpy.sqrt(numpy.einsum('ij,ij->i', r, r))
+    half = angle / 2
+    # sin(angle / 2) / angle, which tends to 1/2 as angle tends to 0
+    small = angle < 1e-12
+    s = numpy.where(small, 0.5, numpy.sin(half) / numpy.where(small, 1.0,
+                                                              angle))
+    return numpy.concatenate([numpy.cos(half)[:, None], r * s[:, None]],
+                             axis=1)
+
+def _prefix_products(quats, left_to_right):
+    '''Returns the inclusive prefix products of an (N, 4) array of
+    quaternions, ``q[0] * ... * q[i]`` if `left_to_right`, otherwise
+    ``q[i] * ... * q[0]``, in log2(N) vectorized steps.'''
+    result = quats.copy()
+    step = 1
+    while step < len(result):
+        earlier, later = result[:-step], result[step:]
+        if left_to_right:
+            combined = _quat_multiply_array(earlier, later)
+        else:
+            combined = _quat_multiply_array(later, earlier)
+        result[step:] = combined
+        step *= 2
+    return result
+
+def _normalized(q):
+    norm = math.sqrt(sum(c * c for c in q))
+    return tuple(c / norm for c in q)
+
+class PoseIntegrator(object):
+    '''Accumulates motion events into a position and an orientation.
+
+      `translation_scale`: **float**
+        Distance per second for each device unit of translation.
+      `rotation_scale`: **float**
+        Radians per second for each device unit of rotation.
+      `frame`: **str**
+        ``FRAME_WORLD`` to move and rotate about the fixed world axes,
+        ``FRAME_LOCAL`` to move and rotate about the axes of the current
+        pose, like flying a camera.
+      `reset_button`: **int**
+        If given, pressing this button resets the pose.
+      `default_period`: **int**
+        Period in milliseconds assumed for events with a period of 0.
+
+    The `speed` attribute scales both translation and rotation, for
+    example to switch between fine and coarse movement.
+    '''
+    def __init__(self, translation_scale=1.0, rotation_scale=0.001,
+                 frame=FRAME_WORLD, reset_button=None, default_period=16):
+        if frame not in (FRAME_WORLD, FRAME_LOCAL):
+            raise SpnavException('Invalid frame: %r' % (frame,))
+        self.translation_scale = translation_scale
+        self.rotation_scale = rotation_scale
+        self.frame = frame
+        self.reset_button = reset_button
+        self.default_period = default_period
+        self.speed = 1.0
+        self.reset()
+
+    def reset(self, position=(0.0, 0.0, 0.0), orientation=IDENTITY):
+        '''Sets the pose, by default to the origin.'''
+        self.position = tuple(float(c) for c in position)
+        self.orientation = tuple(float(c) for c in orientation)
+
+    def update(self, events):
+        '''Integrates a single event or a batch of events, given as a
+        list or an array of ``spnav_event_dtype``.'''
+        if hasattr(events, 'ev_type'):
+            self._update_one(events)
+        elif numpy is not None and isinstance(events, numpy.ndarray):
+            self._update_array(events)
+        else:
+            for i in range(len(events) - 1, -1, -1):
+                if self._is_reset(events[i]):
+                    self.reset()
+                    events = events[i + 1:]
+                    break
+            if numpy is None:
+                for event in events:
+                    self._update_one(event)
+                return
+            motion = [event for event in events
+                      if event is not None
+                      and event.ev_type == SPNAV_EVENT_MOTION]
+            values = numpy.array([event.translation + event.rotation
+                                  for event in motion],
+                                 dtype=numpy.float64).reshape(-1, 6)
+            period = numpy.array([event.period for event in motion],
+                                 dtype=numpy.float64)
+            self.integrate(values, self._dt(period))
+
+    def _is_reset(self, event):
+        return (event is not None and self.reset_button is not None
+                and event.ev_type == SPNAV_EVENT_BUTTON and event.press
+                and event.bnum == self.reset_button)
+
+    def _dt(self, period):
+        return numpy.where(period > 0, period, self.default_period) / 1000.0
+
+    def _update_one(self, event):
+        if event.ev_type != SPNAV_EVENT_MOTION:
+            if self._is_reset(event):
+                self.reset()
+            return
+        dt = (event.period or self.default_period) / 1000.0
+        scale = self.speed * dt
+        move = [c * self.translation_scale * scale
+                for c in event.translation]
+        turn = [c * self.rotation_scale * scale for c in event.rotation]
+        q = self.orientation
+        delta = quat_from_rotation_vector(turn)
+        if self.frame == FRAME_LOCAL:
+            move = quat_rotate(q, move)
+            q = quat_multiply(q, delta)
+        else:
+            q = quat_multiply(delta, q)
+        self.position = tuple(p + m for p, m in zip(self.position, move))
+        self.orientation = _normalized(q)
+
+    def _update_array(self, events):
+        if self.reset_button is not None:
+            resets = numpy.flatnonzero(
+                (events['type'] == SPNAV_EVENT_BUTTON) & events['press']
+                & (events['bnum'] == self.reset_button))
+            if len(resets):
+                self.reset()
+                events = events[resets[-1] + 1:]
+        motion = events[events['type'] == SPNAV_EVENT_MOTION]
+        values = numpy.stack([motion[name].astype(numpy.float64)
+                              for name in ('x', 'y', 'z', 'rx', 'ry', 'rz')],
+                             axis=1)
+        self.integrate(values, self._dt(motion['period']))
+
+    def integrate(self, values, dt):
+        '''Integrates an (N, 6) array of motion values, applied for `dt`
+        seconds each (an array of N).'''
+        if not len(values):
+            return
+        scale = (self.speed * numpy.asarray(dt, dtype=numpy.float64))[:, None]
+        move = values[:, :3] * (self.translation_scale * scale)
+        deltas = _quats_from_rotation_vectors(
+            values[:, 3:] * (self.rotation_scale * scale))
+        q0 = numpy.array(self.orientation)[None, :]
+        local = self.frame == FRAME_LOCAL
+        steps = _prefix_products(deltas, left_to_right=local)
+        if local:
+            orientations = _quat_multiply_array(q0, steps)
+            # Each move is made in the orientation before its event
+            before = numpy.concatenate([q0, orientations[:-1]])
+            move = _quat_rotate_array(before, move)
+        else:
+            orientations = _quat_multiply_array(steps, q0)
+        self.position = tuple((numpy.array(self.position)
+                               + move.sum(axis=0)).tolist())
+        self.orientation = _normalized(orientations[-1].tolist())
+
+    def matrix(self):
+        '''Returns the pose as a 4x4 homogeneous transform, a NumPy array
+        if NumPy is installed and otherwise a list of rows.'''
+        w, x, y, z = self.orientation
+        px, py, pz = self.position
+        rows = [[1 - 2 * (y * y + z * z), 2 * (x * y - z * w),
+                 2 * (x * z + y * w), px],
+                [2 * (x * y + z * w), 1 - 2 * (x * x + z * z),
+                 2 * (y * z - x * w), py],
+                [2 * (x * z - y * w), 2 * (y * z + x * w),
+                 1 - 2 * (x * x + y * y), pz],
+                [0.0, 0.0, 0.0, 1.0]]
+        if numpy is None:
+            return rows
+        return numpy.array(rows)
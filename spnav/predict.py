@@ -0,0 +1,178 @@
+'''spnav.predict: extrapolating motion to a future time
+
+A renderer shows the input of a frame only when the frame is scanned
+out, a frame or more after the events arrived.  A ``MotionPredictor``
+tracks the value and rate of change of each of the six motion axes and
+extrapolates them to a given ``time.monotonic_ns()``, such as the
+expected scan-out time, to hide that latency::
+
+  >>> from spnav.predict import MotionPredictor
+  >>> predictor = MotionPredictor(max_horizon=0.05)
+  >>> predictor.update(spnav_drain())
+  >>> translation, rotation = predictor.predict(next_vsync_ns)
+
+The estimate is an alpha-beta filter per axis: each motion event
+corrects the predicted value by `alpha` times the prediction error and
+the rate by `beta` times the error over the time step.  An update costs
+O(1) per event, with a pure-Python path for single events and short
+lists.  Longer batches are processed with NumPy: each step is an affine
+map of the (value, rate) state, and the maps of a batch are composed in
+pairs, in a number of vectorized steps logarithmic in the length of the
+batch.
+
+The time step of each event is its `period`, in milliseconds, as in
+``spnav.filters``.  The estimate is dated at the `timestamp` of the
+newest motion event, or the time of the update if it has none.
+'''
+
+import time
+
+from spnav import SPNAV_EVENT_MOTION, SpnavException, numpy
+from spnav.filters import motion_arrays
+
+# Lists with fewer motion events than this are updated event by event,
+# which is faster than setting up the NumPy arrays
+_MIN_BATCH = 32
+
+class MotionPredictor(object):
+    '''Alpha-beta filter of the six motion axes with extrapolation.
+
+      `alpha`: **float**
+        Weight of the prediction error in the value, between 0 and 1.
+        Higher values follow the input more closely.
+      `beta`: **float**
+        Weight of the prediction error in the rate, above 0 and below
+        ``4 - 2 * alpha``.  Higher values react faster to changes of
+        speed but overshoot more.
+      `max_horizon`: **float**
+        Longest extrapolation in seconds.  Targets further ahead are
+        predicted at this horizon.
+      `default_period`: **int**
+        Period in milliseconds assumed for events with a period of 0.
+
+    `value` and `rate` are the current estimates as lists of six floats,
+    in units and units per second, or None before the first motion
+    event.  `time_ns` is the time they refer to.
+    '''
+    def __init__(self, alpha=0.5, beta=0.1, max_horizon=0.1,
+                 default_period=16):
+        if not 0 < alpha <= 1 or not 0 < beta < 4 - 2 * alpha:
+            raise SpnavException('Unstable alpha-beta filter: alpha %r, '
+                                 'beta %r' % (alpha, beta))
+        self.alpha = alpha
+        self.beta = beta
+        self.max_horizon = max_horizon
+        self.default_period = default_period
+        self.reset()
+
+    def reset(self):
+        '''Forgets all motion seen so far.'''
+        self.value = None
+        self.rate = None
+        self.time_ns = None
+
+    def update(self, events, now=None):
+        '''Updates the estimate with a single event or a batch of events,
+        given as a list or an array of ``spnav_event_dtype``.  Button
+        events are ignored.
+
+          `now`: **int**
+            Time of the update, ``time.monotonic_ns()`` if None.  Used
+            for events without a timestamp.
+        '''
+        if hasattr(events, 'ev_type'):
+            if events.ev_type == SPNAV_EVENT_MOTION:
+                dt = (events.period or self.default_period) / 1000.0
+                self._update_one(events.translation + events.rotation, dt)
+                self._stamp(events.timestamp, now)
+            return
+        if numpy is not None and isinstance(events, numpy.ndarray):
+            motion = events[events['type'] == SPNAV_EVENT_MOTION]
+            if len(motion):
+                self.update_values(*motion_arrays(motion,
+                                                  self.default_period))
+                self._stamp(int(motion['timestamp'][-1]), now)
+            return
+        motion = [event for event in events
+                  if event is not None and event.ev_type == SPNAV_EVENT_MOTION]
+        if not motion:
+            return
+        if numpy is None or len(motion) < _MIN_BATCH:
+            for event in motion:
+                dt = (event.period or self.default_period) / 1000.0
+                self._update_one(event.translation + event.rotation, dt)
+        else:
+            self.update_values(*motion_arrays(motion, self.default_period))
+        self._stamp(motion[-1].timestamp, now)
+
+    def _stamp(self, timestamp, now):
+        if not timestamp:
+            timestamp = time.monotonic_ns() if now is None else now
+        self.time_ns = timestamp
+
+    def _update_one(self, values, dt):
+        if self.value is None:
+            self.value = [float(v) for v in values]
+            self.rate = [0.0] * 6
+            return
+        alpha = self.alpha
+        gain = self.beta / dt
+        value = self.value
+        rate = self.rate
+        for i in range(6):
+            error = values[i] - (value[i] + rate[i] * dt)
+            value[i] += rate[i] * dt + alpha * error
+            rate[i] += gain * error
+
+    def update_values(self, values, dt):
+        '''Updates the estimate with an (N, 6) array of motion values and
+        the time step of each row in seconds, without changing
+        `time_ns`.'''
+        values = numpy.asarray(values, dtype=numpy.float64)
+        dt = numpy.asarray(dt, dtype=numpy.float64)
+        if not len(values):
+            return
+        if self.value is None:
+            self._update_one(values[0].tolist(), dt[0])
+            values, dt = values[1:], dt[1:]
+            if not len(values):
+                return
+        alpha, beta = self.alpha, self.beta
+        gain = beta / dt
+        # Each event maps the state s = (value, rate), a 2x6 matrix, to
+        # A @ s + C, stored as the 2x8 matrix [A | C].  The list of maps
+        # is padded with identity maps to a power of two.
+        count = len(dt)
+        maps = numpy.zeros((1 << (count - 1).bit_length(), 2, 8))
+        maps[:, 0, 0] = maps[:, 1, 1] = 1.0
+        maps[:count, 0, 0] = 1.0 - alpha
+        maps[:count, 0, 1] = (1.0 - alpha) * dt
+        maps[:count, 1, 0] = -gain
+        maps[:count, 1, 1] = 1.0 - beta
+        maps[:count, 0, 2:] = alpha * values
+        maps[:count, 1, 2:] = gain[:, None] * values
+        while len(maps) > 1:
+            later = maps[1::2]
+            combined = numpy.matmul(later[:, :, :2], maps[0::2])
+            combined[:, :, 2:] += later[:, :, 2:]
+            maps = combined
+        state = numpy.matmul(maps[0, :, :2],
+                             numpy.array([self.value, self.rate]))
+        state += maps[0, :, 2:]
+        self.value = state[0].tolist()
+        self.rate = state[1].tolist()
+
+    def predict(self, target_ns=None):
+        '''Returns the translation and rotation predicted for
+        `target_ns`, a ``time.monotonic_ns()`` value defaulting to now,
+        as two 3-tuples of floats, or None before the first motion
+        event.  Targets before `time_ns` give the current estimate.'''
+        if self.value is None:
+            return None
+        if target_ns is None:
+            target_ns = time.monotonic_ns()
+        horizon = min(max((target_ns - self.time_ns) / 1e9, 0.0),
+                      self.max_horizon)
+        values = tuple(v + r * horizon
+                       for v, r in zip(self.value, self.rate))
+        return values[:3], values[3:]
@@ -0,0 +1,472 @@
+'''spnav.process: reading events in a child process
+
+A reader thread shares the GIL with the rest of the application, and an
+application that holds it for long stretches starves the thread, so
+events back up in the daemon socket.  ``ProcessReader`` moves the
+connection and the read loop into a child process instead::
+
+  >>> from spnav.process import ProcessReader
+  >>> with ProcessReader() as reader:
+  ...     events = reader.wait_events(0.1)
+  ...     reader.stats.as_dict()
+
+The child, ``python -m spnav forward``, drains the daemon whenever it
+has events and sends them to the parent over a socket pair in binary
+batches: a header holding the receive time and the number of events,
+followed by the events as fixed-width spacenavd packets.  The parent
+reads whatever has arrived with one ``recv_into`` into a preallocated
+buffer, and decodes events from it only when they are asked for, with
+the same calls as the ``spnav`` module.  Events keep the `timestamp` at
+which the child received them.
+
+If the child exits, for example because the daemon restarted, a new one
+is started, at most once every `restart_delay` seconds.  Events the old
+child sent before exiting are still delivered.
+'''
+
+import collections
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+import spnav
+from spnav import SpnavException, SpnavConnectionException, \
+    coalesce_events, _deadline, _wait_readable, _use_array
+from spnav.unixsock import packet, PACKET_SIZE, encode_event, \
+    decode_packet, packets_to_array
+
+# Receive time in time.monotonic_ns() and number of packets, padded so
+# the packets after it stay 8-byte aligned
+batch_header = struct.Struct('=qi4x')
+
+def encode_batches(events, max_batch=256):
+    '''Returns `events` as batches of at most `max_batch` packets, ready
+    to send.  Events with different timestamps go in separate batches.'''
+    buf = bytearray()
+    start = 0
+    while start < len(events):
+        timestamp = events[start].timestamp or 0
+        stop = start + 1
+        while (stop < len(events) and stop - start < max_batch
+               and (events[stop].timestamp or 0) == timestamp):
+            stop += 1
+        offset = len(buf)
+        buf.extend(bytes(batch_header.size + (stop - start) * PACKET_SIZE))
+        batch_header.pack_into(buf, offset, timestamp, stop - start)
+        offset += batch_header.size
+        for i in range(start, stop):
+            packet.pack_into(buf, offset, *encode_event(events[i]))
+            offset += PACKET_SIZE
+        start = stop
+    return buf
+
+def forward_events(backend, sock, max_batch=256):
+    '''Sends the events read from `backend` to the connected socket
+    `sock` with ``encode_batches()``, until the other end closes it.
+    Starts with an empty batch to signal that the connection is open.'''
+    sock.sendall(batch_header.pack(time.monotonic_ns(), 0))
+    fd = backend.spnav_fd()
+    while True:
+        readable = select.select([fd, sock], [], [])[0]
+        if sock in readable:
+            # The parent never sends anything, so this is end of file
+            return
+        events = backend.spnav_drain(as_array=False)
+        if events:
+            sock.sendall(encode_batches(events, max_batch))
+
+class TransferStats(object):
+    '''Statistics of the batches received from reader processes.
+
+      `batches`: **int**
+        Non-empty batches received
+      `events`: **int**
+        Events received
+      `bytes`: **int**
+        Bytes received, including headers
+      `restarts`: **int**
+        Reader processes started after the first one exited
+      `started`: **int**
+        ``time.monotonic_ns()`` at which counting started
+    '''
+    def __init__(self):
+        self.batches = 0
+        self.events = 0
+        self.bytes = 0
+        self.restarts = 0
+        self.started = time.monotonic_ns()
+
+    def batches_per_second(self, now=None):
+        '''Returns the mean rate of batches since `started`.'''
+        if now is None:
+            now = time.monotonic_ns()
+        elapsed = (now - self.started) / 1e9
+        return self.batches / elapsed if elapsed > 0 else 0.0
+
+    def mean_batch_size(self):
+        '''Returns the mean number of events per batch, or None if no
+        batch was received.'''
+        if not self.batches:
+            return None
+        return self.events / float(self.batches)
+
+    def as_dict(self):
+        '''Returns the statistics as a dict.'''
+        return {'batches': self.batches,
+                'events': self.events,
+                'bytes': self.bytes,
+                'restarts': self.restarts,
+                'batches_per_second': self.batches_per_second(),
+                'mean_batch_size': self.mean_batch_size()}
+
+class _Channel(object):
+    '''The socket to one reader process and the data received from it.'''
+    def __init__(self, sock, process, stats, capacity):
+        self.sock = sock
+        self.process = process
+        self.stats = stats
+        self.buf = bytearray(capacity * PACKET_SIZE)
+        # Unread data lives in self.buf[self.start:self.end]
+        self.start = 0
+        self.end = 0
+        # Offset of the first batch header not counted in the stats yet
+        self.scan = 0
+        # Packets of the current batch not read yet, and its timestamp
+        self.left = 0
+        self.timestamp = 0
+        self.ready = False
+        self.closed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def fill(self):
+        '''Reads available data into the buffer.  Returns the number of
+        bytes read, 0 if there was none or the process hung up.'''
+        if self.closed:
+            return 0
+        buf = self.buf
+        if self.start == self.end:
+            self.scan -= self.start
+            self.start = self.end = 0
+        elif self.start > 0 and self.end == len(buf):
+            unread = self.end - self.start
+            buf[:unread] = buf[self.start:self.end]
+            self.scan -= self.start
+            self.start, self.end = 0, unread
+        if self.end == len(buf):
+            buf.extend(bytes(len(buf)))
+        view = memoryview(buf)
+        try:
+            nbytes = self.sock.recv_into(view[self.end:], 0,
+                                         socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return 0
+        finally:
+            view.release()
+        if nbytes == 0:
+            self.close()
+            return 0
+        self.end += nbytes
+        stats = self.stats
+        stats.bytes += nbytes
+        while self.end - self.scan >= batch_header.size:
+            count = batch_header.unpack_from(buf, self.scan)[1]
+            if count:
+                stats.batches += 1
+                stats.events += count
+            self.scan += batch_header.size + count * PACKET_SIZE
+        return nbytes
+
+    def pending(self):
+        '''Returns True if complete packets are waiting.'''
+        self.take(0)
+        return self.left > 0 and self.end - self.start >= PACKET_SIZE
+
+    def take(self, limit=None):
+        '''Returns the offset, count and timestamp of up to `limit`
+        complete packets at the start of the buffer, all from the same
+        batch, and marks them read.  Returns None if there are none.'''
+        while not self.left:
+            if self.end - self.start < batch_header.size:
+                return None
+            self.timestamp, self.left = batch_header.unpack_from(
+                self.buf, self.start)
+            self.start += batch_header.size
+            self.ready = True
+        count = min(self.left, (self.end - self.start) // PACKET_SIZE)
+        if limit is not None:
+            count = min(count, limit)
+        if not count:
+            return None
+        offset = self.start
+        self.start += count * PACKET_SIZE
+        self.left -= count
+        return offset, count, self.timestamp
+
+    def close(self):
+        '''Closes the socket and waits for the process to exit.  Returns
+        its exit status.'''
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+        try:
+            return self.process.wait(1.0)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            return self.process.wait()
+
+class ProcessReader(object):
+    '''Reads Space Navigator events in a child process.
+
+      `socket_path`: **str**
+        spacenavd socket for the child to read with ``spnav.unixsock``.
+        If None, the child uses ``spnav``, with libspnav if installed.
+      `max_batch`: **int**
+        Largest number of events the child sends in one batch.
+      `restart`: **bool**
+        Start a new child when the child exits.  If False, a
+        ``SpnavConnectionException`` is raised instead, once the events
+        the child sent have been read.
+      `restart_delay`: **float**
+        Minimum seconds between starting two children.
+      `capacity`: **int**
+        Number of events the receive buffer holds before it must grow.
+
+    `stats` is the ``TransferStats`` of the batches received, and `pid`
+    the process ID of the running child, or None.
+    '''
+    def __init__(self, socket_path=None, max_batch=256, restart=True,
+                 restart_delay=1.0, capacity=256):
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.restart = restart
+        self.restart_delay = restart_delay
+        self.capacity = capacity
+        self.stats = TransferStats()
+        # Channels of the running child and of exited children that
+        # still have events, oldest first
+        self._channels = collections.deque()
+        self._running = False
+        self._restart_at = 0.0
+        # Exit status of the last child that exited
+        self._status = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def pid(self):
+        channel = self._live()
+        return None if channel is None else channel.process.pid
+
+    def _live(self):
+        if self._channels and not self._channels[-1].closed:
+            return self._channels[-1]
+        return None
+
+    def _command(self, fd):
+        command = [sys.executable, '-m', 'spnav', 'forward', str(fd),
+                   '--max-batch', str(self.max_batch)]
+        if self.socket_path is not None:
+            command += ['--socket', self.socket_path]
+        return command
+
+    def _launch(self):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        # The child must import this copy of spnav, wherever it is
+        package_dir = os.path.dirname(os.path.dirname(
+            os.path.abspath(spnav.__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [package_dir] + [path for path in [env.get('PYTHONPATH')]
+                             if path])
+        try:
+            # A new session keeps Ctrl-C in a terminal from reaching the
+            # child; it exits when the parent closes its end
+            process = subprocess.Popen(self._command(child.fileno()),
+                                       pass_fds=(child.fileno(),), env=env,
+                                       start_new_session=True)
+        except OSError as e:
+            parent.close()
+            raise SpnavConnectionException(
+                'cannot start the reader process: %s' % e)
+        finally:
+            child.close()
+        self._restart_at = time.monotonic() + self.restart_delay
+        channel = _Channel(parent, process, self.stats, self.capacity)
+        self._channels.append(channel)
+        return channel
+
+    def start(self, timeout=5.0):
+        '''Starts the child and waits up to `timeout` seconds for it to
+        connect to the daemon.  Raises ``SpnavConnectionException`` if
+        it exits or does not connect in time.'''
+        if self._running:
+            raise SpnavException('reader already started')
+        channel = self._launch()
+        deadline = _deadline(timeout)
+        while True:
+            channel.fill()
+            channel.take(0)
+            if channel.ready:
+                break
+            if channel.closed:
+                status = channel.close()
+                self._channels.remove(channel)
+                raise SpnavConnectionException(
+                    'reader process exited with status %d' % status)
+            if not _wait_readable(channel.fileno(), deadline):
+                channel.close()
+                self._channels.remove(channel)
+                raise SpnavConnectionException(
+                    'reader process did not connect within %s seconds'
+                    % timeout)
+        self._running = True
+
+    def stop(self):
+        '''Stops the child.  Events already received can be read
+        afterwards.'''
+        self._running = False
+        channel = self._live()
+        if channel is not None:
+            channel.close()
+
+    def fileno(self):
+        '''Returns the file descriptor that becomes readable when events
+        arrive, or -1 while no child is running.'''
+        channel = self._live()
+        return -1 if channel is None else channel.fileno()
+
+    def _check(self):
+        '''Forgets exited children whose events have all been read, and
+        replaces the running child if it exited.'''
+        channels = self._channels
+        while channels and channels[0].closed and not channels[0].pending():
+            self._status = channels.popleft().close()
+        if not self._running or self._live() is not None:
+            return
+        if self.restart:
+            if time.monotonic() >= self._restart_at:
+                self.stats.restarts += 1
+                self._launch()
+        elif not channels:
+            raise SpnavConnectionException(
+                'reader process exited with status %d' % self._status)
+
+    def _take(self, limit=None):
+        for channel in self._channels:
+            chunk = channel.take(limit)
+            if chunk is not None:
+                return channel, chunk
+        return None
+
+    def _fill(self):
+        channel = self._live()
+        return 0 if channel is None else channel.fill()
+
+    def poll_event(self):
+        '''Returns the oldest waiting event, or None if there is none.'''
+        while True:
+            taken = self._take(1)
+            if taken is None:
+                if not self._fill():
+                    self._check()
+                    return None
+                continue
+            channel, (offset, count, timestamp) = taken
+            event = decode_packet(packet.unpack_from(channel.buf, offset),
+                                  timestamp)
+            if event is not None:
+                return event
+
+    def poll_events(self, max_events=None, as_array=None, coalesce=None):
+        '''Returns up to `max_events` waiting events (all of them if None)
+        without blocking.  See ``spnav.spnav_poll_events()`` for
+        `as_array` and `coalesce`.'''
+        use_array = _use_array(as_array)
+        while self._fill():
+            pass
+        self._check()
+        result = []
+        total = 0
+        while max_events is None or total < max_events:
+            taken = self._take(None if max_events is None
+                               else max_events - total)
+            if taken is None:
+                break
+            channel, (offset, count, timestamp) = taken
+            total += count
+            if use_array:
+                result.append(packets_to_array(channel.buf, offset, count,
+                                               timestamp))
+                continue
+            for i in range(count):
+                event = decode_packet(
+                    packet.unpack_from(channel.buf, offset + i * PACKET_SIZE),
+                    timestamp)
+                if event is not None:
+                    result.append(event)
+        if use_array:
+            if result:
+                result = spnav.numpy.concatenate(result)
+            else:
+                result = spnav.numpy.zeros(0, dtype=spnav.spnav_event_dtype)
+        if coalesce is not None:
+            result = coalesce_events(result, coalesce)
+        return result
+
+    def drain(self, as_array=None, coalesce=None):
+        '''Returns every waiting event.  Equivalent to
+        ``poll_events(None, as_array, coalesce)``.'''
+        return self.poll_events(None, as_array, coalesce)
+
+    def _wait(self, deadline):
+        '''Waits for data from the child, or for the time to restart it.
+        Returns False once `deadline` has passed.'''
+        fd = self.fileno()
+        if fd != -1:
+            return _wait_readable(fd, deadline)
+        if not self._running:
+            raise SpnavException('reader not started')
+        wake = self._restart_at
+        if deadline is not None and deadline < wake:
+            time.sleep(max(deadline - time.monotonic(), 0))
+            return False
+        time.sleep(max(wake - time.monotonic(), 0))
+        return True
+
+    def wait_event(self, timeout=None):
+        '''Waits up to `timeout` seconds (forever if None) for an event.
+
+        Returns: None if the timeout expired, otherwise the oldest
+        waiting event.
+        '''
+        deadline = _deadline(timeout)
+        event = self.poll_event()
+        while event is None:
+            if not self._wait(deadline):
+                return None
+            event = self.poll_event()
+        return event
+
+    def wait_events(self, timeout=None, max_events=None, as_array=None,
+                    coalesce=None):
+        '''Waits up to `timeout` seconds (forever if None) for at least
+        one event and returns all waiting events like ``poll_events()``,
+        or None if the timeout expired.'''
+        deadline = _deadline(timeout)
+        events = self.poll_events(max_events, as_array, coalesce)
+        while not len(events):
+            if not self._wait(deadline):
+                return None
+            events = self.poll_events(max_events, as_array, coalesce)
+        return events
@@ -0,0 +1,222 @@
+'''spnav.proxy: share one device connection between many local programs
+
+A ``Proxy`` holds a single connection to ``spacenavd`` (or libspnav)
+and serves the events it reads on its own AF_UNIX socket, in the
+spacenavd protocol.  Any number of subscribers connect to that socket
+exactly as they would to the daemon, for example with
+``spnav.unixsock.spnav_open(path)``::
+
+  python -m spnav proxy /tmp/spnav-proxy.sock
+
+Every batch read upstream is passed on to all subscribers.  A subscriber
+that does not keep up never stalls the others: events it has not
+accepted yet are queued for it, and once more than `max_pending` are
+queued its motion events are merged with ``spnav.coalesce_events()``.
+A subscriber whose queue is still too long after that, because it is
+not reading at all, is disconnected.
+'''
+
+import os
+import selectors
+import socket
+
+from spnav import SPNAV_COALESCE_LATEST, SpnavException, coalesce_events
+from spnav.unixsock import packet, PACKET_SIZE, encode_event
+
+def encode_events(events):
+    '''Returns `events` as spacenavd packets, ready to send.'''
+    buf = bytearray(len(events) * PACKET_SIZE)
+    for i, event in enumerate(events):
+        packet.pack_into(buf, i * PACKET_SIZE, *encode_event(event))
+    return buf
+
+class Subscriber(object):
+    '''A program connected to the proxy socket.
+
+    Attributes `sent`, `coalesced` and `disconnected` record the events
+    passed on, the events merged because the subscriber was slow, and
+    whether the proxy gave up on it.
+    '''
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+        # Packets being sent, and events not yet encoded behind them
+        self.outgoing = bytearray()
+        self.pending = []
+        self.sent = 0
+        self.coalesced = 0
+        self.disconnected = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def queue(self, events, max_pending, coalesce):
+        '''Queues `events`, merging queued motion if more than
+        `max_pending` are waiting.  Returns False if the queue is still
+        too long after that.'''
+        pending = self.pending
+        pending.extend(events)
+        if len(pending) > max_pending:
+            merged = coalesce_events(pending, coalesce)
+            self.coalesced += len(pending) - len(merged)
+            self.pending = pending = merged
+        return len(pending) <= max_pending
+
+    def flush(self):
+        '''Sends as much queued data as the socket accepts.  Returns True
+        if data is still waiting to be sent.'''
+        if not self.outgoing and self.pending:
+            self.outgoing = encode_events(self.pending)
+            self.sent += len(self.pending)
+            self.pending = []
+        if self.outgoing:
+            try:
+                sent = self.sock.send(self.outgoing)
+            except BlockingIOError:
+                sent = 0
+            del self.outgoing[:sent]
+        return bool(self.outgoing or self.pending)
+
+    def close(self):
+        self.sock.close()
+
+class Proxy(object):
+    '''Rebroadcasts the events of one upstream connection to local
+    subscribers.
+
+      `backend`: module
+        ``spnav`` or ``spnav.unixsock``, with an open connection.
+      `path`: **str**
+        Path of the socket to serve subscribers on.
+      `max_pending`: **int**
+        Events queued for a slow subscriber before its motion events are
+        coalesced.
+      `coalesce`: **str**
+        ``spnav.coalesce_events()`` mode used for slow subscribers.
+
+    Attribute `received` counts the events read upstream.
+    '''
+    def __init__(self, backend, path, max_pending=256,
+                 coalesce=SPNAV_COALESCE_LATEST):
+        self.backend = backend
+        self.path = path
+        self.max_pending = max_pending
+        self.coalesce = coalesce
+        self.received = 0
+        self.subscribers = []
+        self.selector = None
+        self._listener = None
+        self._wake_r = self._wake_w = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        '''Starts listening for subscribers.'''
+        if self._listener is not None:
+            raise SpnavException('proxy already started')
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(16)
+        self._listener.setblocking(False)
+        self._wake_r, self._wake_w = os.pipe()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self._listener, selectors.EVENT_READ)
+        self.selector.register(self._wake_r, selectors.EVENT_READ)
+        self.selector.register(self.backend.spnav_fd(), selectors.EVENT_READ)
+
+    def close(self):
+        '''Disconnects all subscribers and removes the socket.  The
+        upstream connection is left open.'''
+        if self._listener is None:
+            return
+        for subscriber in list(self.subscribers):
+            self._disconnect(subscriber)
+        self.selector.close()
+        self._listener.close()
+        self._listener = None
+        os.unlink(self.path)
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def stop(self):
+        '''Makes ``serve_forever()`` return.  Can be called from any
+        thread or a signal handler.'''
+        os.write(self._wake_w, b'x')
+
+    def serve_forever(self):
+        '''Passes events on until ``stop()`` is called.  Raises
+        ``SpnavException`` if the upstream connection fails.'''
+        while self.run_once(None):
+            pass
+
+    def run_once(self, timeout=None):
+        '''Waits up to `timeout` seconds (forever if None) for something
+        to do and does it.  Returns False once ``stop()`` was called.'''
+        upstream = self.backend.spnav_fd()
+        for key, mask in self.selector.select(timeout):
+            if key.fileobj == self._wake_r:
+                os.read(self._wake_r, 64)
+                return False
+            elif key.fileobj is self._listener:
+                self._accept()
+            elif key.fileobj == upstream:
+                self._forward(self.backend.spnav_drain(as_array=False))
+            else:
+                self._service(key.fileobj, mask)
+        return True
+
+    def _accept(self):
+        try:
+            sock = self._listener.accept()[0]
+        except BlockingIOError:
+            return
+        subscriber = Subscriber(sock)
+        self.subscribers.append(subscriber)
+        self.selector.register(subscriber, selectors.EVENT_READ)
+
+    def _forward(self, events):
+        self.received += len(events)
+        if not events:
+            return
+        for subscriber in list(self.subscribers):
+            if not subscriber.queue(events, self.max_pending, self.coalesce):
+                self._disconnect(subscriber)
+                continue
+            self._flush(subscriber)
+
+    def _service(self, subscriber, mask):
+        if mask & selectors.EVENT_READ:
+            # Subscribers send nothing, so this is a hangup
+            try:
+                data = subscriber.sock.recv(4096)
+            except BlockingIOError:
+                data = True
+            except OSError:
+                data = b''
+            if not data:
+                self._disconnect(subscriber)
+                return
+        if mask & selectors.EVENT_WRITE:
+            self._flush(subscriber)
+
+    def _flush(self, subscriber):
+        try:
+            waiting = subscriber.flush()
+        except OSError:
+            self._disconnect(subscriber)
+            return
+        events = selectors.EVENT_READ
+        if waiting:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(subscriber, events)
+
+    def _disconnect(self, subscriber):
+        self.selector.unregister(subscriber)
+        self.subscribers.remove(subscriber)
+        subscriber.disconnected = True
+        subscriber.close()
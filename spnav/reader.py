@@ -0,0 +1,283 @@
+'''spnav.reader: background thread reading Space Navigator events
+
+``SpnavReader`` owns the connection to the daemon and reads it from a
+dedicated thread, so that slow consumers never let events back up in
+the daemon socket::
+
+  >>> from spnav.reader import SpnavReader
+  >>> with SpnavReader() as reader:
+  ...     state = reader.state          # current device state, O(1)
+  ...     events = reader.drain()       # every event since last call
+'''
+
+import collections
+import fcntl
+import os
+import select
+import struct
+import termios
+import threading
+import time
+
+import spnav
+from spnav import SPNAV_EVENT_MOTION, SpnavException, \
+    SpnavConnectionException, SpnavWaitException, coalesce_events
+
+class DeviceState(collections.namedtuple('DeviceState',
+                                         'translation rotation buttons')):
+    '''Snapshot of the Space Navigator state after the latest event.
+
+      `translation`: 3-tuple of ints
+        Translation force of the latest motion event
+      `rotation`: 3-tuple of ints
+        Rotation torque of the latest motion event
+      `buttons`: **int**
+        Bitmask of buttons held down, bit `n` for button number `n`
+    '''
+    __slots__ = ()
+
+    def is_down(self, bnum):
+        '''Returns True if button `bnum` is held down.'''
+        return bool(self.buttons & (1 << bnum))
+
+DeviceState.IDLE = DeviceState((0, 0, 0), (0, 0, 0), 0)
+
+def update_state(state, event):
+    '''Returns the ``DeviceState`` resulting from applying `event` to
+    `state`.'''
+    if event.ev_type == SPNAV_EVENT_MOTION:
+        return DeviceState(event.translation, event.rotation, state.buttons)
+    elif event.press:
+        return state._replace(buttons=state.buttons | (1 << event.bnum))
+    else:
+        return state._replace(buttons=state.buttons & ~(1 << event.bnum))
+
+def _hung_up(fd):
+    '''Returns True if `fd` is readable without any data to read, which
+    for a socket means that the other end closed it.'''
+    if not select.select([fd], [], [], 0)[0]:
+        return False
+    unread = fcntl.ioctl(fd, termios.FIONREAD, b'\0' * 4)
+    return struct.unpack('i', unread)[0] == 0
+
+class RingBuffer(object):
+    '''Fixed-capacity FIFO queue stored in a preallocated list of slots.
+
+      `capacity`: **int**
+        Maximum number of items held.
+    '''
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def full(self):
+        return self._count == self.capacity
+
+    def push(self, item):
+        '''Appends `item`.  If the buffer is full the oldest item is
+        overwritten and returned, otherwise None is returned.'''
+        index = (self._head + self._count) % self.capacity
+        dropped = None
+        if self._count == self.capacity:
+            dropped = self._slots[index]
+            self._head = (self._head + 1) % self.capacity
+        else:
+            self._count += 1
+        self._slots[index] = item
+        return dropped
+
+    def pop(self):
+        '''Removes and returns the oldest item, or None if empty.'''
+        if self._count == 0:
+            return None
+        item = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+        return item
+
+    def pop_all(self):
+        '''Removes and returns all items, oldest first.'''
+        items = []
+        while self._count:
+            items.append(self.pop())
+        return items
+
+class SpnavReader(object):
+    '''Reads Space Navigator events in a background thread.
+
+    The thread blocks in ``select()`` on the connection file descriptor
+    and drains every waiting event into a ring buffer, while also keeping
+    `state`, the latest ``DeviceState``, up to date.  Any number of
+    threads can read `state` without locking or touching the queue.
+
+      `backend`: module
+        ``spnav`` or ``spnav.unixsock``.  The reader opens and closes
+        the connection itself.
+      `capacity`: **int**
+        Number of events the ring buffer holds.
+      `coalesce`: **str**
+        What to do when the ring buffer is full.  If None, the oldest
+        event is dropped.  Otherwise the queued and arriving motion
+        events are merged with this ``spnav.coalesce_events()`` mode,
+        and the oldest event is only dropped if that does not make
+        room.
+      `stats`: **bool**
+        If True, `stats` is a ``spnav.stats.SpnavStats`` recording the
+        events the thread receives, the events dropped or merged by the
+        buffer and the latency from receiving events to handing them to
+        the application.
+
+    Attributes `dropped` and `coalesced` count the events lost or merged
+    because the buffer was full.
+    '''
+    def __init__(self, backend=spnav, capacity=1024, coalesce=None,
+                 stats=False):
+        self.backend = backend
+        self.coalesce = coalesce
+        self.state = DeviceState.IDLE
+        self.dropped = 0
+        self.coalesced = 0
+        self.stats = None
+        if stats:
+            from spnav.stats import SpnavStats
+            self.stats = SpnavStats()
+        self._buffer = RingBuffer(capacity)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._wake_r = self._wake_w = None
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        '''Opens the connection and starts the reader thread.'''
+        if self._thread is not None:
+            raise SpnavException('reader already started')
+        self.backend.spnav_open()
+        self._error = None
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._run,
+                                        name='SpnavReader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stops the reader thread and closes the connection.  Events
+        still in the buffer can be read afterwards.'''
+        if self._thread is None:
+            return
+        os.write(self._wake_w, b'x')
+        self._thread.join()
+        self._thread = None
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+        self.backend.spnav_close()
+
+    def _run(self):
+        fd = self.backend.spnav_fd()
+        try:
+            while True:
+                readable = select.select([fd, self._wake_r], [], [])[0]
+                if self._wake_r in readable:
+                    return
+                events = self.backend.spnav_drain(as_array=False)
+                # libspnav does not report a closed connection, it just
+                # returns no events from a socket that stays readable
+                if not events and _hung_up(fd):
+                    raise SpnavConnectionException(
+                        'connection to the space navigator daemon lost')
+                self._store(events)
+        except SpnavException as e:
+            self._fail(e)
+        except (OSError, ValueError) as e:
+            # select() on a closed or invalid descriptor
+            self._fail(SpnavWaitException('waiting for events failed: %s'
+                                          % e))
+
+    def _fail(self, error):
+        with self._cond:
+            self._error = error
+            self._cond.notify_all()
+
+    def _store(self, events):
+        state = self.state
+        for event in events:
+            state = update_state(state, event)
+        self.state = state
+        with self._cond:
+            stats = self.stats
+            buf = self._buffer
+            if stats is not None:
+                for event in events:
+                    stats.record_received(event.timestamp or 0)
+            if self.coalesce is not None and \
+                    len(buf) + len(events) > buf.capacity:
+                # Merge once for the whole batch rather than every time
+                # an event finds the buffer full
+                queued = buf.pop_all() + list(events)
+                events = coalesce_events(queued, self.coalesce)
+                merged = len(queued) - len(events)
+                self.coalesced += merged
+                if stats is not None:
+                    stats.coalesced += merged
+            for event in events:
+                if buf.push(event) is not None:
+                    self.dropped += 1
+                    if stats is not None:
+                        stats.dropped += 1
+            self._cond.notify_all()
+
+    def _ready(self):
+        return len(self._buffer) > 0 or self._error is not None
+
+    def _check_error(self):
+        if self._error is not None and len(self._buffer) == 0:
+            raise self._error
+
+    def _pop(self):
+        event = self._buffer.pop()
+        if self.stats is not None and event is not None:
+            self.stats.record_delivered(event.timestamp,
+                                        time.monotonic_ns())
+        return event
+
+    def poll_event(self):
+        '''Returns the oldest buffered event, or None if there is none.'''
+        with self._cond:
+            self._check_error()
+            return self._pop()
+
+    def wait_event(self, timeout=None):
+        '''Waits up to `timeout` seconds (forever if None) for an event.
+
+        Returns: None if the timeout expired, otherwise the oldest
+        buffered event.  Raises the ``SpnavException`` that stopped the
+        reader thread once the buffer is empty.
+        '''
+        with self._cond:
+            if not self._cond.wait_for(self._ready, timeout):
+                return None
+            self._check_error()
+            return self._pop()
+
+    def drain(self):
+        '''Returns all buffered events, oldest first.'''
+        with self._cond:
+            self._check_error()
+            events = self._buffer.pop_all()
+            if self.stats is not None:
+                self.stats.record_drain(events, time.monotonic_ns())
+            return events
@@ -0,0 +1,332 @@
+'''spnav.record: compact binary recordings of Space Navigator events
+
+A recording is a 16 byte header followed by fixed-width 40 byte
+records, all little-endian:
+
+  header
+    ``b'SPNAVREC'``, format version (uint32) and record size (uint32)
+  record
+    receive time from ``time.monotonic_ns()`` (int64), followed by the
+    leading fields of the ``spnav_event`` union: type, x, y, z, rx, ry,
+    rz (int32) and period (uint32).  As in the union, button events
+    store `press` in `x` and `bnum` in `y`.
+
+Recordings are written with ``Recorder`` and read back with ``load()``,
+which maps the file into memory as a NumPy array without copying it,
+or with ``read_records()`` when NumPy is not available.  ``Replay``
+plays a recording through a ``spnav.testing.FakeDaemon``, so that it
+can be read back with the normal ``spnav.unixsock`` poll and wait
+functions, or by any other client of the daemon socket.
+'''
+
+import mmap
+import struct
+import time
+
+from spnav import SPNAV_EVENT_MOTION, SPNAV_EVENT_BUTTON, \
+    SpnavMotionEvent, SpnavButtonEvent, SpnavException, _is_array, \
+    _load_numpy
+
+MAGIC = b'SPNAVREC'
+VERSION = 1
+
+header = struct.Struct('<8sII')
+record = struct.Struct('<q7iI')
+HEADER_SIZE = header.size
+RECORD_SIZE = record.size
+
+def _load_record_dtype():
+    '''Defines the module attribute ``record_dtype``, None if NumPy is
+    not installed, and returns NumPy.'''
+    global record_dtype
+    numpy = _load_numpy()
+    if 'record_dtype' not in globals():
+        record_dtype = None if numpy is None else numpy.dtype(
+            [('timestamp', '<i8'),
+             ('type', '<i4'),
+             ('x', '<i4'),
+             ('y', '<i4'),
+             ('z', '<i4'),
+             ('rx', '<i4'),
+             ('ry', '<i4'),
+             ('rz', '<i4'),
+             ('period', '<u4')])
+    return numpy
+
+def __getattr__(name):
+    # Like spnav.spnav_event_dtype, record_dtype is only defined once
+    # something asks for it, so that importing this module does not
+    # import NumPy.
+    if name == 'record_dtype':
+        _load_record_dtype()
+        return globals()[name]
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+def encode_record(timestamp, event):
+    '''Returns the record fields for `event` received at `timestamp`.'''
+    if event.ev_type == SPNAV_EVENT_MOTION:
+        return ((timestamp, SPNAV_EVENT_MOTION) + tuple(event.translation)
+                + tuple(event.rotation) + (event.period,))
+    return (timestamp, SPNAV_EVENT_BUTTON, int(event.press), event.bnum,
+            0, 0, 0, 0, 0)
+
+def decode_record(fields):
+    '''Returns the receive timestamp and the ``SpnavMotionEvent`` or
+    ``SpnavButtonEvent`` stored in the unpacked record `fields`.'''
+    timestamp, ev_type = fields[:2]
+    if ev_type == SPNAV_EVENT_MOTION:
+        return timestamp, SpnavMotionEvent(fields[2:5], fields[5:8],
+                                           fields[8], timestamp)
+    elif ev_type == SPNAV_EVENT_BUTTON:
+        return timestamp, SpnavButtonEvent(fields[3], bool(fields[2]),
+                                           timestamp)
+    raise SpnavException('Invalid spnav event type in recording: %d'
+                         % ev_type)
+
+class Recorder(object):
+    '''Writes events to a recording file.
+
+    Records are collected in a buffer and written out in large blocks.
+
+      `file`: **str** or binary file object
+        File to write.  A file object is not closed by ``close()``.
+      `buffer_records`: **int**
+        Number of records buffered before they are written.
+    '''
+    def __init__(self, file, buffer_records=4096):
+        if hasattr(file, 'write'):
+            self.file = file
+            self._owns_file = False
+        else:
+            self.file = open(file, 'wb')
+            self._owns_file = True
+        self.count = 0
+        self._buf = bytearray(buffer_records * RECORD_SIZE)
+        self._used = 0
+        self.file.write(header.pack(MAGIC, VERSION, RECORD_SIZE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_event(self, event, timestamp=None):
+        '''Records one event, received at `timestamp` (a
+        ``time.monotonic_ns()`` value).  If None, the event's own
+        `timestamp` is used, or the current time if it has none.'''
+        if timestamp is None:
+            timestamp = event.timestamp or time.monotonic_ns()
+        if self._used == len(self._buf):
+            self.flush()
+        record.pack_into(self._buf, self._used,
+                         *encode_record(timestamp, event))
+        self._used += RECORD_SIZE
+        self.count += 1
+
+    def write(self, events, timestamp=None):
+        '''Records a batch of events received together at `timestamp`,
+        or at their own receive times if None.
+
+          `events`: list or NumPy array
+            Event objects, or an array of ``spnav_event_dtype`` as
+            returned by ``spnav_drain()``.
+        '''
+        if _is_array(events):
+            self.flush()
+            self.file.write(events_to_records(events, timestamp).tobytes())
+            self.count += len(events)
+        else:
+            for event in events:
+                self.write_event(event, timestamp)
+
+    def flush(self):
+        '''Writes out buffered records.'''
+        if self._used:
+            self.file.write(memoryview(self._buf)[:self._used])
+            self._used = 0
+        self.file.flush()
+
+    def close(self):
+        '''Writes out buffered records and closes the file.'''
+        if self.file is None:
+            return
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+        self.file = None
+
+def _open_mapped(path):
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            raise SpnavException('%s is not a spnav recording' % path)
+    if len(mapped) < HEADER_SIZE:
+        mapped.close()
+        raise SpnavException('%s is not a spnav recording' % path)
+    magic, version, size = header.unpack_from(mapped)
+    if magic != MAGIC or size != RECORD_SIZE:
+        mapped.close()
+        raise SpnavException('%s is not a spnav recording' % path)
+    if version != VERSION:
+        mapped.close()
+        raise SpnavException('unsupported spnav recording version %d'
+                             % version)
+    return mapped
+
+def load(path):
+    '''Maps the recording at `path` into memory and returns it as a
+    read-only NumPy array of ``record_dtype``, without copying or
+    parsing the file.  A partially written trailing record is ignored.'''
+    numpy = _load_record_dtype()
+    if numpy is None:
+        raise SpnavException('NumPy is required to load recordings')
+    mapped = _open_mapped(path)
+    count = (len(mapped) - HEADER_SIZE) // RECORD_SIZE
+    return numpy.frombuffer(mapped, dtype=record_dtype, count=count,
+                            offset=HEADER_SIZE)
+
+def read_records(path):
+    '''Yields ``(timestamp, event)`` pairs for every record in the
+    recording at `path`.'''
+    mapped = _open_mapped(path)
+    end = HEADER_SIZE + (len(mapped) - HEADER_SIZE) // RECORD_SIZE \
+        * RECORD_SIZE
+    for offset in range(HEADER_SIZE, end, RECORD_SIZE):
+        yield decode_record(record.unpack_from(mapped, offset))
+
+def events_to_records(events, timestamp=None):
+    '''Converts an array of ``spnav_event_dtype`` to an array of
+    ``record_dtype`` with the given receive `timestamp`.  If None, the
+    `timestamp` field of the events is kept, and the current time is
+    used where that is 0.'''
+    numpy = _load_record_dtype()
+    records = numpy.zeros(len(events), dtype=record_dtype)
+    if timestamp is None:
+        timestamp = numpy.where(events['timestamp'] != 0,
+                                events['timestamp'], time.monotonic_ns())
+    records['timestamp'] = timestamp
+    records['type'] = events['type']
+    button = events['type'] == SPNAV_EVENT_BUTTON
+    for name in ('x', 'y', 'z', 'rx', 'ry', 'rz', 'period'):
+        records[name] = events[name]
+    records['x'][button] = events['press'][button]
+    records['y'][button] = events['bnum'][button]
+    return records
+
+def records_to_events(records):
+    '''Converts an array of ``record_dtype`` to an array of
+    ``spnav_event_dtype``, as returned by ``spnav_drain()``.'''
+    numpy = _load_record_dtype()
+    from spnav import spnav_event_dtype
+    events = numpy.zeros(len(records), dtype=spnav_event_dtype)
+    motion = records['type'] == SPNAV_EVENT_MOTION
+    events['type'] = records['type']
+    for name in ('x', 'y', 'z', 'rx', 'ry', 'rz', 'period'):
+        events[name] = numpy.where(motion, records[name], 0)
+    events['press'] = ~motion & (records['x'] != 0)
+    events['bnum'] = numpy.where(motion, 0, records['y'])
+    events['timestamp'] = records['timestamp']
+    return events
+
+def _packet(fields):
+    '''spacenavd packet tuple for the unpacked record `fields`.'''
+    if fields[1] == SPNAV_EVENT_MOTION:
+        return (0,) + tuple(fields[2:9])
+    return (1 if fields[2] else 2, fields[3], 0, 0, 0, 0, 0, 0)
+
+def timed_packets(path, speed=1.0):
+    '''Yields ``(seconds, packet)`` pairs for ``FakeDaemon.play_timed()``
+    from the recording at `path`, played `speed` times faster than it was
+    recorded, or as fast as possible if `speed` is None.'''
+    mapped = _open_mapped(path)
+    end = HEADER_SIZE + (len(mapped) - HEADER_SIZE) // RECORD_SIZE \
+        * RECORD_SIZE
+    start = None
+    for offset in range(HEADER_SIZE, end, RECORD_SIZE):
+        fields = record.unpack_from(mapped, offset)
+        if speed is None:
+            yield None, _packet(fields)
+            continue
+        if start is None:
+            start = fields[0]
+        yield (fields[0] - start) / (1e9 * speed), _packet(fields)
+
+class Replay(object):
+    '''Plays a recording through a ``spnav.testing.FakeDaemon``.
+
+    Playback starts as soon as `clients` clients have connected to
+    `path`, for example with ``spnav.unixsock.spnav_open(replay.path)``.
+
+      `recording`: **str**
+        Path of the recording.
+      `speed`: **float**
+        Playback speed relative to the original timing, or None to send
+        all events as fast as possible.
+      `path`: **str**
+        Socket path for the daemon, a temporary one if None.
+      `clients`: **int**
+        Number of clients to wait for before starting playback.
+    '''
+    def __init__(self, recording, speed=1.0, path=None, clients=1):
+        from spnav.testing import FakeDaemon
+        self.recording = recording
+        self.speed = speed
+        self.clients = clients
+        self.daemon = FakeDaemon(path)
+        self.path = self.daemon.path
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        '''Starts the daemon.  Playback begins once the clients connect.'''
+        self.daemon.start()
+        self.daemon.play_timed(timed_packets(self.recording, self.speed),
+                               self.clients)
+
+    def wait(self, timeout=None):
+        '''Waits for playback to finish and all events to be passed on to
+        the clients.  Returns False if that has not happened after
+        `timeout` seconds.'''
+        if not self.daemon.wait_playback(timeout):
+            return False
+        return self.daemon.flush(timeout)
+
+    def stop(self):
+        '''Stops playback and the daemon.'''
+        self.daemon.stop()
+
+def record_events(path, backend, count=None, duration=None):
+    '''Records events read from `backend` (``spnav`` or
+    ``spnav.unixsock``, with an open connection) to a new recording at
+    `path`, until `count` events have been recorded or `duration` seconds
+    have passed.  Without either, records until interrupted.
+
+    Returns: the number of events recorded.
+    '''
+    deadline = None if duration is None else time.monotonic() + duration
+    with Recorder(path) as recorder:
+        try:
+            while count is None or recorder.count < count:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                max_events = None
+                if count is not None:
+                    max_events = count - recorder.count
+                events = backend.spnav_wait_events(timeout, max_events,
+                                                   as_array=False)
+                if events is not None:
+                    recorder.write(events)
+        except KeyboardInterrupt:
+            pass
+        return recorder.count
@@ -0,0 +1,224 @@
+'''spnav.shm: the current device state in shared memory
+
+A ``StatePublisher`` keeps the latest motion values, the buttons held
+down, an update sequence number and the receive time of the latest
+event in a ``multiprocessing.shared_memory`` block.  Any number of
+processes can read consistent snapshots of it with a ``StateReader``,
+without locks, sockets or system calls::
+
+  >>> from spnav.shm import StatePublisher, StateReader
+  >>> publisher = StatePublisher('spnav-state')    # in one process
+  >>> publisher.publish(spnav.spnav_drain(as_array=False))
+
+  >>> reader = StateReader('spnav-state')          # in any other
+  >>> state = reader.read()
+  >>> state.translation, state.is_down(0)
+
+The block is the ``spnav_shared_state`` struct.  After the sequence
+counter it holds the leading fields of ``spnav_event_motion``, so C code
+can read it with the libspnav definitions.  Updates are guarded by a
+seqlock: the counter is odd while the publisher writes, and readers
+copy the whole block and retry if the counter was odd or changed
+meanwhile.  There must be only one publisher per block.
+'''
+
+import collections
+import struct
+import time
+from ctypes import c_int, c_int64, c_uint, c_uint64, Structure
+from multiprocessing import shared_memory
+
+from spnav import SPNAV_EVENT_MOTION, SpnavException
+from spnav.reader import DeviceState, update_state
+
+class spnav_shared_state(Structure):
+    '''Layout of the shared memory block, in native byte order.
+
+      `seq`: **c_uint64**
+        Seqlock counter, odd while an update is being written.  Bumped
+        by two for every update.
+      `type` to `period`
+        As in ``spnav_event_motion``.  `type` is the type of the latest
+        event, the other fields are from the latest motion event.
+      `buttons`: **c_uint64**
+        Bitmask of buttons held down, bit `n` for button number `n`
+      `timestamp`: **c_int64**
+        ``time.monotonic_ns()`` at which the latest event was received
+    '''
+    _fields_ = [('seq', c_uint64),
+                ('type', c_int),
+                ('x', c_int),
+                ('y', c_int),
+                ('z', c_int),
+                ('rx', c_int),
+                ('ry', c_int),
+                ('rz', c_int),
+                ('period', c_uint),
+                ('buttons', c_uint64),
+                ('timestamp', c_int64)]
+
+# The whole block, its sequence counter and the fields after it
+_state = struct.Struct('Q7iIQq')
+_seq = struct.Struct('Q')
+_body = struct.Struct('7iIQq')
+STATE_SIZE = _state.size
+
+# Names of the blocks created by publishers in this process
+_published = set()
+
+class SharedState(collections.namedtuple(
+        'SharedState', 'seq translation rotation period buttons timestamp')):
+    '''Snapshot read from shared memory.
+
+      `seq`: **int**
+        Number of updates published so far
+      `translation`, `rotation`: 3-tuples of ints
+        Values of the latest motion event
+      `period`: **int**
+        Period of the latest motion event
+      `buttons`: **int**
+        Bitmask of buttons held down, bit `n` for button number `n`
+      `timestamp`: **int**
+        Receive time of the latest event, 0 before the first update
+    '''
+    __slots__ = ()
+
+    def is_down(self, bnum):
+        '''Returns True if button `bnum` is held down.'''
+        return bool(self.buttons & (1 << bnum))
+
+class StatePublisher(object):
+    '''Creates a shared memory block and publishes the device state in
+    it.
+
+      `name`: **str**
+        Name of the block, a random one if None.  See the `name`
+        attribute for the name readers must use.
+    '''
+    def __init__(self, name=None):
+        self.shm = shared_memory.SharedMemory(name, create=True,
+                                              size=STATE_SIZE)
+        self.name = self.shm.name
+        _published.add(self.name)
+        self.state = DeviceState.IDLE
+        self._type = 0
+        self._period = 0
+        self._seq = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.unlink()
+
+    def publish(self, events):
+        '''Applies `events`, oldest first, to the state and publishes the
+        result in a single update.'''
+        if not events:
+            return
+        state = self.state
+        for event in events:
+            state = update_state(state, event)
+            if event.ev_type == SPNAV_EVENT_MOTION:
+                self._period = event.period
+        self.state = state
+        self._type = event.ev_type
+        self.write(state, event.timestamp or time.monotonic_ns())
+
+    def write(self, state, timestamp):
+        '''Publishes the ``spnav.reader.DeviceState`` `state`, received
+        at `timestamp`.'''
+        buf = self.shm.buf
+        seq = self._seq
+        _seq.pack_into(buf, 0, seq + 1)
+        _body.pack_into(buf, _seq.size, self._type,
+                        *(state.translation + state.rotation
+                          + (self._period,
+                             state.buttons & 0xffffffffffffffff,
+                             timestamp)))
+        self._seq = seq + 2
+        _seq.pack_into(buf, 0, self._seq)
+
+    def close(self):
+        '''Detaches from the block.  Readers can still use it.'''
+        self.shm.close()
+
+    def unlink(self):
+        '''Removes the block once every process has detached from it.'''
+        self.shm.unlink()
+        _published.discard(self.name)
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block with the
+        # resource tracker, which would remove it under the publisher's
+        # feet when this process exits.  Unless the publisher is in this
+        # process, its registration is taken back.
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        if shm.name not in _published:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class StateReader(object):
+    '''Reads the device state published by a ``StatePublisher``.
+
+      `name`: **str**
+        Name of the shared memory block.
+    '''
+    def __init__(self, name):
+        self.shm = _attach(name)
+        if self.shm.size < STATE_SIZE:
+            self.shm.close()
+            raise SpnavException('%s is not a spnav state block' % name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read_raw(self, retries=100000):
+        '''Returns a consistent copy of the block as a tuple of the
+        ``spnav_shared_state`` fields.
+
+        Raises ``SpnavException`` if no consistent copy was made after
+        `retries` attempts, which means the publisher died while
+        writing.'''
+        buf = self.shm.buf
+        for attempt in range(retries):
+            fields = _state.unpack_from(buf)
+            if not fields[0] & 1 and _seq.unpack_from(buf)[0] == fields[0]:
+                return fields
+            if attempt % 100 == 99:
+                time.sleep(0)
+        raise SpnavException('shared device state is not being updated '
+                             'consistently')
+
+    def read(self):
+        '''Returns a consistent ``SharedState`` snapshot.'''
+        fields = self.read_raw()
+        return SharedState(fields[0] // 2, fields[2:5], fields[5:8],
+                           fields[8], fields[9], fields[10])
+
+    def seq(self):
+        '''Returns the number of updates published so far, to check
+        cheaply whether anything changed since the last ``read()``.'''
+        return _seq.unpack_from(self.shm.buf)[0] // 2
+
+    def close(self):
+        '''Detaches from the block.'''
+        self.shm.close()
+
+def publish_events(backend, publisher):
+    '''Publishes every batch of events read from `backend` (``spnav`` or
+    ``spnav.unixsock``, with an open connection) with `publisher`, until
+    interrupted.'''
+    try:
+        while True:
+            publisher.publish(backend.spnav_wait_events(as_array=False))
+    except KeyboardInterrupt:
+        pass
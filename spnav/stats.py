@@ -0,0 +1,236 @@
+'''spnav.stats: event and latency statistics for a connection
+
+Statistics are collected only when enabled, with ``spnav_stats()`` in
+``spnav`` or ``spnav.unixsock``::
+
+  >>> stats = spnav_stats()
+  ...
+  >>> stats.as_dict()['latency_ns']['p99']
+
+All times are in nanoseconds, from ``time.monotonic_ns()``.
+'''
+
+import math
+import time
+
+from spnav import SPNAV_EVENT_MOTION
+
+# As spnav.filters.AXES, which would import NumPy
+_AXES = ('x', 'y', 'z', 'rx', 'ry', 'rz')
+
+class Histogram(object):
+    '''Histogram of non-negative integers in power-of-two buckets.
+
+    Recording a value is O(1) and the memory used is fixed.  Bucket `n`
+    counts values with ``value.bit_length() == n``, that is values from
+    ``2**(n-1)`` up to ``2**n - 1``, and bucket 0 counts zeros.
+    '''
+    __slots__ = ('buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * 65
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, count=1):
+        '''Records `value` `count` times.  Negative values are recorded
+        as 0.'''
+        if value < 0:
+            value = 0
+        self.buckets[value.bit_length()] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        '''Returns an upper bound of the value below which `fraction` of
+        the recorded values lie, or None if nothing was recorded.'''
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for n, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min((1 << n) - 1, self.max)
+        return self.max
+
+    def as_dict(self):
+        '''Returns a summary of the histogram as a dict.  `buckets` maps
+        the upper bound of each non-empty bucket to its count.'''
+        return {'count': self.count,
+                'min': self.min,
+                'max': self.max,
+                'mean': self.total / float(self.count) if self.count
+                        else None,
+                'p50': self.percentile(0.5),
+                'p99': self.percentile(0.99),
+                'buckets': dict(((1 << n) - 1, count)
+                                for n, count in enumerate(self.buckets)
+                                if count)}
+
+class SpnavStats(object):
+    '''Statistics of the events passing through a connection.
+
+      `received`
+        Events read from the daemon or library
+      `delivered`
+        Events returned to the application
+      `removed`
+        Events discarded by ``spnav_remove_events()``
+      `coalesced`
+        Motion events merged into others by coalescing
+      `dropped`
+        Events lost because a buffer was full
+      `queue_depth`
+        ``Histogram`` of the number of events waiting at each drain
+      `inter_arrival_ns`
+        ``Histogram`` of the time between receiving successive events
+      `latency_ns`
+        ``Histogram`` of the time from receiving to delivering events
+    '''
+    def __init__(self):
+        self.received = 0
+        self.delivered = 0
+        self.removed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.queue_depth = Histogram()
+        self.inter_arrival_ns = Histogram()
+        self.latency_ns = Histogram()
+        self._last_arrival = None
+
+    def record_received(self, timestamp, count=1):
+        '''Records `count` events received together at `timestamp`.'''
+        if count <= 0:
+            return
+        last = self._last_arrival
+        self._last_arrival = timestamp
+        self.received += count
+        if last is not None:
+            self.inter_arrival_ns.add(timestamp - last)
+        if count > 1:
+            self.inter_arrival_ns.add(0, count - 1)
+
+    def record_delivered(self, timestamp, now):
+        '''Records the delivery at `now` of an event received at
+        `timestamp`, which may be None if unknown.'''
+        self.delivered += 1
+        if timestamp:
+            self.latency_ns.add(now - timestamp)
+
+    def record_drain(self, events, now, depth=None):
+        '''Records the delivery at `now` of a batch of `events`, a list
+        of event objects, an ``spnav.views.EventViews`` batch or an
+        array of ``spnav_event_dtype``.  `depth` is the number of events
+        that were waiting, ``len(events)`` if None.'''
+        self.queue_depth.add(len(events) if depth is None else depth)
+        if hasattr(events, 'dtype'):
+            timestamps = events['timestamp'].tolist()
+        else:
+            timestamps = [event.timestamp for event in events]
+        for timestamp in timestamps:
+            self.record_delivered(timestamp, now)
+
+    def as_dict(self):
+        '''Returns all statistics as a dict of numbers and dicts.'''
+        return {'received': self.received,
+                'delivered': self.delivered,
+                'removed': self.removed,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'queue_depth': self.queue_depth.as_dict(),
+                'inter_arrival_ns': self.inter_arrival_ns.as_dict(),
+                'latency_ns': self.latency_ns.as_dict()}
+
+class IntervalStats(object):
+    '''Summary of the events seen over an interval, for monitoring.
+
+    ``add()`` takes every batch of events drained, and ``as_dict()``
+    summarizes them: the rate of motion and button events, the minimum,
+    maximum and mean of each motion axis, a ``Histogram`` of the batch
+    sizes, which is the queue depth at each drain, and the mean and
+    standard deviation (jitter) of the time between motion events.
+    ``reset()`` starts the next interval.  Adding an event costs a few
+    comparisons per axis.
+    '''
+    def __init__(self, now=None):
+        self._last_motion = None
+        self.reset(now)
+
+    def reset(self, now=None):
+        '''Forgets all events and starts a new interval at `now`,
+        ``time.monotonic_ns()`` if None.'''
+        self.started = time.monotonic_ns() if now is None else now
+        self.motion = 0
+        self.buttons = 0
+        self.queue_depth = Histogram()
+        self._min = [None] * 6
+        self._max = [None] * 6
+        self._sum = [0] * 6
+        # Count, sum and sum of squares of the motion inter-arrival times
+        self._intervals = 0
+        self._interval_sum = 0
+        self._interval_squares = 0
+
+    def add(self, events, depth=None):
+        '''Records a batch of event objects drained together.  `depth`
+        is the number of events that were waiting, ``len(events)`` if
+        None.'''
+        self.queue_depth.add(len(events) if depth is None else depth)
+        low, high, total = self._min, self._max, self._sum
+        for event in events:
+            if event.ev_type != SPNAV_EVENT_MOTION:
+                self.buttons += 1
+                continue
+            self.motion += 1
+            values = event.translation + event.rotation
+            for i in range(6):
+                value = values[i]
+                total[i] += value
+                if low[i] is None or value < low[i]:
+                    low[i] = value
+                if high[i] is None or value > high[i]:
+                    high[i] = value
+            timestamp = event.timestamp
+            if timestamp:
+                if self._last_motion is not None:
+                    interval = timestamp - self._last_motion
+                    self._intervals += 1
+                    self._interval_sum += interval
+                    self._interval_squares += interval * interval
+                self._last_motion = timestamp
+
+    def as_dict(self, now=None):
+        '''Returns the summary of the interval up to `now` as a dict.
+        Rates are per second, times in nanoseconds, and values that
+        cannot be computed are None.'''
+        if now is None:
+            now = time.monotonic_ns()
+        seconds = (now - self.started) / 1e9
+        axes = {}
+        for i, name in enumerate(_AXES):
+            axes[name] = {'min': self._min[i],
+                          'max': self._max[i],
+                          'mean': self._sum[i] / float(self.motion)
+                                  if self.motion else None}
+        mean = jitter = None
+        if self._intervals:
+            mean = self._interval_sum / float(self._intervals)
+            variance = self._interval_squares / float(self._intervals) \
+                - mean * mean
+            jitter = math.sqrt(max(variance, 0.0))
+        return {'seconds': seconds,
+                'motion': self.motion,
+                'buttons': self.buttons,
+                'motion_rate': self.motion / seconds if seconds > 0 else None,
+                'button_rate': self.buttons / seconds if seconds > 0
+                               else None,
+                'axes': axes,
+                'queue_depth': self.queue_depth.as_dict(),
+                'inter_arrival_ns': {'mean': mean, 'jitter': jitter}}
@@ -0,0 +1,330 @@
+'''spnav.testing: a fake spacenavd for tests and load measurements
+
+``FakeDaemon`` listens on a temporary AF_UNIX socket and speaks the
+spacenavd client protocol, so the socket backends can be exercised
+without a device::
+
+  >>> from spnav import unixsock
+  >>> from spnav.testing import FakeDaemon, synthetic_events
+  >>> with FakeDaemon() as daemon:
+  ...     unixsock.spnav_open(daemon.path)
+  ...     daemon.wait_for_clients(1)
+  ...     daemon.play(synthetic_events(10000), rate=20000)
+  ...     event = unixsock.spnav_wait_event()
+
+Like spacenavd, the fake daemon sends every event to all connected
+clients.  Clients that do not keep up never stall the daemon: data
+they have not read is queued, and ``queue_depth()`` estimates how many
+events are waiting for the slowest client.
+'''
+
+import fcntl
+import math
+import os
+import select
+import shutil
+import socket
+import struct
+import tempfile
+import termios
+import threading
+import time
+
+from spnav import SpnavException
+from spnav.unixsock import packet, PACKET_SIZE, UEV_PRESS, UEV_RELEASE, \
+    encode_event
+
+def period_timestamp():
+    '''Returns the current ``time.monotonic_ns()`` in microseconds,
+    truncated to the 32 bit signed int of the `period` field.'''
+    stamp = (time.monotonic_ns() // 1000) & 0xffffffff
+    return stamp - (1 << 32) if stamp & 0x80000000 else stamp
+
+def period_latency_us(period):
+    '''Returns the microseconds since `period` was set with
+    ``period_timestamp()``.  Only meaningful for latencies below about
+    71 minutes, after which the 32 bit timestamp wraps.'''
+    return (period_timestamp() - period) & 0xffffffff
+
+def synthetic_events(count=None, button_every=0, amplitude=350):
+    '''Generates a stream of synthetic events as packet tuples.
+
+    Motion follows a slow sine wave on each axis.
+
+      `count`: **int**
+        Number of events to generate, forever if None.
+      `button_every`: **int**
+        If non-zero, every `button_every` events is a press or release
+        of button 0, alternately.
+      `amplitude`: **int**
+        Peak axis value.
+    '''
+    i = 0
+    press = True
+    while count is None or i < count:
+        i += 1
+        if button_every and i % button_every == 0:
+            yield (UEV_PRESS if press else UEV_RELEASE, 0, 0, 0, 0, 0, 0, 0)
+            press = not press
+            continue
+        phase = i * 0.01
+        yield (0,) + tuple(int(amplitude * math.sin(phase + axis))
+                           for axis in range(6)) + (16,)
+
+class _Client(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.outgoing = bytearray()
+
+    def send(self, data):
+        '''Sends `data` after anything still queued.  Whatever the socket
+        does not accept is queued.'''
+        if self.outgoing:
+            self.outgoing += data
+            data = self.outgoing
+        try:
+            sent = self.sock.send(data)
+        except BlockingIOError:
+            sent = 0
+        if data is self.outgoing:
+            del self.outgoing[:sent]
+        else:
+            self.outgoing += data[sent:]
+
+    def queued_bytes(self):
+        '''Bytes sent to the client but not read by it yet.'''
+        unread = struct.unpack('i', fcntl.ioctl(self.sock, termios.TIOCOUTQ,
+                                                b'\0' * 4))[0]
+        return unread + len(self.outgoing)
+
+class FakeDaemon(object):
+    '''Fake spacenavd listening on an AF_UNIX socket.
+
+      `path`: **str**
+        Socket path.  If None, a socket in a new temporary directory is
+        used, which is removed again by ``stop()``.
+      `timestamp`: **bool**
+        If True, the `period` field of every motion event sent is
+        replaced by ``period_timestamp()``, so clients can compute the
+        delivery latency with ``period_latency_us()``.
+
+    The `sent` attribute counts the events sent so far.
+    '''
+    def __init__(self, path=None, timestamp=False):
+        self._tmpdir = None
+        if path is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='spnav-')
+            path = os.path.join(self._tmpdir, 'spnav.sock')
+        self.path = path
+        self.timestamp = timestamp
+        self.sent = 0
+        self._clients = []
+        self._lock = threading.Lock()
+        self._client_joined = threading.Condition(self._lock)
+        self._listener = None
+        self._threads = []
+        self._stopping = threading.Event()
+        self._playback = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        '''Starts listening for clients.'''
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(16)
+        self._stopping.clear()
+        self._start_thread(self._io_loop)
+
+    def stop(self):
+        '''Stops playback, disconnects all clients and removes the
+        socket.'''
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._playback = None
+        with self._lock:
+            for client in self._clients:
+                client.sock.close()
+            self._clients = []
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            os.unlink(self.path)
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir)
+            self._tmpdir = None
+
+    def _start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args,
+                                  name='FakeDaemon')
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+        return thread
+
+    def _io_loop(self):
+        '''Accepts new clients and passes data queued for slow clients on
+        to their sockets once they have room.'''
+        while not self._stopping.is_set():
+            with self._lock:
+                waiting = [client.sock for client in self._clients
+                           if client.outgoing]
+            readable, writable, _ = select.select([self._listener], waiting,
+                                                  [], 0.005)
+            with self._lock:
+                for client in list(self._clients):
+                    if client.sock in writable:
+                        self._send_to(client, b'')
+                if readable:
+                    sock, _ = self._listener.accept()
+                    self._clients.append(_Client(sock))
+                    self._client_joined.notify_all()
+
+    def client_count(self):
+        '''Returns the number of connected clients.'''
+        with self._lock:
+            return len(self._clients)
+
+    def wait_for_clients(self, count, timeout=5.0):
+        '''Waits until at least `count` clients have connected.'''
+        with self._lock:
+            if not self._client_joined.wait_for(
+                    lambda: len(self._clients) >= count, timeout):
+                raise SpnavException('only %d of %d clients connected'
+                                     % (len(self._clients), count))
+
+    def queue_depth(self):
+        '''Returns an estimate of the number of events sent but not yet
+        read by the slowest client.  The kernel counts its bookkeeping
+        overhead as queued data too, so this is an upper bound.  Use
+        ``spnav.unixsock.Connection.queue_depth()`` on the client side
+        for an exact count.'''
+        with self._lock:
+            return max([client.queued_bytes() for client in self._clients]
+                       or [0]) // PACKET_SIZE
+
+    def send(self, events):
+        '''Sends `events` to all clients at once.
+
+          `events`: sequence
+            ``SpnavMotionEvent``/``SpnavButtonEvent`` instances, or
+            8-tuples in the spacenavd packet layout.
+        '''
+        buf = bytearray(len(events) * PACKET_SIZE)
+        stamp = period_timestamp() if self.timestamp else None
+        for i, event in enumerate(events):
+            if not isinstance(event, tuple):
+                event = encode_event(event)
+            if stamp is not None and event[0] == 0:
+                event = event[:7] + (stamp,)
+            packet.pack_into(buf, i * PACKET_SIZE, *event)
+        with self._lock:
+            for client in list(self._clients):
+                self._send_to(client, buf)
+            self.sent += len(events)
+
+    def send_raw(self, data):
+        '''Sends the bytes `data` to all clients as they are, such as
+        part of a packet.'''
+        with self._lock:
+            for client in list(self._clients):
+                self._send_to(client, data)
+
+    def disconnect(self):
+        '''Closes the connections to all clients, as spacenavd going
+        away would.  New clients can still connect.'''
+        with self._lock:
+            for client in self._clients:
+                client.sock.close()
+            self._clients = []
+
+    def _send_to(self, client, data):
+        try:
+            client.send(data)
+        except OSError:
+            client.sock.close()
+            self._clients.remove(client)
+
+    def flush(self, timeout=None):
+        '''Waits until the data queued for slow clients has been passed
+        on to their sockets.  Returns False if some is still queued after
+        `timeout` seconds.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not any(client.outgoing for client in self._clients):
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+
+    def play(self, events, rate=1000.0, clients=0):
+        '''Sends `events` from a background thread at `rate` events per
+        second, or as fast as possible if `rate` is None.  Returns
+        immediately, use ``wait_playback()`` to wait for the end.
+
+          `clients`: **int**
+            Number of clients to wait for before starting.
+
+        Events that are due together are sent together, so rates of tens
+        of thousands of events per second are kept up.
+        '''
+        if rate is None:
+            timed = ((None, event) for event in events)
+        else:
+            rate = float(rate)
+            timed = ((i / rate, event) for i, event in enumerate(events))
+        self.play_timed(timed, clients)
+
+    def play_timed(self, timed_events, clients=0):
+        '''Like ``play()``, but `timed_events` yields pairs of the time
+        in seconds after the start of playback at which to send an event,
+        and the event.  A time of None sends the event immediately.'''
+        if self._playback is not None and self._playback.is_alive():
+            raise SpnavException('playback already running')
+        self._playback = self._start_thread(self._play_loop,
+                                            iter(timed_events), clients)
+
+    def wait_playback(self, timeout=None):
+        '''Waits for the playback started by ``play()`` to finish.
+        Returns False if it is still running after `timeout` seconds.'''
+        if self._playback is None:
+            return True
+        self._playback.join(timeout)
+        return not self._playback.is_alive()
+
+    def _play_loop(self, timed_events, clients):
+        if clients:
+            with self._lock:
+                while len(self._clients) < clients:
+                    if self._stopping.is_set():
+                        return
+                    self._client_joined.wait(0.05)
+        start = time.monotonic()
+        batch = []
+        for offset, event in timed_events:
+            while offset is not None:
+                delay = start + offset - time.monotonic()
+                if delay <= 0:
+                    break
+                if batch:
+                    self.send(batch)
+                    del batch[:]
+                if self._stopping.wait(min(delay, 0.001)):
+                    return
+            batch.append(event)
+            if len(batch) >= 256:
+                self.send(batch)
+                del batch[:]
+                if self._stopping.is_set():
+                    return
+        if batch:
+            self.send(batch)
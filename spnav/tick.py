@@ -0,0 +1,226 @@
+'''spnav.tick: one sample per tick for fixed-rate control loops
+
+The daemon sends a motion event whenever the device reports one, so a
+loop running at a fixed rate sees anywhere from no events to dozens per
+iteration.  A ``TickSampler`` turns that stream into exactly one
+``Tick`` per iteration, with the motion since the previous tick merged
+into a single value and the button presses and releases in between::
+
+  >>> from spnav.tick import TickSampler
+  >>> sampler = TickSampler(rate=250, timeout=0.1)
+  >>> while running:
+  ...     tick = sampler.wait()           # sleeps until the next tick
+  ...     robot.command(tick.translation, tick.rotation)
+  ...     if 0 in tick.pressed:
+  ...         robot.toggle_gripper()
+
+``sample()`` returns a tick immediately instead, for loops that keep
+their own time.  Neither ever waits for input.
+
+If no event at all arrives for `timeout` seconds the tick is marked
+stale and its motion is zero, so a stalled daemon or a lost connection
+cannot leave the robot moving.  spacenavd only sends motion events when
+the values change, unless its ``repeat-interval`` option is set; set it
+below `timeout` to keep a steadily held cap from tripping the watchdog.
+'''
+
+import collections
+import time
+
+import spnav
+from spnav import SPNAV_EVENT_MOTION, SPNAV_COALESCE_LATEST, \
+    SPNAV_COALESCE_SUM, SPNAV_COALESCE_AVERAGE, SpnavException, \
+    _wait_readable
+from spnav.stats import Histogram
+
+class Tick(collections.namedtuple(
+        'Tick', 'index translation rotation buttons pressed released '
+                'events stale')):
+    '''Input of one tick.
+
+      `index`: **int**
+        Number of the tick, counting from 0
+      `translation`, `rotation`: 3-tuples
+        Motion since the previous tick, merged with the sampler's `mode`.
+        Floats for ``SPNAV_COALESCE_AVERAGE``, otherwise ints.  Zero if
+        the tick is stale.
+      `buttons`: **int**
+        Bitmask of buttons held down at the end of the tick, bit `n` for
+        button number `n`
+      `pressed`, `released`: tuples of ints
+        Numbers of the buttons pressed and released since the previous
+        tick, in order.  A button pressed and released again within one
+        tick appears in both.
+      `events`: **int**
+        Number of events received since the previous tick
+      `stale`: **bool**
+        True if no event arrived within the watchdog timeout
+    '''
+    __slots__ = ()
+
+    def is_down(self, bnum):
+        '''Returns True if button `bnum` is held down.'''
+        return bool(self.buttons & (1 << bnum))
+
+_ZERO = (0, 0, 0, 0, 0, 0)
+
+class TickSampler(object):
+    '''Samples Space Navigator input once per tick.
+
+      `backend`: module
+        ``spnav`` or ``spnav.unixsock``, with an open connection.
+      `rate`: **float**
+        Ticks per second.
+      `mode`: **str**
+        How the motion events of one tick are merged.
+        ``SPNAV_COALESCE_AVERAGE`` averages them, weighted by `period`.
+        ``SPNAV_COALESCE_LATEST`` keeps the most recent values.  With
+        either, the last values are held through ticks without motion
+        events.  ``SPNAV_COALESCE_SUM`` adds them up, giving zero for
+        ticks without motion events.
+      `timeout`: **float**
+        Seconds without any event after which ticks are stale and their
+        motion is zero.  None disables the watchdog.
+
+    Timing counters:
+
+      `ticks`: **int**
+        Ticks sampled so far
+      `stale`: **int**
+        Ticks on which the watchdog zeroed the motion
+      `overruns`: **int**
+        Ticks missed entirely because a tick came at least one whole
+        period late
+      `jitter_ns`: ``spnav.stats.Histogram``
+        Deviation of every interval between ticks from the period, in
+        nanoseconds
+    '''
+    def __init__(self, backend=spnav, rate=100.0, mode=SPNAV_COALESCE_AVERAGE,
+                 timeout=0.1):
+        if mode not in (SPNAV_COALESCE_LATEST, SPNAV_COALESCE_SUM,
+                        SPNAV_COALESCE_AVERAGE):
+            raise SpnavException('Invalid coalesce mode: %r' % (mode,))
+        if rate <= 0:
+            raise SpnavException('rate must be positive')
+        self.backend = backend
+        self.period_ns = int(1e9 / rate)
+        self.mode = mode
+        self.timeout_ns = None if timeout is None else int(timeout * 1e9)
+        self.ticks = 0
+        self.stale = 0
+        self.overruns = 0
+        self.jitter_ns = Histogram()
+        self.buttons = 0
+        self._held = _ZERO
+        self._last_input = None
+        self._last_tick = None
+        self._next_tick = None
+        self._clear()
+
+    def _clear(self):
+        self._sum = [0] * 6
+        self._weight = 0
+        self._latest = None
+        self._pressed = []
+        self._released = []
+        self._events = 0
+
+    def poll(self, now=None):
+        '''Reads the waiting events into the current tick without
+        blocking.  Returns the number of events read.
+
+        ``sample()`` and ``wait()`` do this themselves; calling it in
+        between only keeps the daemon socket from filling up during a
+        long iteration.'''
+        events = self.backend.spnav_drain(as_array=False)
+        if not events:
+            return 0
+        self._last_input = time.monotonic_ns() if now is None else now
+        self._events += len(events)
+        total = self._sum
+        for event in events:
+            if event.ev_type == SPNAV_EVENT_MOTION:
+                values = event.translation + event.rotation
+                self._latest = values
+                if self.mode == SPNAV_COALESCE_SUM:
+                    weight = 1
+                else:
+                    weight = event.period or 1
+                    self._weight += weight
+                for i in range(6):
+                    total[i] += weight * values[i]
+            elif event.press:
+                self.buttons |= 1 << event.bnum
+                self._pressed.append(event.bnum)
+            else:
+                self.buttons &= ~(1 << event.bnum)
+                self._released.append(event.bnum)
+        return len(events)
+
+    def _motion(self):
+        if self.mode == SPNAV_COALESCE_SUM:
+            return tuple(self._sum)
+        if self._latest is None:
+            return self._held
+        if self.mode == SPNAV_COALESCE_LATEST:
+            return tuple(self._latest)
+        weight = float(self._weight)
+        return tuple(v / weight for v in self._sum)
+
+    def sample(self, now=None):
+        '''Returns the ``Tick`` for the input since the previous call,
+        without blocking.
+
+          `now`: **int**
+            ``time.monotonic_ns()`` of the tick, the current time if
+            None.
+        '''
+        self.poll(now)
+        if now is None:
+            now = time.monotonic_ns()
+        last = self._last_tick
+        if last is not None:
+            interval = now - last
+            self.jitter_ns.add(abs(interval - self.period_ns))
+            missed = interval // self.period_ns - 1
+            if missed > 0:
+                self.overruns += missed
+        self._last_tick = now
+        motion = self._motion()
+        stale = (self.timeout_ns is not None
+                 and (self._last_input is None
+                      or now - self._last_input > self.timeout_ns))
+        if stale:
+            motion = _ZERO
+            self.stale += 1
+        if self.mode != SPNAV_COALESCE_SUM:
+            self._held = motion
+        tick = Tick(self.ticks, motion[:3], motion[3:], self.buttons,
+                    tuple(self._pressed), tuple(self._released),
+                    self._events, stale)
+        self.ticks += 1
+        self._clear()
+        return tick
+
+    def wait(self):
+        '''Sleeps until the next tick is due and returns it like
+        ``sample()``.
+
+        Events are read as they arrive while sleeping, by waiting on
+        the connection file descriptor.  Ticks are scheduled on a fixed
+        grid from the first call, so lateness does not accumulate.  If
+        the caller falls one or more whole periods behind, the missed
+        ticks are skipped and counted in `overruns` rather than
+        delivered in a burst.'''
+        now = time.monotonic_ns()
+        due = self._next_tick
+        if due is None:
+            due = now
+        elif now >= due + self.period_ns:
+            due += (now - due) // self.period_ns * self.period_ns
+        deadline = due / 1e9
+        fd = self.backend.spnav_fd()
+        while _wait_readable(fd, deadline):
+            self.poll()
+        self._next_tick = due + self.period_ns
+        return self.sample()
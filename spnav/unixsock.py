@@ -0,0 +1,546 @@
+'''spnav.unixsock: pure-Python client for the spacenavd AF_UNIX protocol
+
+This module talks to ``spacenavd`` directly over its UNIX domain
+socket, without going through ``libspnav`` or ``ctypes``.  It exposes
+the same ``spnav_open``/``spnav_fd``/``spnav_poll_event``/
+``spnav_wait_event``/``spnav_remove_events``/``spnav_close`` functions
+as the ``spnav`` module, and returns the same event classes, so it can
+be used as a drop-in replacement::
+
+  >>> from spnav.unixsock import *
+  >>> spnav_open()
+  >>> event = spnav_wait_event()
+
+The daemon sends every event as a packet of eight native C ints:
+
+  ``data[0]``
+    0 for motion, 1 for button press, 2 for button release
+  ``data[1:7]``
+    x, y, z, rx, ry, rz for motion events, ``data[1]`` is the button
+    number for button events
+  ``data[7]``
+    motion event period
+
+Every event is stamped with the ``time.monotonic_ns()`` at which the
+data holding it was read from the socket.
+'''
+
+import collections
+import fcntl
+import itertools
+import socket
+import struct
+import termios
+import time
+
+from spnav import SPNAV_EVENT_ANY, SPNAV_EVENT_MOTION, SPNAV_EVENT_BUTTON, \
+    SpnavMotionEvent, SpnavButtonEvent, SpnavConnectionException, \
+    SpnavWaitException, coalesce_events, _use_array, _load_numpy, _deadline, \
+    _wait_readable
+
+SPNAV_SOCK_PATH = '/var/run/spnav.sock'
+
+# Event codes in data[0] of a packet from spacenavd
+UEV_MOTION = 0
+UEV_PRESS = 1
+UEV_RELEASE = 2
+
+packet = struct.Struct('8i')
+PACKET_SIZE = packet.size
+
+def decode_packet(data, timestamp=None):
+    '''Convert the 8 ints of a spacenavd packet to an instance of
+    ``SpnavMotionEvent`` or ``SpnavButtonEvent``, received at
+    `timestamp`.
+
+    Returns None if the packet does not hold a valid event type.'''
+    kind, x, y, z, rx, ry, rz, period = data
+    if kind == UEV_MOTION:
+        return SpnavMotionEvent(translation=(x, y, z),
+                                rotation=(rx, ry, rz),
+                                period=period,
+                                timestamp=timestamp)
+    elif kind == UEV_PRESS or kind == UEV_RELEASE:
+        return SpnavButtonEvent(bnum=x, press=kind == UEV_PRESS,
+                                timestamp=timestamp)
+    else:
+        return None
+
+def encode_event(event):
+    '''Convert a ``SpnavMotionEvent`` or ``SpnavButtonEvent`` to the 8
+    ints of a spacenavd packet.  The inverse of ``decode_packet()``.'''
+    if event.ev_type == SPNAV_EVENT_MOTION:
+        return ((UEV_MOTION,) + tuple(event.translation)
+                + tuple(event.rotation) + (event.period,))
+    return (UEV_PRESS if event.press else UEV_RELEASE, event.bnum,
+            0, 0, 0, 0, 0, 0)
+
+def packets_to_array(buf, offset, count, timestamps=0):
+    '''Convert `count` packets stored in `buf` starting at byte `offset`
+    to a NumPy array of ``spnav_event_dtype`` in one vectorized pass.
+    Packets with an invalid event code are dropped.
+
+      `timestamps`: **int** or sequence
+        Receive time of all packets, or one per packet.
+    '''
+    numpy = _load_numpy()
+    from spnav import spnav_event_dtype
+    data = numpy.frombuffer(buf, dtype=numpy.intc, count=count * 8,
+                            offset=offset).reshape(count, 8)
+    kind = data[:, 0]
+    valid = (kind >= UEV_MOTION) & (kind <= UEV_RELEASE)
+    data = data[valid]
+    kind = data[:, 0]
+    motion = kind == UEV_MOTION
+    events = numpy.zeros(len(data), dtype=spnav_event_dtype)
+    events['type'] = numpy.where(motion, SPNAV_EVENT_MOTION,
+                                 SPNAV_EVENT_BUTTON)
+    for i, name in enumerate(('x', 'y', 'z', 'rx', 'ry', 'rz', 'period')):
+        events[name] = numpy.where(motion, data[:, i + 1], 0)
+    events['bnum'] = numpy.where(motion, 0, data[:, 1])
+    events['press'] = kind == UEV_PRESS
+    if not numpy.isscalar(timestamps):
+        timestamps = numpy.asarray(timestamps, dtype=numpy.int64)[valid]
+    events['timestamp'] = timestamps
+    return events
+
+def packet_matches(kind, event_type):
+    '''Returns True if a packet with event code `kind` is an event of
+    `event_type` (``SPNAV_EVENT_MOTION``, ``SPNAV_EVENT_BUTTON`` or
+    ``SPNAV_EVENT_ANY``).'''
+    if event_type == SPNAV_EVENT_ANY:
+        return True
+    elif event_type == SPNAV_EVENT_MOTION:
+        return kind == UEV_MOTION
+    elif event_type == SPNAV_EVENT_BUTTON:
+        return kind == UEV_PRESS or kind == UEV_RELEASE
+    return False
+
+class Connection(object):
+    '''Connection to ``spacenavd`` over its AF_UNIX socket.
+
+    Incoming packets are read with ``recv_into`` into a preallocated
+    buffer large enough for `capacity` events, and decoded from it with
+    ``struct.unpack_from``, so no intermediate byte strings are built.
+
+      `path`: **str**
+        Path of the daemon socket.
+      `capacity`: **int**
+        Number of packets the receive buffer holds before it must grow.
+      `name`: **str**
+        Name identifying the connection, `path` if None.
+
+    Set the `stats` attribute to a ``spnav.stats.SpnavStats`` instance to
+    collect statistics of the events read.
+
+    Raises ``SpnavConnectionException`` if the daemon cannot be reached.
+    '''
+    def __init__(self, path=SPNAV_SOCK_PATH, capacity=64, name=None):
+        self.path = path
+        self.name = path if name is None else name
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except socket.error as e:
+            self.sock.close()
+            raise SpnavConnectionException(
+                'failed to connect to the space navigator daemon at %s: %s'
+                % (path, e))
+        self._buf = bytearray(capacity * PACKET_SIZE)
+        # Unread data lives in self._buf[self._start:self._end]
+        self._start = 0
+        self._end = 0
+        # (end offset, time.monotonic_ns()) of every read still in the
+        # buffer, oldest first.  A packet was received when the read
+        # holding its last byte completed.
+        self._arrivals = collections.deque()
+        # True while batches from poll_views() may refer to self._buf
+        self._exported = False
+        self.stats = None
+
+    def __repr__(self):
+        return '<Connection %r>' % self.name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fileno(self):
+        '''Returns the file descriptor of the socket, or -1 if closed.'''
+        if self.sock is None:
+            return -1
+        return self.sock.fileno()
+
+    def close(self):
+        '''Closes the connection to the daemon.'''
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self._start = self._end = 0
+        self._arrivals.clear()
+
+    def pending(self):
+        '''Returns the number of complete packets already read from the
+        socket but not yet returned.'''
+        return (self._end - self._start) // PACKET_SIZE
+
+    def queue_depth(self):
+        '''Returns the number of complete events waiting, both in the
+        receive buffer and in the socket.'''
+        unread = 0
+        if self.sock is not None:
+            unread = struct.unpack('i', fcntl.ioctl(
+                self.sock, termios.FIONREAD, b'\0' * 4))[0]
+        return (self._end - self._start + unread) // PACKET_SIZE
+
+    def _fill(self):
+        '''Reads available data from the socket into the free end of the
+        buffer, moving unread data to the front or growing the buffer if
+        needed.  Returns the number of bytes read.'''
+        if self.sock is None:
+            raise SpnavConnectionException(
+                'no connection open to the space navigator daemon')
+        buf = self._buf
+        if self._exported:
+            # Views returned by poll_views() keep the old buffer, and
+            # unread data moves to a new one
+            self._buf = bytearray(len(buf))
+            self._exported = False
+        if self._start > 0 or self._buf is not buf:
+            start = self._start
+            unread = self._end - start
+            self._buf[:unread] = buf[start:self._end]
+            buf = self._buf
+            self._start, self._end = 0, unread
+            self._arrivals = collections.deque(
+                (end - start, timestamp)
+                for end, timestamp in self._arrivals if end > start)
+        if self._end == len(buf):
+            buf.extend(bytes(len(buf)))
+        view = memoryview(buf)
+        try:
+            nbytes = self.sock.recv_into(view[self._end:], 0,
+                                         socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return 0
+        finally:
+            view.release()
+        if nbytes == 0:
+            # The daemon hung up.  Events read before that are still
+            # delivered, the socket stays open (and readable) until
+            # close() is called.
+            if self.pending():
+                return 0
+            raise SpnavConnectionException(
+                'connection to the space navigator daemon closed')
+        timestamp = time.monotonic_ns()
+        if self.stats is not None:
+            before = self.pending()
+        self._end += nbytes
+        self._arrivals.append((self._end, timestamp))
+        if self.stats is not None:
+            self.stats.record_received(timestamp, self.pending() - before)
+        return nbytes
+
+    def _arrival(self, end):
+        '''Returns the receive time of the packet ending at offset `end`,
+        forgetting reads that only hold earlier packets.'''
+        arrivals = self._arrivals
+        while arrivals[0][0] < end:
+            arrivals.popleft()
+        return arrivals[0][1]
+
+    def _arrival_times(self, start, count):
+        '''Returns the receive times of `count` packets from offset
+        `start`: a single int if they all came with the same read, the
+        usual case, otherwise a list.'''
+        last = start + count * PACKET_SIZE
+        if not count:
+            return 0
+        if self._arrivals[0][0] >= last:
+            return self._arrival(last)
+        return [self._arrival(end)
+                for end in range(start + PACKET_SIZE, last + 1, PACKET_SIZE)]
+
+    def _next_event(self):
+        '''Decodes buffered packets until a valid event is found.  Returns
+        None if the buffer runs out of complete packets first.'''
+        while self._end - self._start >= PACKET_SIZE:
+            data = packet.unpack_from(self._buf, self._start)
+            self._start += PACKET_SIZE
+            event = decode_packet(data, self._arrival(self._start))
+            if event is not None:
+                return event
+        return None
+
+    def poll_event(self):
+        '''Returns the next event, or None if none is waiting.'''
+        event = self._next_event()
+        while event is None:
+            if not self._fill():
+                return None
+            event = self._next_event()
+        if self.stats is not None:
+            self.stats.record_delivered(event.timestamp, time.monotonic_ns())
+        return event
+
+    def wait_event(self, timeout=None):
+        '''Blocks until an event arrives and returns it, or returns None
+        after `timeout` seconds.'''
+        deadline = _deadline(timeout)
+        event = self.poll_event()
+        while event is None:
+            if not _wait_readable(self.fileno(), deadline):
+                return None
+            event = self.poll_event()
+        return event
+
+    def wait_events(self, timeout=None, max_events=None, as_array=None,
+                    coalesce=None):
+        '''Blocks until at least one event arrives and returns all waiting
+        events, or returns None after `timeout` seconds.'''
+        deadline = _deadline(timeout)
+        events = self.poll_events(max_events, as_array, coalesce)
+        while not len(events):
+            if not _wait_readable(self.fileno(), deadline):
+                return None
+            events = self.poll_events(max_events, as_array, coalesce)
+        return events
+
+    def poll_events(self, max_events=None, as_array=None, coalesce=None):
+        '''Returns up to `max_events` waiting events (all of them if None)
+        without blocking.  See ``spnav_poll_events()`` for `as_array` and
+        `coalesce`.'''
+        use_array = _use_array(as_array)
+        while max_events is None or self.pending() < max_events:
+            if not self._fill():
+                break
+        depth = count = self.pending()
+        if max_events is not None:
+            count = min(count, max_events)
+        start = self._start
+        self._start += count * PACKET_SIZE
+        if use_array:
+            events = packets_to_array(self._buf, start, count,
+                                      self._arrival_times(start, count))
+        else:
+            events = []
+            timestamps = self._arrival_times(start, count)
+            if not isinstance(timestamps, list):
+                timestamps = itertools.repeat(timestamps)
+            for offset, timestamp in zip(range(start, self._start,
+                                               PACKET_SIZE), timestamps):
+                event = decode_packet(packet.unpack_from(self._buf, offset),
+                                      timestamp)
+                if event is not None:
+                    events.append(event)
+        stats = self.stats
+        if coalesce is not None:
+            count = len(events)
+            events = coalesce_events(events, coalesce)
+            if stats is not None:
+                stats.coalesced += count - len(events)
+        if stats is not None:
+            stats.record_drain(events, time.monotonic_ns(), depth)
+        return events
+
+    def poll_views(self, max_events=None):
+        '''Like ``poll_events()``, but returns the events as a
+        ``spnav.views.EventViews`` batch over the receive buffer,
+        decoding nothing until it is accessed.'''
+        from spnav.views import EventViews
+        while max_events is None or self.pending() < max_events:
+            if not self._fill():
+                break
+        depth = count = self.pending()
+        if max_events is not None:
+            count = min(count, max_events)
+        if not count:
+            # An empty batch must not hold a view of the buffer either,
+            # or the buffer could not be resized while it is kept
+            views = EventViews(b'', 0, 0)
+        else:
+            start = self._start
+            self._start += count * PACKET_SIZE
+            views = EventViews(self._buf, start, count,
+                               self._arrival_times(start, count))
+            self._exported = True
+        if self.stats is not None:
+            self.stats.record_drain(views, time.monotonic_ns(), depth)
+        return views
+
+    def remove_events(self, event_type):
+        '''Reads everything waiting on the socket, then discards queued
+        events of `event_type`.  Returns the number of events removed.'''
+        while self._fill():
+            pass
+        buf = self._buf
+        kept = self._start
+        removed = 0
+        arrivals = collections.deque()
+        for offset in range(self._start,
+                            self._end - PACKET_SIZE + 1, PACKET_SIZE):
+            kind = packet.unpack_from(buf, offset)[0]
+            if packet_matches(kind, event_type):
+                removed += 1
+            else:
+                timestamp = self._arrival(offset + PACKET_SIZE)
+                if kept != offset:
+                    buf[kept:kept + PACKET_SIZE] = \
+                        buf[offset:offset + PACKET_SIZE]
+                kept += PACKET_SIZE
+                arrivals.append((kept, timestamp))
+        # Move any trailing partial packet down behind the kept ones
+        tail = (self._end - self._start) % PACKET_SIZE
+        if tail:
+            buf[kept:kept + tail] = buf[self._end - tail:self._end]
+            arrivals.append((kept + tail, self._arrivals[-1][1]))
+        self._end = kept + tail
+        self._arrivals = arrivals
+        if self.stats is not None:
+            self.stats.removed += removed
+        return removed
+
+
+### libspnav-style module interface using a single global connection
+
+_connection = None
+
+def _get_connection():
+    if _connection is None:
+        raise SpnavConnectionException(
+            'no connection open to the space navigator daemon')
+    return _connection
+
+def spnav_open(path=SPNAV_SOCK_PATH):
+    '''Open connection to the daemon via AF_UNIX socket.
+
+      `path`: **str**
+        Path of the daemon socket.
+
+    Raises ``SpnavConnectionException`` if connection cannot be
+    established or is already open.
+    '''
+    global _connection
+    if _connection is not None:
+        raise SpnavConnectionException(
+            'connection to the space navigator daemon already open')
+    _connection = Connection(path)
+
+def spnav_fd():
+    '''Returns the file descriptor of the socket connected to the
+    daemon, or -1 if no connection is open.'''
+    if _connection is None:
+        return -1
+    return _connection.fileno()
+
+def spnav_close():
+    '''Closes connection to the daemon.'''
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+def spnav_wait_event(timeout=None):
+    '''Blocks waiting for Space Navigator events.
+
+       The wait happens in ``select()``, so it can be interrupted with
+       Ctrl-C.
+
+      `timeout`: **float**
+        Maximum time to wait in seconds.  None waits forever.
+
+       Returns: None if the timeout expired, otherwise an instance of
+       ``SpnavMotionEvent`` or ``SpnavButtonEvent``.
+    '''
+    try:
+        return _get_connection().wait_event(timeout)
+    except SpnavConnectionException as e:
+        raise SpnavWaitException(str(e))
+
+def spnav_wait_events(timeout=None, max_events=None, as_array=None,
+                      coalesce=None):
+    '''Blocks until at least one Space Navigator event is waiting, then
+    returns all waiting events like ``spnav_poll_events()``.
+
+      `timeout`: **float**
+        Maximum time to wait in seconds.  None waits forever.
+
+       Returns: None if the timeout expired, otherwise the events in
+       arrival order.
+    '''
+    try:
+        return _get_connection().wait_events(timeout, max_events,
+                                             as_array, coalesce)
+    except SpnavConnectionException as e:
+        raise SpnavWaitException(str(e))
+
+def spnav_poll_event():
+    '''Polls for waiting for Space Navigator events.
+
+       Returns: None if no waiting events, otherwise an instance of
+       ``SpnavMotionEvent`` or ``SpnavButtonEvent``.
+    '''
+    return _get_connection().poll_event()
+
+def spnav_poll_events(max_events=None, as_array=None, coalesce=None):
+    '''Polls for all waiting Space Navigator events at once.
+
+      `max_events`: **int**
+        Maximum number of events to return.  If None, the whole queue
+        is drained.
+      `as_array`: **bool**
+        If True, return a NumPy array of ``spnav_event_dtype``.  If False,
+        return a list of ``SpnavMotionEvent`` and ``SpnavButtonEvent``
+        instances.  The default is to return an array when NumPy is
+        installed.
+      `coalesce`: **str**
+        If given, merge consecutive motion events with this
+        ``coalesce_events()`` mode.  `max_events` limits the number of
+        events read before merging.
+
+       Returns: the waiting events in arrival order, empty if there are
+       none.
+    '''
+    return _get_connection().poll_events(max_events, as_array, coalesce)
+
+def spnav_drain(as_array=None, coalesce=None):
+    '''Returns every waiting Space Navigator event, emptying the queue.
+    Equivalent to ``spnav_poll_events(None, as_array, coalesce)``.'''
+    return _get_connection().poll_events(None, as_array, coalesce)
+
+def spnav_poll_views(max_events=None):
+    '''Returns up to `max_events` waiting events (all of them if None)
+    without blocking, as a ``spnav.views.EventViews`` batch decoded
+    lazily from the receive buffer.'''
+    return _get_connection().poll_views(max_events)
+
+def spnav_stats(enable=True):
+    '''Returns the ``spnav.stats.SpnavStats`` collecting statistics of
+    the events read from the open connection, starting the collection
+    first if needed.
+
+      `enable`: **bool**
+        If False, stop collecting statistics and return None.
+    '''
+    connection = _get_connection()
+    if not enable:
+        connection.stats = None
+    elif connection.stats is None:
+        from spnav.stats import SpnavStats
+        connection.stats = SpnavStats()
+    return connection.stats
+
+def spnav_remove_events(event_type):
+    '''Removes pending Space Navigator events from the queue.
+
+      `event_type`: **int**
+        The type of events to remove.  ``SPNAV_EVENT_MOTION`` or
+        ``SPNAV_EVENT_BUTTON`` removes just motion or button events,
+        respectively.  ``SPNAV_EVENT_ANY`` removes both types of events.
+
+      Returns: the number of events removed.
+    '''
+    return _get_connection().remove_events(event_type)
@@ -0,0 +1,164 @@
+'''spnav.views: lazy event views over a buffer of spacenavd packets
+
+Converting a batch of events builds an event object and two tuples per
+event, even for events the application then skips.  ``EventViews``
+instead wraps the packets of a batch where they were received, and
+decodes a field only when it is read::
+
+  >>> from spnav import unixsock
+  >>> connection = unixsock.Connection()
+  >>> views = connection.poll_views()
+  >>> for view in views:
+  ...     if view.ev_type == SPNAV_EVENT_BUTTON:
+  ...         handle_button(view.bnum, view.press)
+  >>> latest = views[-1].rotation      # memoryview of 3 ints
+
+`translation` and `rotation` are ``memoryview`` slices of the buffer,
+so they are not copied either.  A batch keeps its buffer alive for as
+long as it or any of its views is referenced; the connection reads
+later events into a fresh buffer rather than overwrite it.  ``copy()``
+detaches a view or batch from the buffer, and ``freeze()`` converts it
+to ordinary ``SpnavMotionEvent`` and ``SpnavButtonEvent`` objects.
+'''
+
+import itertools
+
+from spnav import SPNAV_EVENT_MOTION, SPNAV_EVENT_BUTTON
+from spnav.unixsock import UEV_MOTION, UEV_PRESS, UEV_RELEASE, \
+    PACKET_SIZE, decode_packet
+
+# Ints per packet
+_INTS = PACKET_SIZE // 4
+
+class EventView(object):
+    '''One event, decoded from its spacenavd packet on access.
+
+    Has the attributes of ``SpnavMotionEvent`` or ``SpnavButtonEvent``,
+    depending on `ev_type`, which is None for packets with an invalid
+    event code.  `translation` and `rotation` are ``memoryview`` objects
+    of 3 ints rather than tuples; ``tuple(view.translation)`` or
+    ``freeze()`` gives tuples.
+    '''
+    __slots__ = ('data', 'timestamp')
+
+    def __init__(self, data, timestamp=None):
+        # The 8 ints of the packet, as a memoryview of format 'i'
+        self.data = data
+        self.timestamp = timestamp
+
+    @property
+    def ev_type(self):
+        kind = self.data[0]
+        if kind == UEV_MOTION:
+            return SPNAV_EVENT_MOTION
+        elif kind == UEV_PRESS or kind == UEV_RELEASE:
+            return SPNAV_EVENT_BUTTON
+        return None
+
+    @property
+    def translation(self):
+        return self.data[1:4]
+
+    @property
+    def rotation(self):
+        return self.data[4:7]
+
+    @property
+    def period(self):
+        return self.data[7]
+
+    @property
+    def bnum(self):
+        return self.data[1]
+
+    @property
+    def press(self):
+        return self.data[0] == UEV_PRESS
+
+    def copy(self):
+        '''Returns a view of a private copy of the packet.'''
+        return EventView(memoryview(self.data.tobytes()).cast('i'),
+                         self.timestamp)
+
+    def freeze(self):
+        '''Returns the event as a ``SpnavMotionEvent`` or
+        ``SpnavButtonEvent``, or None if the packet is invalid.'''
+        return decode_packet(self.data.tolist(), self.timestamp)
+
+    def __str__(self):
+        return str(self.freeze())
+
+    def __repr__(self):
+        return '<EventView %s>' % self
+
+class EventViews(object):
+    '''A batch of events stored as consecutive spacenavd packets.
+
+      `buf`: buffer
+        Object holding the packets, such as a ``bytearray``.
+      `offset`: **int**
+        Byte offset of the first packet in `buf`.
+      `count`: **int**
+        Number of packets.
+      `timestamps`: **int** or list
+        Receive time of all packets, or one per packet.
+
+    Supports ``len()``, indexing, including negative indices, and
+    iteration.  Each access creates a new ``EventView``.
+    '''
+    __slots__ = ('ints', 'timestamps')
+
+    def __init__(self, buf, offset, count, timestamps=None):
+        view = memoryview(buf)[offset:offset + count * PACKET_SIZE]
+        self.ints = view.cast('i')
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.ints) // _INTS
+
+    def _timestamp(self, index):
+        if isinstance(self.timestamps, list):
+            return self.timestamps[index]
+        return self.timestamps
+
+    def __getitem__(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('event index out of range')
+        start = index * _INTS
+        return EventView(self.ints[start:start + _INTS],
+                         self._timestamp(index))
+
+    def __iter__(self):
+        ints = self.ints
+        timestamps = self.timestamps
+        if not isinstance(timestamps, list):
+            timestamps = itertools.repeat(timestamps)
+        for start, timestamp in zip(range(0, len(ints), _INTS), timestamps):
+            yield EventView(ints[start:start + _INTS], timestamp)
+
+    @property
+    def codes(self):
+        '''Event code of every packet (``UEV_MOTION``, ``UEV_PRESS`` or
+        ``UEV_RELEASE``), as a strided ``memoryview``, for finding the
+        events of interest without creating any views.'''
+        return self.ints[::_INTS]
+
+    def copy(self):
+        '''Returns the batch over a private copy of its packets.'''
+        timestamps = self.timestamps
+        if isinstance(timestamps, list):
+            timestamps = list(timestamps)
+        return EventViews(self.ints.tobytes(), 0, len(self), timestamps)
+
+    def freeze(self):
+        '''Returns a list of ``SpnavMotionEvent`` and
+        ``SpnavButtonEvent``, skipping invalid packets.'''
+        events = []
+        for view in self:
+            event = view.freeze()
+            if event is not None:
+                events.append(event)
+        return events
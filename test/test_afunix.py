@@ -1,4 +1,8 @@
 from nose.tools import raises, assert_equals
+import os
+import select
+import threading
+import time
 import spnav
 from util import *
 
@@ -55,7 +59,7 @@ def test_spnav_wait_event_motion():
     def motion(event):
         fill_motion_event(event)
         return 1
-    m = mock_libspnav({'spnav_wait_event' : motion })
+    m = mock_libspnav({'spnav_poll_event' : motion })
     event = spnav.spnav_wait_event()
     assert event is not None
     assert_equals(event.translation, (-1,2,-3))
@@ -65,7 +69,7 @@ def test_spnav_wait_event_button():
     def button(event):
         fill_button_event(event)
         return 1
-    m = mock_libspnav({'spnav_wait_event' : button })
+    m = mock_libspnav({'spnav_poll_event' : button })
     event = spnav.spnav_wait_event()
     assert event is not None
     assert_equals(event.bnum, 0)
@@ -73,6 +77,124 @@ def test_spnav_wait_event_button():
 
 @raises(spnav.SpnavWaitException)
 def test_spnav_wait_event_fail():
-    m = mock_libspnav({'spnav_wait_event' : 0 })
+    m = mock_libspnav({'spnav_poll_event' : 0, 'spnav_fd' : -1 })
     spnav.spnav_wait_event()
 
+def test_spnav_wait_event_timeout():
+    read_fd, write_fd = os.pipe()
+    try:
+        m = mock_libspnav({'spnav_poll_event' : 0, 'spnav_fd' : read_fd })
+        assert spnav.spnav_wait_event(timeout=0.01) is None
+        assert spnav.spnav_wait_events(timeout=0.01) is None
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+def test_spnav_wait_event_wakeup():
+    read_fd, write_fd = os.pipe()
+    def motion(event):
+        if not select.select([read_fd], [], [], 0)[0]:
+            return 0
+        fill_motion_event(event)
+        return 1
+    try:
+        m = mock_libspnav({'spnav_poll_event' : motion, 'spnav_fd' : read_fd })
+        threading.Timer(0.01, os.write, (write_fd, b'x')).start()
+        event = spnav.spnav_wait_event(timeout=5.0)
+        assert_equals(event.translation, (-1,2,-3))
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+def test_spnav_poll_events_array():
+    m = mock_libspnav({'spnav_poll_event' :
+                       queued_events(fill_motion_event, fill_button_event) })
+    events = spnav.spnav_poll_events(as_array=True)
+    assert_equals(len(events), 2)
+    assert_equals(events['type'].tolist(),
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+    assert_equals(events[0]['rz'], 30)
+    assert_equals(events[1]['press'], True)
+
+def test_spnav_poll_events_max():
+    m = mock_libspnav({'spnav_poll_event' :
+                       queued_events(*([fill_motion_event] * 5)) })
+    assert_equals(len(spnav.spnav_poll_events(3, as_array=False)), 3)
+    assert_equals(len(spnav.spnav_drain(as_array=False)), 2)
+
+def test_spnav_drain_list():
+    m = mock_libspnav({'spnav_poll_event' :
+                       queued_events(fill_button_event, fill_motion_event) })
+    events = spnav.spnav_drain(as_array=False)
+    assert_equals(events[0].bnum, 0)
+    assert_equals(events[1].translation, (-1,2,-3))
+    assert_equals(spnav.spnav_drain(as_array=False), [])
+
+def test_spnav_drain_coalesce():
+    m = mock_libspnav({'spnav_poll_event' :
+                       queued_events(fill_motion_event, fill_motion_event,
+                                     fill_button_event) })
+    events = spnav.spnav_drain(as_array=True,
+                               coalesce=spnav.SPNAV_COALESCE_LATEST)
+    assert_equals(events['type'].tolist(),
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+
+def test_spnav_poll_raw():
+    def motion(event):
+        fill_motion_event(event)
+        return 1
+    m = mock_libspnav({'spnav_poll_event' : motion })
+    first = spnav.spnav_poll_raw()
+    assert_equals(first.motion.rz, 30)
+    assert spnav.spnav_poll_raw() is first
+
+def test_spnav_poll_raw_none():
+    m = mock_libspnav({'spnav_poll_event' : 0 })
+    assert spnav.spnav_poll_raw() is None
+
+def test_spnav_wait_events():
+    m = mock_libspnav({'spnav_poll_event' :
+                       queued_events(fill_motion_event, fill_button_event) })
+    events = spnav.spnav_wait_events(timeout=1.0, as_array=False)
+    assert_equals(len(events), 2)
+
+def test_spnav_poll_event_timestamp():
+    def motion(event):
+        fill_motion_event(event)
+        return 1
+    m = mock_libspnav({'spnav_poll_event' : motion })
+    before = time.monotonic_ns()
+    event = spnav.spnav_poll_event()
+    assert before <= event.timestamp <= time.monotonic_ns()
+    events = spnav.spnav_poll_events(2, as_array=True)
+    assert events['timestamp'][0] >= event.timestamp
+
+def test_spnav_stats():
+    m = mock_libspnav({'spnav_poll_event' :
+                       queued_events(fill_motion_event, fill_motion_event,
+                                     fill_button_event),
+                       'spnav_remove_events' : 2 })
+    stats = spnav.spnav_stats()
+    try:
+        spnav.spnav_drain(as_array=False,
+                          coalesce=spnav.SPNAV_COALESCE_LATEST)
+        spnav.spnav_remove_events(spnav.SPNAV_EVENT_ANY)
+        result = stats.as_dict()
+        assert_equals(result['received'], 3)
+        assert_equals(result['delivered'], 2)
+        assert_equals(result['coalesced'], 1)
+        assert_equals(result['removed'], 2)
+        assert_equals(result['queue_depth']['max'], 3)
+    finally:
+        spnav.spnav_stats(False)
+
+def test_spnav_stats_poll_event():
+    m = mock_libspnav({'spnav_poll_event' : queued_events(fill_motion_event)})
+    stats = spnav.spnav_stats()
+    try:
+        spnav.spnav_poll_event()
+        assert_equals(stats.delivered, 1)
+        # Delivered as soon as read from libspnav: no latency to record
+        assert_equals(stats.latency_ns.count, 0)
+    finally:
+        spnav.spnav_stats(False)
@@ -0,0 +1,74 @@
+from nose.tools import raises, assert_equals
+import asyncio
+import gc
+import spnav
+from spnav import unixsock, aio
+from util import *
+
+@with_daemon
+def test_next_event_timeout(daemon):
+    async def main():
+        return await aio.next_event(timeout=0.01, backend=unixsock)
+    assert asyncio.run(main()) is None
+
+@with_daemon
+def test_next_event_buffered(daemon):
+    daemon.send([MOTION, PRESS])
+    async def main():
+        return [await aio.next_event(backend=unixsock) for i in range(2)]
+    events = asyncio.run(main())
+    assert_equals(events[0].translation, (-1,2,-3))
+    assert_equals(events[1].bnum, 3)
+
+@with_daemon
+def test_events_wakeup(daemon):
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, daemon.send, [MOTION, MOTION])
+        loop.call_later(0.02, daemon.send, [RELEASE])
+        received = []
+        async for event in aio.events(backend=unixsock):
+            received.append(event)
+            if len(received) == 3:
+                break
+        return received
+    events = asyncio.run(main())
+    assert_equals([e.ev_type for e in events],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_MOTION,
+                   spnav.SPNAV_EVENT_BUTTON])
+
+@with_daemon
+def test_event_reader_coalesce(daemon):
+    daemon.send([MOTION, MOTION, MOTION])
+    async def main():
+        reader = aio.EventReader(unixsock, coalesce=spnav.SPNAV_COALESCE_SUM)
+        return await reader.next_event(), await reader.next_event(0.01)
+    event, nothing = asyncio.run(main())
+    assert_equals(event.translation, (-3,6,-9))
+    assert nothing is None
+
+@raises(spnav.SpnavConnectionException)
+@with_daemon
+def test_next_event_daemon_gone(daemon):
+    async def main():
+        asyncio.get_running_loop().call_later(0.01, daemon.disconnect)
+        await aio.next_event(backend=unixsock)
+    asyncio.run(main())
+
+@with_daemon
+def test_reader_released_with_loop(daemon):
+    async def main():
+        return aio.get_reader(unixsock)
+    reader = asyncio.run(main())
+    gc.collect()
+    assert reader.loop is None
+    assert_equals(len(aio._readers), 0)
+
+@with_daemon
+def test_close_drops_reader(daemon):
+    async def main():
+        reader = aio.get_reader(unixsock)
+        reader.close()
+        return reader, aio.get_reader(unixsock)
+    closed, reader = asyncio.run(main())
+    assert reader is not closed
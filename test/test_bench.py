@@ -0,0 +1,36 @@
+from nose.tools import assert_equals
+import json
+import sys
+from spnav import bench
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+def test_percentile():
+    assert_equals(bench.percentile(list(range(100)), 0.5), 50)
+    assert_equals(bench.percentile(list(range(100)), 0.99), 99)
+    assert bench.percentile([], 0.5) is None
+
+def test_run_socket_case():
+    result = bench.run_case('batch', 1000, memory_count=100)
+    assert_equals(result['events'], 1000)
+    assert result['latency_p99_us'] >= result['latency_p50_us']
+    assert result['bytes_per_event'] > 0
+
+def test_run_fake_lib_case():
+    result = bench.run_case('convert', 1000, memory_count=100)
+    assert_equals(result['events'], 1000)
+    assert result['latency_p50_us'] is None
+
+def test_main_json():
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        bench.main(['-n', '200', '--json', 'wait', 'x11_event'])
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    results = json.loads(output)['results']
+    assert_equals([r['case'] for r in results], ['wait', 'x11_event'])
@@ -0,0 +1,116 @@
+from nose.tools import raises, assert_equals
+import spnav
+from spnav import SpnavButtonEvent, SpnavMotionEvent
+from spnav.buttons import ButtonState, Gesture, GESTURE_CHORD, \
+    GESTURE_LONG_PRESS, GESTURE_DOUBLE_PRESS
+
+def at(ms):
+    '''Returns a time `ms` milliseconds into a test.'''
+    return (1000 + ms) * 1000000
+
+def press(bnum, ms):
+    return SpnavButtonEvent(bnum, True, at(ms))
+
+def release(bnum, ms):
+    return SpnavButtonEvent(bnum, False, at(ms))
+
+def test_is_down():
+    buttons = ButtonState()
+    buttons.update([press(0, 0), press(3, 1),
+                    SpnavMotionEvent((1, 2, 3), (4, 5, 6), 16)], at(1))
+    assert buttons.is_down(0)
+    assert buttons.is_down(3)
+    assert not buttons.is_down(1)
+    buttons.update(release(0, 2), at(2))
+    assert_equals(buttons.buttons, 1 << 3)
+
+def test_pressed_and_released_since():
+    buttons = ButtonState()
+    buttons.update([press(0, 0)], at(0))
+    mark = buttons.tick
+    assert not buttons.pressed_since(mark, 0)
+    buttons.update([press(1, 10), release(0, 10)], at(10))
+    assert buttons.pressed_since(mark, 1)
+    assert not buttons.pressed_since(mark, 0)
+    assert buttons.released_since(mark, 0)
+    assert_equals(buttons.pressed_since(mark), 1 << 1)
+    assert_equals(buttons.released_since(mark - 1), 1 << 0)
+    assert_equals(buttons.pressed_since(mark - 1), 0b11)
+    assert_equals(buttons.pressed_since(buttons.tick), 0)
+
+def test_array_batch():
+    if spnav.numpy is None:
+        return
+    buttons = ButtonState(chords=[(0, 1)])
+    events = spnav.events_to_array([
+        press(0, 0), SpnavMotionEvent((1, 2, 3), (4, 5, 6), 16),
+        press(1, 20)])
+    assert_equals(buttons.update(events, at(20)),
+                  [Gesture(GESTURE_CHORD, (0, 1), at(20))])
+    assert_equals(buttons.buttons, 0b11)
+
+def test_chord():
+    buttons = ButtonState(chords=[(1, 0)], chord_window=0.05,
+                          double_press=None)
+    assert_equals(buttons.update([press(0, 0)], at(0)), [])
+    assert_equals(buttons.update([press(1, 10)], at(10)),
+                  [Gesture(GESTURE_CHORD, (0, 1), at(10))])
+    # Reported once while held, again after being pressed anew
+    assert_equals(buttons.update([], at(20)), [])
+    assert_equals(buttons.update([release(1, 20), press(1, 30)], at(30)),
+                  [Gesture(GESTURE_CHORD, (0, 1), at(30))])
+
+def test_chord_repressed_too_late():
+    # The window counts from the first press of the chord
+    buttons = ButtonState(chords=[(1, 0)], chord_window=0.05,
+                          double_press=None)
+    buttons.update([press(0, 0), press(1, 10)], at(10))
+    assert_equals(buttons.update([release(1, 20), press(1, 80)], at(80)),
+                  [])
+
+def test_chord_too_slow():
+    buttons = ButtonState(chords=[(0, 1)], chord_window=0.05)
+    gestures = buttons.update([press(0, 0), press(1, 80)], at(80))
+    assert_equals(gestures, [])
+
+def test_long_press():
+    buttons = ButtonState(long_press=0.5)
+    buttons.update([press(2, 0)], at(0))
+    assert_equals(buttons.check(at(499)), [])
+    assert_equals(buttons.check(at(600)),
+                  [Gesture(GESTURE_LONG_PRESS, (2,), at(500))])
+    assert_equals(buttons.check(at(700)), [])
+
+def test_long_press_released_in_batch():
+    buttons = ButtonState(long_press=0.5)
+    gestures = buttons.update([press(2, 0), release(2, 600)], at(600))
+    assert_equals(gestures, [Gesture(GESTURE_LONG_PRESS, (2,), at(500))])
+    gestures = buttons.update([press(2, 1000), release(2, 1100)],
+                              at(2000))
+    assert_equals(gestures, [])
+
+def test_double_press():
+    buttons = ButtonState(double_press=0.3, long_press=None)
+    gestures = buttons.update([press(0, 0), release(0, 50), press(0, 200),
+                               release(0, 250), press(0, 400)], at(400))
+    assert_equals(gestures, [Gesture(GESTURE_DOUBLE_PRESS, (0,), at(200))])
+    gestures = buttons.update([release(0, 450), press(0, 900)], at(900))
+    assert_equals(gestures, [])
+
+def test_repeated_press_ignored():
+    buttons = ButtonState()
+    buttons.update([press(0, 0)], at(0))
+    mark = buttons.tick
+    assert_equals(buttons.update([press(0, 100)], at(100)), [])
+    assert not buttons.pressed_since(mark, 0)
+
+def test_reset():
+    buttons = ButtonState()
+    buttons.update([press(0, 0)], at(0))
+    buttons.reset()
+    assert_equals((buttons.buttons, buttons.tick), (0, 0))
+    assert_equals(buttons.check(at(10000)), [])
+
+@raises(spnav.SpnavException)
+def test_chord_needs_two_buttons():
+    ButtonState(chords=[(1, 1)])
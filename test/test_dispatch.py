@@ -0,0 +1,112 @@
+from nose.tools import raises, assert_equals
+import spnav
+from spnav import SpnavButtonEvent, SpnavMotionEvent, SPNAV_EVENT_MOTION, \
+    SPNAV_EVENT_BUTTON
+from spnav.dispatch import Dispatcher
+
+def motion(x):
+    return SpnavMotionEvent((x, 0, 0), (0, 0, 0), 16, 1000)
+
+def button(bnum, press=True):
+    return SpnavButtonEvent(bnum, press, 1000)
+
+class Log(object):
+    def __init__(self):
+        self.calls = []
+
+    def handler(self, name):
+        def handle(events):
+            self.calls.append((name, events))
+        return handle
+
+def test_by_type():
+    log = Log()
+    dispatcher = Dispatcher()
+    dispatcher.add(log.handler('motion'), SPNAV_EVENT_MOTION)
+    dispatcher.add(log.handler('button'), SPNAV_EVENT_BUTTON)
+    dispatcher.add(log.handler('any'))
+    events = [motion(1), None, button(2)]
+    dispatcher.dispatch(events)
+    assert_equals(log.calls, [('motion', events[0]), ('any', events[0]),
+                              ('button', events[2]), ('any', events[2])])
+
+def test_by_button():
+    log = Log()
+    dispatcher = Dispatcher()
+    dispatcher.add(log.handler('all'), SPNAV_EVENT_BUTTON)
+    dispatcher.add(log.handler('one'), bnum=1)
+    dispatcher.add(log.handler('late'), SPNAV_EVENT_BUTTON)
+    dispatcher(button(0))
+    dispatcher(button(1))
+    assert_equals([name for name, event in log.calls],
+                  ['all', 'late', 'all', 'one', 'late'])
+
+def test_batch_handlers():
+    log = Log()
+    dispatcher = Dispatcher()
+    dispatcher.add(log.handler('motion'), SPNAV_EVENT_MOTION, batch=True)
+    dispatcher.add(log.handler('button 3'), bnum=3, batch=True)
+    dispatcher.add(log.handler('each'), SPNAV_EVENT_MOTION)
+    events = [motion(1), button(0), motion(2), button(3, False)]
+    dispatcher.dispatch(events)
+    assert_equals(log.calls, [('each', events[0]), ('each', events[2]),
+                              ('motion', [events[0], events[2]]),
+                              ('button 3', [events[3]])])
+    log.calls = []
+    dispatcher.dispatch([button(0)])
+    assert_equals(log.calls, [])
+
+def test_array():
+    if spnav.numpy is None:
+        return
+    log = Log()
+    dispatcher = Dispatcher()
+    dispatcher.add(log.handler('button'), SPNAV_EVENT_BUTTON)
+    dispatcher.add(log.handler('motion'), SPNAV_EVENT_MOTION, batch=True)
+    events = spnav.events_to_array([motion(1), button(5), motion(2)])
+    dispatcher.dispatch(events)
+    (name, event), (batch_name, batch) = log.calls
+    assert_equals((name, event.bnum, event.press, event.timestamp),
+                  ('button', 5, True, 1000))
+    assert_equals(batch_name, 'motion')
+    assert_equals(list(batch['x']), [1, 2])
+
+def test_remove_and_decorator():
+    log = Log()
+    dispatcher = Dispatcher()
+    handler = dispatcher.on(SPNAV_EVENT_MOTION)(log.handler('motion'))
+    dispatcher.dispatch(motion(1))
+    dispatcher.remove(handler)
+    dispatcher.dispatch(motion(2))
+    assert_equals(len(log.calls), 1)
+
+def test_profile():
+    dispatcher = Dispatcher(profile=True)
+    dispatcher.add(lambda event: None, SPNAV_EVENT_MOTION, name='fast')
+    dispatcher.add(lambda events: sum(range(10000)), batch=True,
+                   name='slow')
+    dispatcher.dispatch([motion(1), motion(2), button(0)])
+    dispatcher.dispatch([motion(3)])
+    fast = dispatcher.stats['fast']
+    assert_equals((fast.calls, fast.events), (3, 3))
+    assert_equals(dispatcher.stats['slow'].events, 4)
+    report = dispatcher.report()
+    assert_equals(report[0][0], 'slow')
+    assert_equals(report[0][1]['calls'], 2)
+    assert report[0][1]['total_ns'] > 0
+    assert report[0][1]['p99'] is not None
+    dispatcher.reset_stats()
+    assert_equals(dispatcher.stats['slow'].calls, 0)
+
+def test_profile_toggle():
+    dispatcher = Dispatcher()
+    dispatcher.add(lambda event: None, name='handler')
+    dispatcher.dispatch(motion(1))
+    assert_equals(dispatcher.stats, {})
+    dispatcher.profile = True
+    dispatcher.dispatch(motion(1))
+    assert_equals(dispatcher.stats['handler'].calls, 1)
+
+@raises(spnav.SpnavException)
+def test_motion_with_button():
+    Dispatcher().add(lambda event: None, SPNAV_EVENT_MOTION, bnum=0)
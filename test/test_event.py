@@ -1,4 +1,4 @@
-from nose.tools import raises
+from nose.tools import raises, assert_equals
 import spnav
 
 def test_spnav_motion_str():
@@ -27,3 +27,77 @@ def test_convert_spnav_event_fail():
     c_event = spnav.spnav_event()
     c_event.type = spnav.SPNAV_EVENT_ANY # not allowed
     spnav.convert_spnav_event(c_event)
+
+def motion(x, period=1):
+    return spnav.SpnavMotionEvent((x, 0, -x), (0, x, 0), period)
+
+def mixed_events():
+    return [motion(1), motion(3, period=3), spnav.SpnavButtonEvent(0, True),
+            motion(5), None, spnav.SpnavButtonEvent(0, False)]
+
+def test_coalesce_events_latest():
+    events = spnav.coalesce_events(mixed_events())
+    assert_equals([e.ev_type for e in events],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON,
+                   spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+    assert_equals(events[0].translation, (3, 0, -3))
+    assert_equals(events[0].period, 4)
+    assert_equals(events[1].press, True)
+    assert_equals(events[2].translation, (5, 0, -5))
+    assert_equals(events[3].press, False)
+
+def test_coalesce_events_sum():
+    events = spnav.coalesce_events(mixed_events(), spnav.SPNAV_COALESCE_SUM)
+    assert_equals(events[0].translation, (4, 0, -4))
+    assert_equals(events[0].rotation, (0, 4, 0))
+
+def test_coalesce_events_average():
+    events = spnav.coalesce_events(mixed_events(),
+                                   spnav.SPNAV_COALESCE_AVERAGE)
+    # (1*1 + 3*3) / 4
+    assert_equals(events[0].translation, (2, 0, -2))
+
+def test_coalesce_events_average_no_period():
+    events = spnav.coalesce_events([motion(1, 0), motion(4, 0)],
+                                   spnav.SPNAV_COALESCE_AVERAGE)
+    assert_equals(events[0].rotation, (0, 2, 0))
+
+def test_coalesce_events_array():
+    for mode in (spnav.SPNAV_COALESCE_LATEST, spnav.SPNAV_COALESCE_SUM,
+                 spnav.SPNAV_COALESCE_AVERAGE):
+        expected = spnav.coalesce_events(mixed_events(), mode)
+        events = spnav.coalesce_events(
+            spnav.events_to_array([e for e in mixed_events() if e]), mode)
+        assert_equals(events['type'].tolist(),
+                      [e.ev_type for e in expected])
+        assert_equals(events['x'].tolist(),
+                      [getattr(e, 'translation', (0,))[0] for e in expected])
+        assert_equals(events['period'].tolist(),
+                      [getattr(e, 'period', 0) for e in expected])
+
+@raises(spnav.SpnavException)
+def test_coalesce_events_bad_mode():
+    spnav.coalesce_events([], 'bogus')
+
+@raises(AttributeError)
+def test_spnav_event_slots():
+    event = spnav.SpnavButtonEvent(1, True)
+    event.extra = 1
+
+def test_convert_spnav_event_motion():
+    c_event = spnav.spnav_event()
+    c_event.type = spnav.SPNAV_EVENT_MOTION
+    c_event.motion.x, c_event.motion.rz = -7, 9
+    c_event.motion.period = 12
+    event = spnav.convert_spnav_event(c_event)
+    assert_equals(event.translation, (-7, 0, 0))
+    assert_equals(event.rotation, (0, 0, 9))
+    assert_equals(event.period, 12)
+
+def test_convert_spnav_event_button():
+    c_event = spnav.spnav_event()
+    c_event.type = spnav.SPNAV_EVENT_BUTTON
+    c_event.button.bnum = 4
+    c_event.button.press = 0
+    event = spnav.convert_spnav_event(c_event)
+    assert_equals((event.bnum, event.press), (4, False))
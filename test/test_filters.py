@@ -0,0 +1,71 @@
+from nose.tools import raises, assert_equals
+import numpy
+import spnav
+from spnav.filters import *
+
+def motion(values, period=16):
+    return spnav.SpnavMotionEvent(values[:3], values[3:], period)
+
+SAMPLES = [motion((i * 7 % 50 - 25, -i, 2 * i, 300 - i, 0, i * i % 90))
+           for i in range(40)]
+
+def assert_close(a, b):
+    assert numpy.allclose(a, b), (a, b)
+
+def scalar_results(pipeline, events):
+    return [pipeline(event) for event in events]
+
+def check_paths_agree(make):
+    batch = make()(SAMPLES)
+    scalar = scalar_results(make(), SAMPLES)
+    assert_close(batch, scalar)
+    # State carries over between batches
+    split = make()
+    assert_close(numpy.vstack([split(SAMPLES[:13]), split(SAMPLES[13:])]),
+                 batch)
+
+def test_stateless_paths_agree():
+    check_paths_agree(lambda: Pipeline(Deadzone(10), Sensitivity(0.5),
+                                       Invert('y', 'rz'), Lock(4),
+                                       Expo(0.4)))
+
+def test_ema_paths_agree():
+    check_paths_agree(lambda: Pipeline(EMA(alpha=0.3)))
+    check_paths_agree(lambda: Pipeline(EMA(time_constant=0.05)))
+
+def test_one_euro_paths_agree():
+    check_paths_agree(lambda: Pipeline(OneEuro(1.0, 0.01)))
+
+def test_deadzone():
+    assert_equals(Pipeline(Deadzone(10)).process_one([5, -5, 15, -15, 10, 0],
+                                                     0.016),
+                  (0, 0, 5, -5, 0, 0))
+
+def test_expo_full_scale():
+    result = Pipeline(Expo(1.0, full_scale=100)).process_one(
+        [100, -100, 50, 0, 0, 0], 0.016)
+    assert_close(result, (100, -100, 12.5, 0, 0, 0))
+
+def test_ema_first_value_and_reset():
+    pipeline = Pipeline(EMA(alpha=0.5))
+    assert_equals(pipeline(motion((10,) * 6)), (10.0,) * 6)
+    assert_equals(pipeline(motion((0,) * 6)), (5.0,) * 6)
+    pipeline.reset()
+    assert_equals(pipeline(motion((0,) * 6)), (0.0,) * 6)
+
+def test_ema_long_batch():
+    values = numpy.ones((1000, 6))
+    result = Pipeline(EMA(alpha=1.0)).process(values, numpy.full(1000, 0.01))
+    assert_close(result, values)
+
+def test_event_array():
+    events = spnav.events_to_array(SAMPLES[:3] +
+                                   [spnav.SpnavButtonEvent(0, True)])
+    result = Pipeline(Sensitivity(2))(events)
+    assert_equals(result.shape, (3, 6))
+    assert_close(result[1], numpy.array(SAMPLES[1].translation
+                                        + SAMPLES[1].rotation) * 2)
+
+@raises(spnav.SpnavException)
+def test_bad_axis():
+    Invert('w')
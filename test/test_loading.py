@@ -0,0 +1,109 @@
+from nose.tools import raises, assert_equals
+import os
+import subprocess
+import sys
+import spnav
+from spnav import unixsock
+from util import *
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def with_library(value):
+    '''Runs the test with SPNAV_LIBRARY set to `value` and libspnav not
+    yet loaded.'''
+    def decorator(test):
+        def wrapper():
+            saved = (spnav.libspnav, spnav._libspnav_missing,
+                     os.environ.get(spnav.SPNAV_LIBRARY_ENV))
+            spnav.libspnav = None
+            spnav._libspnav_missing = False
+            os.environ[spnav.SPNAV_LIBRARY_ENV] = value
+            try:
+                test()
+            finally:
+                spnav.spnav_close()
+                spnav.libspnav, spnav._libspnav_missing, env = saved
+                if env is None:
+                    del os.environ[spnav.SPNAV_LIBRARY_ENV]
+                else:
+                    os.environ[spnav.SPNAV_LIBRARY_ENV] = env
+        wrapper.__name__ = test.__name__
+        return wrapper
+    return decorator
+
+def run_python(code):
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    return subprocess.check_output([sys.executable, '-c', code], env=env,
+                                   universal_newlines=True).strip()
+
+def test_import_is_lazy():
+    output = run_python('import sys, spnav; '
+                        'print(spnav.libspnav, "numpy" in sys.modules)')
+    assert_equals(output, 'None False')
+
+def test_numpy_on_first_use():
+    output = run_python('import spnav; '
+                        'print(spnav.spnav_event_dtype.names[0])')
+    assert_equals(output, 'type')
+
+@with_library('none')
+def test_library_disabled():
+    assert spnav.load_libspnav() is None
+    assert_equals(spnav.spnav_fd(), -1)
+
+@with_library('/nonexistent/libspnav.so.0')
+def test_library_not_found():
+    assert spnav.load_libspnav() is None
+    assert spnav._libspnav_missing
+
+@raises(spnav.SpnavConnectionException)
+@with_library('none')
+def test_x11_requires_library():
+    spnav.spnav_x11_open(0, 0)
+
+@with_library('none')
+def test_fallback_to_unixsock():
+    daemon = FakeDaemon()
+    daemon.start()
+    real_open = unixsock.spnav_open
+    unixsock.spnav_open = lambda: real_open(daemon.path)
+    try:
+        spnav.spnav_open()
+        daemon.wait_for_clients(1)
+        assert_equals(spnav.spnav_fd(), unixsock.spnav_fd())
+        daemon.send([MOTION, PRESS])
+        assert_equals(spnav.spnav_wait_event(1.0).translation, (-1,2,-3))
+        events = spnav.spnav_wait_events(1.0, as_array=False)
+        assert_equals(events[0].bnum, 3)
+        spnav.spnav_close()
+        assert_equals(unixsock.spnav_fd(), -1)
+    finally:
+        unixsock.spnav_open = real_open
+        daemon.stop()
+
+@with_library('none')
+def test_not_open():
+    for poll in (spnav.spnav_poll_event, spnav.spnav_poll_events,
+                 spnav.spnav_poll_raw,
+                 lambda: spnav.spnav_remove_events(spnav.SPNAV_EVENT_ANY)):
+        try:
+            poll()
+        except spnav.SpnavConnectionException:
+            pass
+        else:
+            assert False, 'no exception without a connection'
+
+@raises(spnav.SpnavWaitException)
+@with_library('none')
+def test_wait_not_open():
+    spnav.spnav_wait_event(timeout=0.01)
+
+def test_modules_import_lazily():
+    output = run_python('import sys, spnav.unixsock, spnav.record, '
+                        'spnav.views; print("numpy" in sys.modules)')
+    assert_equals(output, 'False')
+
+def test_record_dtype_on_first_use():
+    output = run_python('import spnav.record; '
+                        'print(spnav.record.record_dtype.names[0])')
+    assert_equals(output, 'timestamp')
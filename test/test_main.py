@@ -0,0 +1,71 @@
+from nose.tools import assert_equals
+import io
+import json
+import os
+import subprocess
+import sys
+from spnav import SpnavMotionEvent, SpnavButtonEvent
+from spnav.__main__ import Output, format_json, format_binary
+from spnav.record import record, decode_record
+from spnav.testing import FakeDaemon, synthetic_events
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENTS = [SpnavMotionEvent((1, -2, 3), (-4, 5, -6), 16, 1000),
+          SpnavButtonEvent(3, True, 2000)]
+
+def run_monitor(events, *args):
+    '''Runs ``python -m spnav`` on a fake daemon sending `events`, and
+    returns its output.'''
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    with FakeDaemon() as daemon:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'spnav', '--socket', daemon.path]
+            + list(args), stdout=subprocess.PIPE, env=env)
+        daemon.wait_for_clients(1)
+        daemon.send(events)
+        output = process.communicate(timeout=10)[0]
+    assert_equals(process.returncode, 0)
+    return output
+
+def test_format_json():
+    lines = format_json(EVENTS).decode().splitlines()
+    assert_equals(json.loads(lines[0]),
+                  {'type': 'motion', 'timestamp': 1000,
+                   'translation': [1, -2, 3], 'rotation': [-4, 5, -6],
+                   'period': 16})
+    assert_equals(json.loads(lines[1]),
+                  {'type': 'button', 'timestamp': 2000, 'bnum': 3,
+                   'press': True})
+
+def test_format_binary():
+    data = format_binary(EVENTS)
+    timestamp, event = decode_record(record.unpack_from(data, record.size))
+    assert_equals((timestamp, event.bnum, event.press), (2000, 3, True))
+
+def test_output_blocks():
+    file = io.BytesIO()
+    output = Output(file, block=10)
+    output.write(b'12345')
+    assert_equals(file.getvalue(), b'')
+    assert output.due is not None
+    output.write(b'67890')
+    assert_equals(file.getvalue(), b'1234567890')
+    assert output.due is None
+
+def test_monitor_csv():
+    output = run_monitor(EVENTS, '--format', 'csv', '-n', '2').decode()
+    lines = output.splitlines()
+    assert_equals(lines[0], 'timestamp,type,x,y,z,rx,ry,rz,period,bnum,press')
+    assert_equals(lines[1].split(',')[1:], ['motion', '1', '-2', '3', '-4',
+                                            '5', '-6', '16', '0', '0'])
+    assert_equals(lines[2].split(',')[1:], ['button', '0', '0', '0', '0',
+                                            '0', '0', '0', '3', '1'])
+
+def test_monitor_stats():
+    output = run_monitor(list(synthetic_events(50, button_every=10)),
+                         '--stats', '--format', 'json', '--interval', '0.2',
+                         '-d', '0.3')
+    summary = json.loads(output.decode().splitlines()[0])
+    assert_equals((summary['motion'], summary['buttons']), (45, 5))
+    assert summary['axes']['x']['max'] >= summary['axes']['x']['min']
@@ -0,0 +1,67 @@
+from nose.tools import raises, assert_equals
+import spnav
+from spnav.multiplex import Multiplexer
+from util import *
+
+def with_daemons(test):
+    def wrapper():
+        daemons = [FakeDaemon(), FakeDaemon()]
+        for daemon in daemons:
+            daemon.start()
+        mux = Multiplexer()
+        try:
+            for i, daemon in enumerate(daemons):
+                mux.open(daemon.path, name='device%d' % i)
+                daemon.wait_for_clients(1)
+            test(daemons, mux)
+        finally:
+            mux.close()
+            for daemon in daemons:
+                daemon.stop()
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+@with_daemons
+def test_wait_batches(daemons, mux):
+    daemons[0].send([MOTION, PRESS])
+    daemons[1].send([RELEASE])
+    batches = {}
+    while sum(len(events) for events in batches.values()) < 3:
+        for connection, events in mux.wait_batches(1.0, as_array=False):
+            batches.setdefault(connection.name, []).extend(events)
+    assert_equals([e.ev_type for e in batches['device0']],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+    assert_equals(batches['device1'][0].press, False)
+
+@with_daemons
+def test_wait_events_timeout(daemons, mux):
+    assert mux.wait_events(timeout=0.01) is None
+    assert_equals(mux.poll_batches(), [])
+
+@with_daemons
+def test_wait_events_tagged(daemons, mux):
+    daemons[1].send([MOTION])
+    pairs = mux.wait_events(timeout=1.0)
+    assert_equals(len(pairs), 1)
+    assert pairs[0][0] is mux.connections[1]
+    assert_equals(pairs[0][1].translation, (-1,2,-3))
+
+@with_daemons
+def test_daemon_gone(daemons, mux):
+    daemons[0].disconnect()
+    daemons[1].send([PRESS])
+    seen = []
+    try:
+        while True:
+            seen.extend(mux.wait_events(timeout=1.0))
+    except spnav.SpnavConnectionException:
+        pass
+    assert_equals(len(mux.connections), 1)
+    if not seen:
+        seen = mux.wait_events(timeout=1.0)
+    assert_equals(seen[0][0].name, 'device1')
+
+@raises(spnav.SpnavWaitException)
+def test_no_connections():
+    with Multiplexer() as mux:
+        mux.wait_batches(timeout=0)
@@ -0,0 +1,73 @@
+from nose.tools import raises, assert_equals
+import math
+import numpy
+import spnav
+from spnav.pose import PoseIntegrator, FRAME_LOCAL, quat_rotate, \
+    quat_from_rotation_vector
+
+def motion(t, r, period=10):
+    return spnav.SpnavMotionEvent(t, r, period)
+
+EVENTS = [motion((i % 7 - 3, 2, -i % 5), (100 * (i % 3), -50, 30 * i), 8)
+          for i in range(37)]
+
+def assert_close(a, b):
+    assert numpy.allclose(a, b), (a, b)
+
+def check_paths_agree(**options):
+    one = PoseIntegrator(**options)
+    for event in EVENTS:
+        one.update(event)
+    listed = PoseIntegrator(**options)
+    listed.update(EVENTS[:10])
+    listed.update(EVENTS[10:])
+    array = PoseIntegrator(**options)
+    array.update(spnav.events_to_array(EVENTS))
+    for other in (listed, array):
+        assert_close(other.position, one.position)
+        assert_close(other.orientation, one.orientation)
+
+def test_world_paths_agree():
+    check_paths_agree(translation_scale=0.5, rotation_scale=0.01)
+
+def test_local_paths_agree():
+    check_paths_agree(translation_scale=0.5, rotation_scale=0.01,
+                      frame=FRAME_LOCAL)
+
+def test_quarter_turn():
+    pose = PoseIntegrator(rotation_scale=math.pi / 2)
+    pose.update(motion((0, 0, 0), (0, 0, 1), period=1000))
+    assert_close(quat_rotate(pose.orientation, (1, 0, 0)), (0, 1, 0))
+
+def test_local_frame_moves_along_heading():
+    pose = PoseIntegrator(rotation_scale=math.pi / 2, frame=FRAME_LOCAL)
+    pose.update([motion((0, 0, 0), (0, 0, 1), period=1000),
+                 motion((2, 0, 0), (0, 0, 0), period=1000)])
+    assert_close(pose.position, (0, 2, 0))
+
+def test_speed():
+    pose = PoseIntegrator()
+    pose.speed = 3.0
+    pose.update(motion((1, 0, 0), (0, 0, 0), period=500))
+    assert_close(pose.position, (1.5, 0, 0))
+
+def test_reset_button():
+    pose = PoseIntegrator(reset_button=1)
+    events = [motion((5, 0, 0), (0, 0, 0), period=1000),
+              spnav.SpnavButtonEvent(1, True),
+              motion((0, 1, 0), (0, 0, 0), period=1000)]
+    pose.update(events)
+    assert_close(pose.position, (0, 1, 0))
+    pose.update(spnav.events_to_array(events))
+    assert_close(pose.position, (0, 1, 0))
+    pose.update(events[1])
+    assert_close(pose.position, (0, 0, 0))
+
+def test_matrix():
+    pose = PoseIntegrator()
+    pose.reset((1, 2, 3), quat_from_rotation_vector((0, 0, math.pi / 2)))
+    assert_close(pose.matrix().dot([1, 0, 0, 1]), [1, 3, 3, 1])
+
+@raises(spnav.SpnavException)
+def test_bad_frame():
+    PoseIntegrator(frame='camera')
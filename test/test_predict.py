@@ -0,0 +1,74 @@
+from nose.tools import raises, assert_equals, assert_almost_equals
+import spnav
+from spnav import SpnavButtonEvent, SpnavMotionEvent
+from spnav.predict import MotionPredictor
+
+MS = 1000000
+
+def ramp(count, start=0, timestamp=1000 * MS):
+    '''Motion rising by 10 units per 10 ms event on every axis: 1000
+    units per second.'''
+    return [SpnavMotionEvent((10 * i,) * 3, (-10 * i,) * 3, 10,
+                             timestamp + 10 * i * MS)
+            for i in range(start, start + count)]
+
+def test_not_ready():
+    predictor = MotionPredictor()
+    assert predictor.predict(0) is None
+    predictor.update([SpnavButtonEvent(0, True)])
+    assert predictor.predict(0) is None
+
+def test_first_event():
+    predictor = MotionPredictor()
+    event = ramp(1, 5)[0]
+    predictor.update(event)
+    assert_equals(predictor.predict(event.timestamp + 20 * MS),
+                  ((50.0,) * 3, (-50.0,) * 3))
+    assert_equals(predictor.time_ns, event.timestamp)
+
+def test_constant_rate():
+    predictor = MotionPredictor(alpha=0.5, beta=0.2)
+    for event in ramp(200):
+        predictor.update(event)
+    last = 10 * 199
+    assert_almost_equals(predictor.rate[0], 1000.0, places=3)
+    translation, rotation = predictor.predict(predictor.time_ns + 30 * MS)
+    assert_almost_equals(translation[0], last + 30, places=3)
+    assert_almost_equals(rotation[2], -last - 30, places=3)
+
+def test_horizon():
+    predictor = MotionPredictor(alpha=0.5, beta=0.2, max_horizon=0.01)
+    predictor.update(ramp(200), 0)
+    now = predictor.time_ns
+    assert_almost_equals(predictor.predict(now + 50 * MS)[0][1],
+                         10 * 199 + 10, places=3)
+    assert_almost_equals(predictor.predict(now - 50 * MS)[0][1],
+                         10 * 199, places=3)
+
+def test_batch_matches_single():
+    if spnav.numpy is None:
+        return
+    events = ramp(37) + [SpnavButtonEvent(1, True)] + ramp(9, 50)
+    events[3].period = 0
+    single = MotionPredictor()
+    for event in events:
+        single.update(event)
+    batch = MotionPredictor()
+    batch.update(events[:1])
+    batch.update(events[1:])
+    array = MotionPredictor()
+    array.update(spnav.events_to_array(events))
+    for other in (batch, array):
+        for a, b in zip(single.value + single.rate,
+                        other.value + other.rate):
+            assert_almost_equals(a, b, places=6)
+        assert_equals(other.time_ns, single.time_ns)
+
+def test_untimed_events():
+    predictor = MotionPredictor()
+    predictor.update([SpnavMotionEvent((1, 2, 3), (4, 5, 6), 16)], now=42)
+    assert_equals(predictor.time_ns, 42)
+
+@raises(spnav.SpnavException)
+def test_unstable():
+    MotionPredictor(alpha=0.9, beta=2.5)
@@ -0,0 +1,122 @@
+from nose.tools import raises, assert_equals
+import os
+import signal
+import time
+import spnav
+from spnav import SpnavMotionEvent, SpnavButtonEvent
+from spnav.process import ProcessReader, encode_batches, batch_header
+from spnav.testing import FakeDaemon, synthetic_events
+from spnav.unixsock import PACKET_SIZE
+
+def with_reader(test, **options):
+    def wrapper():
+        with FakeDaemon() as daemon:
+            reader = ProcessReader(socket_path=daemon.path, **options)
+            reader.start()
+            try:
+                daemon.wait_for_clients(1)
+                test(daemon, reader)
+            finally:
+                reader.stop()
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def received(reader, count):
+    '''Reads the data that has arrived without taking any events, and
+    returns True once `count` events have arrived in total.'''
+    reader.poll_events(0, as_array=False)
+    return reader.stats.events >= count
+
+def test_encode_batches():
+    events = [SpnavMotionEvent((1, 2, 3), (4, 5, 6), 7, 100),
+              SpnavButtonEvent(1, True, 100),
+              SpnavButtonEvent(1, False, 100),
+              SpnavButtonEvent(2, True, 200)]
+    buf = encode_batches(events, max_batch=2)
+    batch = batch_header.size + 2 * PACKET_SIZE
+    assert_equals(len(buf), 3 * batch_header.size + 4 * PACKET_SIZE)
+    assert_equals(batch_header.unpack_from(buf, 0), (100, 2))
+    assert_equals(batch_header.unpack_from(buf, batch), (100, 1))
+    assert_equals(batch_header.unpack_from(
+        buf, batch + batch_header.size + PACKET_SIZE), (200, 1))
+
+@with_reader
+def test_events(daemon, reader):
+    assert reader.pid is not None
+    daemon.send([SpnavMotionEvent((1, 2, 3), (4, 5, 6), 7),
+                 SpnavButtonEvent(2, True)])
+    motion = reader.wait_event(5.0)
+    assert_equals(motion.translation + motion.rotation, (1, 2, 3, 4, 5, 6))
+    assert motion.timestamp <= time.monotonic_ns()
+    button = reader.wait_event(5.0)
+    assert_equals((button.bnum, button.press), (2, True))
+    assert reader.poll_event() is None
+    assert reader.wait_event(0.01) is None
+
+@with_reader
+def test_batches(daemon, reader):
+    daemon.send(list(synthetic_events(100, button_every=10)))
+    events = []
+    while len(events) < 100:
+        events += reader.wait_events(5.0, as_array=False)
+    assert_equals(sum(event.ev_type == spnav.SPNAV_EVENT_BUTTON
+                      for event in events), 10)
+    stats = reader.stats.as_dict()
+    assert_equals(stats['events'], 100)
+    assert stats['mean_batch_size'] >= 1
+    assert_equals(stats['bytes'], batch_header.size * (stats['batches'] + 1)
+                  + 100 * PACKET_SIZE)
+
+@with_reader
+def test_array(daemon, reader):
+    if spnav.numpy is None:
+        return
+    daemon.send(list(synthetic_events(20)))
+    wait_for(lambda: received(reader, 20))
+    events = reader.wait_events(5.0, max_events=15, as_array=True)
+    assert_equals(len(events), 15)
+    assert (events['timestamp'] > 0).all()
+    assert_equals(len(reader.drain(as_array=True)), 5)
+
+@with_reader
+def test_restart(daemon, reader):
+    reader.restart_delay = 0
+    daemon.send([SpnavButtonEvent(1, True)])
+    wait_for(lambda: received(reader, 1))
+    old = reader.pid
+    os.kill(old, signal.SIGKILL)
+    wait_for(lambda: received(reader, 1) and reader.pid not in (None, old))
+    assert_equals(reader.poll_event().bnum, 1)
+    daemon.wait_for_clients(2)
+    assert_equals(reader.stats.restarts, 1)
+    time.sleep(0.1)
+    daemon.send([SpnavButtonEvent(2, True)])
+    assert_equals(reader.wait_event(5.0).bnum, 2)
+
+def test_no_restart():
+    with FakeDaemon() as daemon:
+        reader = ProcessReader(socket_path=daemon.path, restart=False)
+        reader.start()
+        daemon.wait_for_clients(1)
+        daemon.send([SpnavButtonEvent(3, True)])
+        wait_for(lambda: received(reader, 1))
+        os.kill(reader.pid, signal.SIGKILL)
+        wait_for(lambda: received(reader, 1) and reader.fileno() == -1)
+        assert_equals(reader.poll_event().bnum, 3)
+        try:
+            reader.poll_event()
+        except spnav.SpnavConnectionException:
+            pass
+        else:
+            assert False, 'no exception after the reader exited'
+        reader.stop()
+
+@raises(spnav.SpnavConnectionException)
+def test_no_daemon():
+    ProcessReader(socket_path='/nonexistent/spnav.sock').start()
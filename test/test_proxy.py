@@ -0,0 +1,85 @@
+from nose.tools import assert_equals
+import os
+import socket
+import spnav
+from spnav import unixsock
+from spnav.proxy import Proxy, Subscriber
+from util import *
+
+def with_proxy(test, **options):
+    def wrapper():
+        daemon = FakeDaemon()
+        daemon.start()
+        unixsock.spnav_open(daemon.path)
+        daemon.wait_for_clients(1)
+        path = os.path.join(os.path.dirname(daemon.path), 'proxy.sock')
+        proxy = Proxy(unixsock, path, **options)
+        proxy.start()
+        try:
+            test(daemon, proxy)
+        finally:
+            proxy.close()
+            unixsock.spnav_close()
+            daemon.stop()
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def subscribe(proxy, count):
+    connections = [unixsock.Connection(proxy.path) for i in range(count)]
+    while len(proxy.subscribers) < count:
+        proxy.run_once(1.0)
+    return connections
+
+def forward(proxy, count):
+    while proxy.received < count:
+        proxy.run_once(1.0)
+    while any(s.outgoing or s.pending for s in proxy.subscribers):
+        proxy.run_once(0.01)
+
+def test_fan_out():
+    def test(daemon, proxy):
+        first, second = subscribe(proxy, 2)
+        daemon.send([MOTION, PRESS])
+        forward(proxy, 2)
+        for connection in (first, second):
+            events = connection.wait_events(1.0, as_array=False)
+            if len(events) < 2:
+                events += connection.wait_events(1.0, as_array=False)
+            assert_equals([e.ev_type for e in events],
+                          [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+            connection.close()
+    with_proxy(test)()
+
+def test_slow_subscriber_coalesced():
+    sock, other = socket.socketpair()
+    subscriber = Subscriber(sock)
+    motion = spnav.SpnavMotionEvent((1, 2, 3), (4, 5, 6), 16)
+    press = spnav.SpnavButtonEvent(0, True)
+    assert subscriber.queue([motion] * 3 + [press], 4, 'latest')
+    assert subscriber.queue([motion] * 3, 4, 'latest')
+    assert_equals(len(subscriber.pending), 3)
+    assert_equals(subscriber.coalesced, 4)
+    assert not subscriber.queue([press] * 5, 4, 'latest')
+    subscriber.close()
+    other.close()
+
+def test_stuck_subscriber_disconnected():
+    def test(daemon, proxy):
+        stuck, = subscribe(proxy, 1)
+        batch = [MOTION, PRESS] * 64
+        for i in range(10000):
+            if not proxy.subscribers:
+                break
+            daemon.send(batch)
+            proxy.run_once(0.1)
+        assert not proxy.subscribers
+        stuck.close()
+    with_proxy(test, max_pending=16)()
+
+def test_subscriber_hangup():
+    def test(daemon, proxy):
+        connection, = subscribe(proxy, 1)
+        connection.close()
+        while proxy.subscribers:
+            proxy.run_once(1.0)
+    with_proxy(test)()
@@ -0,0 +1,160 @@
+from nose.tools import raises, assert_equals
+import os
+import socket
+import spnav
+from spnav import unixsock
+from spnav.reader import SpnavReader, RingBuffer, DeviceState
+from util import *
+
+class DaemonBackend(object):
+    '''spnav.unixsock connecting to a FakeDaemon.'''
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def spnav_open(self):
+        unixsock.spnav_open(self.daemon.path)
+        self.daemon.wait_for_clients(1)
+
+    def __getattr__(self, name):
+        return getattr(unixsock, name)
+
+def with_reader(test, **options):
+    def wrapper():
+        daemon = FakeDaemon()
+        daemon.start()
+        reader = SpnavReader(DaemonBackend(daemon), **options)
+        reader.start()
+        try:
+            test(daemon, reader)
+        finally:
+            reader.stop()
+            daemon.stop()
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def test_ring_buffer():
+    buf = RingBuffer(3)
+    for i in range(4):
+        buf.push(i)
+    assert buf.full()
+    assert_equals(buf.push(4), 1)
+    assert_equals(buf.pop(), 2)
+    assert_equals(buf.pop_all(), [3, 4])
+    assert buf.pop() is None
+
+@raises(ValueError)
+def test_ring_buffer_capacity():
+    RingBuffer(0)
+
+def test_device_state_buttons():
+    state = DeviceState.IDLE
+    assert not state.is_down(2)
+
+@with_reader
+def test_reader_wait_event(daemon, reader):
+    assert reader.poll_event() is None
+    daemon.send([MOTION, PRESS])
+    assert_equals(reader.wait_event(1.0).translation, (-1,2,-3))
+    assert_equals(reader.wait_event(1.0).bnum, 3)
+    assert reader.wait_event(0.01) is None
+
+@with_reader
+def test_reader_state(daemon, reader):
+    daemon.send([MOTION, PRESS])
+    reader.wait_event(1.0)
+    reader.wait_event(1.0)
+    assert_equals(reader.state.translation, (-1,2,-3))
+    assert_equals(reader.state.rotation, (10,-20,30))
+    assert reader.state.is_down(3)
+    daemon.send([RELEASE])
+    reader.wait_event(1.0)
+    assert_equals(reader.state.buttons, 0)
+
+def test_reader_drop_oldest():
+    def test(daemon, reader):
+        daemon.send([PRESS, MOTION, MOTION, RELEASE])
+        daemon.disconnect()
+        assert_equals(reader.wait_event(1.0).ev_type,
+                      spnav.SPNAV_EVENT_MOTION)
+        assert_equals(reader.drain()[-1].press, False)
+        assert_equals(reader.dropped, 1)
+    with_reader(test, capacity=3)()
+
+def test_reader_coalesce():
+    def test(daemon, reader):
+        daemon.send([PRESS, MOTION, MOTION, RELEASE])
+        daemon.disconnect()
+        events = [reader.wait_event(1.0) for i in range(3)]
+        assert_equals(events[1].translation, (-2,4,-6))
+        assert_equals(reader.dropped, 0)
+        assert_equals(reader.coalesced, 1)
+    with_reader(test, capacity=3, coalesce=spnav.SPNAV_COALESCE_SUM)()
+
+def test_reader_coalesce_batch():
+    def test(daemon, reader):
+        daemon.send([PRESS] + [MOTION] * 6)
+        daemon.disconnect()
+        events = [reader.wait_event(1.0) for i in range(2)]
+        assert_equals(events[1].translation, (-6,12,-18))
+        assert_equals(reader.dropped, 0)
+        assert_equals(reader.coalesced, 5)
+        assert_equals(reader.stats.coalesced, 5)
+    with_reader(test, capacity=3, coalesce=spnav.SPNAV_COALESCE_SUM,
+                stats=True)()
+
+@raises(spnav.SpnavConnectionException)
+@with_reader
+def test_reader_daemon_gone(daemon, reader):
+    daemon.disconnect()
+    reader.wait_event(1.0)
+
+def test_reader_stats_dropped():
+    def test(daemon, reader):
+        daemon.send([MOTION] * 6)
+        while reader.stats.received < 6:
+            reader.wait_event(0.01)
+        events = reader.drain()
+        result = reader.stats.as_dict()
+        assert_equals(result['dropped'], reader.dropped)
+        assert_equals(result['delivered'] + result['dropped'], 6)
+    with_reader(test, capacity=2, stats=True)()
+
+@raises(spnav.SpnavWaitException)
+def test_reader_select_error():
+    daemon = FakeDaemon()
+    daemon.start()
+    backend = DaemonBackend(daemon)
+    r, w = os.pipe()
+    os.close(w)
+    def closed_fd():
+        os.close(r)
+        return r
+    backend.spnav_fd = closed_fd
+    reader = SpnavReader(backend)
+    reader.start()
+    try:
+        reader.wait_event(5.0)
+    finally:
+        reader.stop()
+        daemon.stop()
+
+class HungUpBackend(object):
+    '''Like libspnav after the daemon went away: the socket stays
+    readable, but no events come out of it.'''
+    def spnav_open(self):
+        self.sock, other = socket.socketpair()
+        other.close()
+
+    def spnav_fd(self):
+        return self.sock.fileno()
+
+    def spnav_drain(self, as_array=None):
+        return []
+
+    def spnav_close(self):
+        self.sock.close()
+
+@raises(spnav.SpnavConnectionException)
+def test_reader_hung_up():
+    with SpnavReader(HungUpBackend()) as reader:
+        reader.wait_event(5.0)
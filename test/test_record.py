@@ -0,0 +1,121 @@
+from nose.tools import raises, assert_equals
+import os
+import shutil
+import tempfile
+import time
+import spnav
+from spnav import unixsock, record
+
+EVENTS = [spnav.SpnavMotionEvent((1,-2,3), (-4,5,-6), 16),
+          spnav.SpnavButtonEvent(3, True),
+          spnav.SpnavMotionEvent((7,8,9), (10,11,12), 16),
+          spnav.SpnavButtonEvent(3, False)]
+
+def with_tmpdir(test):
+    def wrapper():
+        tmpdir = tempfile.mkdtemp()
+        try:
+            test(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def write_recording(path, events=EVENTS, step=1000000):
+    with record.Recorder(path, buffer_records=3) as recorder:
+        for i, event in enumerate(events):
+            recorder.write_event(event, timestamp=i * step)
+
+@with_tmpdir
+def test_record_size(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    write_recording(path)
+    assert_equals(os.path.getsize(path),
+                  record.HEADER_SIZE + 4 * record.RECORD_SIZE)
+
+@with_tmpdir
+def test_read_records(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    write_recording(path)
+    records = list(record.read_records(path))
+    assert_equals([t for t, e in records], [0, 1000000, 2000000, 3000000])
+    assert_equals(records[0][1].rotation, (-4,5,-6))
+    assert_equals((records[1][1].bnum, records[1][1].press), (3, True))
+    assert_equals(records[3][1].press, False)
+
+@with_tmpdir
+def test_load(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    write_recording(path)
+    records = record.load(path)
+    assert_equals(len(records), 4)
+    assert not records.flags.writeable
+    assert_equals(records['timestamp'][-1], 3000000)
+    events = record.records_to_events(records)
+    assert_equals(events['bnum'].tolist(), [0, 3, 0, 3])
+    assert_equals(events['press'].tolist(), [False, True, False, False])
+    assert_equals(events['z'].tolist(), [3, 0, 9, 0])
+
+@with_tmpdir
+def test_write_array(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    with record.Recorder(path) as recorder:
+        recorder.write(spnav.events_to_array(EVENTS), timestamp=5)
+    events = record.records_to_events(record.load(path))
+    expected = spnav.events_to_array(EVENTS)
+    expected['timestamp'] = 5
+    assert_equals(events.tolist(), expected.tolist())
+
+@with_tmpdir
+def test_write_event_timestamps(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    with record.Recorder(path) as recorder:
+        recorder.write([spnav.SpnavButtonEvent(1, True, timestamp=42)])
+    timestamp, event = list(record.read_records(path))[0]
+    assert_equals((timestamp, event.timestamp), (42, 42))
+
+@raises(spnav.SpnavException)
+@with_tmpdir
+def test_load_bad_file(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    with open(path, 'wb') as f:
+        f.write(b'not a recording at all')
+    record.load(path)
+
+@raises(spnav.SpnavException)
+@with_tmpdir
+def test_load_truncated_header(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    with open(path, 'wb') as f:
+        f.write(record.MAGIC)
+    list(record.read_records(path))
+
+@with_tmpdir
+def test_replay(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    write_recording(path, step=20000000)
+    with record.Replay(path, speed=2.0) as replay:
+        start = time.monotonic()
+        connection = unixsock.Connection(replay.path)
+        try:
+            events = [connection.wait_event(1.0) for i in range(4)]
+        finally:
+            connection.close()
+    # 60 ms of recording played at double speed
+    assert time.monotonic() - start >= 0.025
+    assert_equals(events[2].translation, (7,8,9))
+    assert_equals(events[3].press, False)
+
+@with_tmpdir
+def test_record_events(tmpdir):
+    path = os.path.join(tmpdir, 'events.rec')
+    write_recording(path)
+    copy = os.path.join(tmpdir, 'copy.rec')
+    with record.Replay(path, speed=None) as replay:
+        unixsock.spnav_open(replay.path)
+        try:
+            assert_equals(record.record_events(copy, unixsock, count=4), 4)
+        finally:
+            unixsock.spnav_close()
+    assert_equals([str(e) for t, e in record.read_records(copy)],
+                  [str(e) for e in EVENTS])
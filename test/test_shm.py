@@ -0,0 +1,65 @@
+from nose.tools import raises, assert_equals
+import ctypes
+import multiprocessing
+import spnav
+from spnav import shm
+
+MOTION = spnav.SpnavMotionEvent((1, -2, 3), (-4, 5, -6), 16, timestamp=1000)
+PRESS = spnav.SpnavButtonEvent(2, True, timestamp=2000)
+
+def with_publisher(test):
+    def wrapper():
+        with shm.StatePublisher() as publisher:
+            with shm.StateReader(publisher.name) as reader:
+                test(publisher, reader)
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def test_layout():
+    assert_equals(ctypes.sizeof(shm.spnav_shared_state), shm.STATE_SIZE)
+    assert_equals(shm.spnav_shared_state.type.offset,
+                  shm.spnav_shared_state.seq.size)
+
+@with_publisher
+def test_initial_state(publisher, reader):
+    state = reader.read()
+    assert_equals(state.seq, 0)
+    assert_equals(state.translation, (0, 0, 0))
+    assert_equals(state.timestamp, 0)
+
+@with_publisher
+def test_publish(publisher, reader):
+    publisher.publish([MOTION, PRESS])
+    state = reader.read()
+    assert_equals(state.seq, 1)
+    assert_equals(state.translation, (1, -2, 3))
+    assert_equals(state.rotation, (-4, 5, -6))
+    assert_equals(state.period, 16)
+    assert state.is_down(2)
+    assert_equals(state.timestamp, 2000)
+    publisher.publish([])
+    assert_equals(reader.seq(), 1)
+
+@raises(spnav.SpnavException)
+@with_publisher
+def test_torn_read(publisher, reader):
+    shm._seq.pack_into(publisher.shm.buf, 0, 3)
+    reader.read_raw(retries=10)
+
+def _read_in_child(name, queue):
+    with shm.StateReader(name) as reader:
+        queue.put(tuple(reader.read()))
+
+@with_publisher
+def test_read_from_other_process(publisher, reader):
+    publisher.publish([MOTION])
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    child = context.Process(target=_read_in_child,
+                            args=(publisher.name, queue))
+    child.start()
+    state = queue.get(timeout=5)
+    child.join()
+    assert_equals(state[1], (1, -2, 3))
+    # The block must survive the reader process exiting
+    assert_equals(reader.read().seq, 1)
@@ -0,0 +1,68 @@
+from nose.tools import assert_equals
+from spnav import SpnavMotionEvent, SpnavButtonEvent
+from spnav.stats import Histogram, SpnavStats, IntervalStats
+
+def test_histogram():
+    hist = Histogram()
+    assert hist.percentile(0.5) is None
+    for value in (0, 1, 3, 100, 100, -5):
+        hist.add(value)
+    result = hist.as_dict()
+    assert_equals(result['count'], 6)
+    assert_equals((result['min'], result['max']), (0, 100))
+    assert_equals(result['buckets'], {0: 2, 1: 1, 3: 1, 127: 2})
+    assert_equals(result['p50'], 1)
+    assert_equals(result['p99'], 100)
+
+def test_histogram_add_count():
+    hist = Histogram()
+    hist.add(7, 3)
+    assert_equals((hist.count, hist.total), (3, 21))
+
+def test_stats_inter_arrival():
+    stats = SpnavStats()
+    stats.record_received(1000, 3)
+    stats.record_received(1500)
+    assert_equals(stats.received, 4)
+    assert_equals(stats.inter_arrival_ns.buckets[0], 2)
+    assert_equals(stats.inter_arrival_ns.max, 500)
+
+def test_stats_drain():
+    stats = SpnavStats()
+    stats.record_received(100, 2)
+    stats.record_drain([Event(100), Event(None)], 400, depth=5)
+    result = stats.as_dict()
+    assert_equals(result['delivered'], 2)
+    assert_equals(result['queue_depth']['max'], 5)
+    assert_equals(result['latency_ns']['count'], 1)
+    assert_equals(result['latency_ns']['max'], 300)
+
+class Event(object):
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+def test_interval_stats():
+    stats = IntervalStats(now=0)
+    stats.add([SpnavMotionEvent((1, 2, 3), (4, 5, 6), 8, 1000),
+               SpnavButtonEvent(0, True, 1000)])
+    stats.add([SpnavMotionEvent((3, -2, 3), (4, 5, 6), 8, 3000),
+               SpnavMotionEvent((5, 0, 3), (4, 5, 6), 8, 7000)], depth=4)
+    result = stats.as_dict(now=2000000000)
+    assert_equals((result['motion'], result['buttons']), (3, 1))
+    assert_equals((result['motion_rate'], result['button_rate']), (1.5, 0.5))
+    assert_equals(result['axes']['x'], {'min': 1, 'max': 5, 'mean': 3.0})
+    assert_equals(result['axes']['y']['min'], -2)
+    assert_equals(result['queue_depth']['max'], 4)
+    assert_equals(result['inter_arrival_ns'], {'mean': 3000.0,
+                                               'jitter': 1000.0})
+    stats.reset(now=2000000000)
+    stats.add([SpnavMotionEvent((0, 0, 0), (0, 0, 0), 8, 9000)])
+    result = stats.as_dict(now=3000000000)
+    assert_equals(result['motion'], 1)
+    assert_equals(result['inter_arrival_ns']['mean'], 2000.0)
+
+def test_interval_stats_empty():
+    result = IntervalStats(now=0).as_dict(now=0)
+    assert_equals(result['motion_rate'], None)
+    assert_equals(result['axes']['rz']['mean'], None)
+    assert_equals(result['inter_arrival_ns']['jitter'], None)
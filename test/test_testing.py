@@ -0,0 +1,83 @@
+from nose.tools import raises, assert_equals
+import time
+import spnav
+from spnav import unixsock
+from spnav.testing import FakeDaemon, synthetic_events, period_latency_us
+
+def with_daemon(test, **options):
+    def wrapper():
+        with FakeDaemon(**options) as daemon:
+            connection = unixsock.Connection(daemon.path)
+            try:
+                daemon.wait_for_clients(1)
+                test(daemon, connection)
+            finally:
+                connection.close()
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def test_synthetic_events_buttons():
+    events = list(synthetic_events(10, button_every=5))
+    assert_equals(len(events), 10)
+    assert_equals(events[4][:2], (unixsock.UEV_PRESS, 0))
+    assert_equals(events[9][:2], (unixsock.UEV_RELEASE, 0))
+
+@with_daemon
+def test_send_events(daemon, connection):
+    daemon.send([spnav.SpnavMotionEvent((1,2,3), (4,5,6), 7),
+                 spnav.SpnavButtonEvent(2, True)])
+    motion = connection.wait_event(1.0)
+    assert_equals(motion.translation + motion.rotation, (1,2,3,4,5,6))
+    assert_equals(connection.wait_event(1.0).bnum, 2)
+    assert_equals(daemon.sent, 2)
+
+@with_daemon
+def test_queue_depth(daemon, connection):
+    daemon.send(list(synthetic_events(100)))
+    time.sleep(0.01)
+    assert daemon.queue_depth() >= 100
+    assert_equals(connection.queue_depth(), 100)
+    assert_equals(len(connection.poll_events(5, as_array=False)), 5)
+    assert_equals(connection.queue_depth(), 95)
+    assert_equals(len(connection.poll_events(as_array=False)), 95)
+    assert_equals(daemon.queue_depth(), 0)
+    assert_equals(connection.queue_depth(), 0)
+
+@with_daemon
+def test_play_rate(daemon, connection):
+    start = time.monotonic()
+    daemon.play(synthetic_events(200), rate=2000)
+    received = 0
+    while received < 200:
+        received += len(connection.wait_events(1.0))
+    assert daemon.wait_playback(1.0)
+    assert time.monotonic() - start >= 0.09
+
+@with_daemon
+def test_play_unthrottled(daemon, connection):
+    daemon.play(synthetic_events(50000), rate=None)
+    received = 0
+    while received < 50000:
+        received += len(connection.wait_events(1.0, as_array=False))
+    assert daemon.wait_playback(1.0)
+
+def test_timestamp():
+    def test(daemon, connection):
+        daemon.send(list(synthetic_events(1)))
+        event = connection.wait_event(1.0)
+        assert period_latency_us(event.period) < 1000000
+    with_daemon(test, timestamp=True)()
+
+@raises(spnav.SpnavException)
+def test_wait_for_clients_timeout():
+    with FakeDaemon() as daemon:
+        daemon.wait_for_clients(1, timeout=0.01)
+
+@with_daemon
+def test_flush(daemon, connection):
+    daemon.send(list(synthetic_events(20000)))
+    assert not daemon.flush(timeout=0.01)
+    received = len(connection.poll_events(as_array=False))
+    while received < 20000:
+        received += len(connection.wait_events(1.0, as_array=False))
+    assert daemon.flush(timeout=1.0)
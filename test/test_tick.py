@@ -0,0 +1,105 @@
+from nose.tools import raises, assert_equals
+import select
+import time
+import spnav
+from spnav import unixsock
+from spnav.tick import TickSampler
+from util import *
+
+MS = 1000000
+
+def sampler(**options):
+    return TickSampler(unixsock, **options)
+
+def arrive(daemon, *packets):
+    daemon.send(packets)
+    select.select([unixsock.spnav_fd()], [], [], 1.0)
+
+@with_daemon
+def test_tick_average(daemon):
+    ticks = sampler(rate=100)
+    arrive(daemon, MOTION, (unixsock.UEV_MOTION, 3, 4, 5, 0, 0, 0, 48),
+           PRESS)
+    tick = ticks.sample(0)
+    assert_equals(tick.index, 0)
+    assert_equals(tick.translation, (2.0, 3.5, 3.0))
+    assert_equals(tick.rotation, (2.5, -5.0, 7.5))
+    assert_equals(tick.pressed, (3,))
+    assert_equals(tick.released, ())
+    assert_equals(tick.events, 3)
+    assert tick.is_down(3)
+    assert not tick.stale
+
+@with_daemon
+def test_tick_sum_and_latest(daemon):
+    for mode, expected in (('sum', (-2, 4, -6)), ('latest', (-1, 2, -3))):
+        ticks = sampler(mode=mode)
+        arrive(daemon, MOTION, MOTION)
+        assert_equals(ticks.sample(0).translation, expected)
+
+@with_daemon
+def test_tick_button_edges(daemon):
+    ticks = sampler()
+    arrive(daemon, PRESS, RELEASE, PRESS)
+    tick = ticks.sample(0)
+    assert_equals(tick.pressed, (3, 3))
+    assert_equals(tick.released, (3,))
+    arrive(daemon, RELEASE)
+    tick = ticks.sample(10 * MS)
+    assert_equals((tick.pressed, tick.released, tick.buttons), ((), (3,), 0))
+
+@with_daemon
+def test_tick_watchdog(daemon):
+    ticks = sampler(rate=100, timeout=0.05)
+    assert ticks.sample(0).stale
+    arrive(daemon, MOTION)
+    ticks.poll(10 * MS)
+    assert_equals(ticks.sample(10 * MS).translation, (-1.0, 2.0, -3.0))
+    # Held while input is recent, zeroed once it is not
+    tick = ticks.sample(50 * MS)
+    assert_equals((tick.translation, tick.events), ((-1.0, 2.0, -3.0), 0))
+    tick = ticks.sample(70 * MS)
+    assert tick.stale
+    assert_equals(tick.translation, (0, 0, 0))
+    assert_equals(ticks.stale, 2)
+    # A button event keeps the ticks fresh, without restoring motion
+    arrive(daemon, PRESS)
+    ticks.poll(80 * MS)
+    tick = ticks.sample(80 * MS)
+    assert not tick.stale
+    assert_equals(tick.rotation, (0, 0, 0))
+
+@with_daemon
+def test_tick_sum_zero_without_motion(daemon):
+    ticks = sampler(mode='sum', timeout=None)
+    arrive(daemon, MOTION)
+    ticks.sample(0)
+    tick = ticks.sample(10 * MS)
+    assert_equals(tick.translation, (0, 0, 0))
+    assert not tick.stale
+
+@with_daemon
+def test_tick_jitter_and_overruns(daemon):
+    ticks = sampler(rate=100)
+    for now in (0, 10, 21, 31, 62):
+        ticks.sample(now * MS)
+    assert_equals(ticks.ticks, 5)
+    assert_equals(ticks.overruns, 2)
+    assert_equals(ticks.jitter_ns.count, 4)
+    assert_equals(ticks.jitter_ns.max, 21 * MS)
+
+@with_daemon
+def test_tick_wait(daemon):
+    ticks = sampler(rate=100)
+    start = time.monotonic()
+    ticks.wait()
+    daemon.send([MOTION])
+    tick = ticks.wait()
+    tick = ticks.wait()
+    assert time.monotonic() - start >= 0.019
+    assert_equals(tick.index, 2)
+    assert_equals(ticks.ticks, 3)
+
+@raises(spnav.SpnavException)
+def test_tick_invalid_mode():
+    TickSampler(unixsock, mode='median')
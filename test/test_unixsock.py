@@ -0,0 +1,150 @@
+from nose.tools import raises, assert_equals
+import os
+import tempfile
+import time
+import spnav
+from spnav import unixsock
+from util import *
+
+@raises(spnav.SpnavConnectionException)
+def test_spnav_open_fail():
+    unixsock.Connection(os.path.join(tempfile.gettempdir(), 'no-such.sock'))
+
+@with_daemon
+def test_spnav_fd(daemon):
+    assert unixsock.spnav_fd() >= 0
+
+def test_spnav_fd_closed():
+    assert_equals(unixsock.spnav_fd(), -1)
+
+@with_daemon
+def test_spnav_poll_event_none(daemon):
+    assert unixsock.spnav_poll_event() is None
+
+@with_daemon
+def test_spnav_poll_event_motion(daemon):
+    daemon.send([MOTION])
+    event = unixsock.spnav_wait_event()
+    assert_equals(event.ev_type, spnav.SPNAV_EVENT_MOTION)
+    assert_equals(event.translation, (-1,2,-3))
+    assert_equals(event.rotation, (10,-20,30))
+    assert_equals(event.period, 16)
+
+@with_daemon
+def test_spnav_wait_event_button(daemon):
+    daemon.send([PRESS, RELEASE])
+    event = unixsock.spnav_wait_event()
+    assert_equals((event.bnum, event.press), (3, True))
+    event = unixsock.spnav_wait_event()
+    assert_equals((event.bnum, event.press), (3, False))
+
+@with_daemon
+def test_spnav_wait_event_partial_packet(daemon):
+    data = unixsock.packet.pack(*MOTION)
+    daemon.send_raw(data[:5])
+    assert unixsock.spnav_poll_event() is None
+    daemon.send_raw(data[5:])
+    event = unixsock.spnav_wait_event()
+    assert_equals(event.translation, (-1,2,-3))
+
+@with_daemon
+def test_spnav_poll_event_many(daemon):
+    daemon.send([MOTION] * 200)
+    count = 0
+    while count < 200:
+        if unixsock.spnav_wait_event() is not None:
+            count += 1
+    assert unixsock.spnav_poll_event() is None
+
+@with_daemon
+def test_spnav_remove_events(daemon):
+    daemon.send([MOTION, PRESS, MOTION, RELEASE, MOTION])
+    assert_equals(unixsock.spnav_remove_events(spnav.SPNAV_EVENT_MOTION), 3)
+    assert unixsock.spnav_poll_event().press
+    assert not unixsock.spnav_poll_event().press
+    assert unixsock.spnav_poll_event() is None
+
+@raises(spnav.SpnavWaitException)
+@with_daemon
+def test_spnav_wait_event_daemon_gone(daemon):
+    daemon.disconnect()
+    unixsock.spnav_wait_event()
+
+@with_daemon
+def test_spnav_poll_events_array(daemon):
+    daemon.send([MOTION, PRESS, RELEASE])
+    unixsock.spnav_wait_event()
+    events = unixsock.spnav_poll_events(as_array=True)
+    assert_equals(events['type'].tolist(),
+                  [spnav.SPNAV_EVENT_BUTTON, spnav.SPNAV_EVENT_BUTTON])
+    assert_equals(events['bnum'].tolist(), [3, 3])
+    assert_equals(events['press'].tolist(), [True, False])
+    assert_equals(events['x'].tolist(), [0, 0])
+
+@with_daemon
+def test_spnav_drain_array_motion(daemon):
+    daemon.send([MOTION, MOTION])
+    events = unixsock.spnav_drain(as_array=True)
+    assert_equals(len(events), 2)
+    assert_equals(events[1]['ry'], -20)
+    assert_equals(events[1]['period'], 16)
+    assert_equals(events[1]['bnum'], 0)
+
+@with_daemon
+def test_spnav_poll_events_list(daemon):
+    daemon.send([MOTION, PRESS, MOTION])
+    events = unixsock.spnav_poll_events(2, as_array=False)
+    assert_equals([e.ev_type for e in events],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+    assert_equals(len(unixsock.spnav_drain(as_array=False)), 1)
+
+@with_daemon
+def test_spnav_drain_coalesce(daemon):
+    daemon.send([MOTION, MOTION, PRESS, MOTION, RELEASE])
+    events = unixsock.spnav_drain(as_array=False,
+                                  coalesce=spnav.SPNAV_COALESCE_SUM)
+    assert_equals([e.ev_type for e in events],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON,
+                   spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+    assert_equals(events[0].translation, (-2,4,-6))
+    assert_equals(events[0].period, 32)
+
+@with_daemon
+def test_spnav_wait_event_timeout(daemon):
+    assert unixsock.spnav_wait_event(timeout=0.01) is None
+    assert unixsock.spnav_wait_events(timeout=0.01) is None
+
+@with_daemon
+def test_spnav_wait_events(daemon):
+    daemon.send([MOTION, PRESS])
+    events = unixsock.spnav_wait_events(timeout=1.0, as_array=False)
+    assert_equals(len(events), 2)
+
+@with_daemon
+def test_spnav_event_timestamps(daemon):
+    before = time.monotonic_ns()
+    daemon.send([MOTION])
+    first = unixsock.spnav_wait_event()
+    daemon.send([PRESS, MOTION])
+    unixsock.spnav_wait_event(timeout=1.0)
+    events = unixsock.spnav_drain(as_array=True)
+    assert before <= first.timestamp <= events['timestamp'][0]
+    assert events['timestamp'][0] <= time.monotonic_ns()
+
+@with_daemon
+def test_spnav_stats(daemon):
+    stats = unixsock.spnav_stats()
+    daemon.send([MOTION, MOTION, PRESS])
+    for i in range(3):
+        unixsock.spnav_wait_event()
+    daemon.send([MOTION, RELEASE])
+    unixsock.spnav_wait_events(timeout=1.0, max_events=1)
+    assert_equals(unixsock.spnav_remove_events(spnav.SPNAV_EVENT_ANY), 1)
+    result = stats.as_dict()
+    assert_equals(result['received'], 5)
+    assert_equals(result['delivered'], 4)
+    assert_equals(result['removed'], 1)
+    assert_equals(result['latency_ns']['count'], 4)
+    assert_equals(result['inter_arrival_ns']['count'], 4)
+    assert unixsock.spnav_stats() is stats
+    assert unixsock.spnav_stats(False) is None
@@ -0,0 +1,97 @@
+from nose.tools import raises, assert_equals
+import select
+import spnav
+from spnav import unixsock
+from spnav.views import EventViews
+from util import *
+
+def arrive(daemon, *packets):
+    daemon.send(packets)
+    select.select([unixsock.spnav_fd()], [], [], 1.0)
+
+def make_views(*packets):
+    data = b''.join(unixsock.packet.pack(*p) for p in packets)
+    return EventViews(bytearray(data), 0, len(packets), 5)
+
+def test_view_fields():
+    views = make_views(MOTION, PRESS, RELEASE)
+    assert_equals(len(views), 3)
+    motion = views[0]
+    assert_equals(motion.ev_type, spnav.SPNAV_EVENT_MOTION)
+    assert_equals(tuple(motion.translation), (-1, 2, -3))
+    assert_equals(motion.rotation.tolist(), [10, -20, 30])
+    assert_equals((motion.period, motion.timestamp), (16, 5))
+    button = views[-2]
+    assert_equals(button.ev_type, spnav.SPNAV_EVENT_BUTTON)
+    assert_equals((button.bnum, button.press), (3, True))
+    assert not views[2].press
+    assert_equals(list(views.codes), [unixsock.UEV_MOTION,
+                                      unixsock.UEV_PRESS,
+                                      unixsock.UEV_RELEASE])
+
+@raises(IndexError)
+def test_view_index_range():
+    make_views(MOTION)[1]
+
+def test_views_are_zero_copy():
+    data = bytearray(unixsock.packet.pack(*MOTION))
+    view = EventViews(data, 0, 1)[0]
+    rotation = view.rotation
+    unixsock.packet.pack_into(data, 0, 0, 1, 2, 3, 4, 5, 6, 7)
+    assert_equals(tuple(rotation), (4, 5, 6))
+
+def test_copy_detaches():
+    data = bytearray(unixsock.packet.pack(*MOTION) * 2)
+    views = EventViews(data, 0, 2, [1, 2])
+    view_copy = views[1].copy()
+    batch_copy = views.copy()
+    data[:] = bytes(len(data))
+    assert_equals(tuple(view_copy.translation), (-1, 2, -3))
+    assert_equals(view_copy.timestamp, 2)
+    assert_equals(tuple(batch_copy[0].rotation), (10, -20, 30))
+    assert_equals(batch_copy[1].timestamp, 2)
+
+def test_freeze():
+    views = make_views(MOTION, (7, 0, 0, 0, 0, 0, 0, 0), PRESS)
+    assert views[1].ev_type is None
+    events = views.freeze()
+    assert_equals(len(events), 2)
+    assert isinstance(events[0], spnav.SpnavMotionEvent)
+    assert_equals(events[0].translation, (-1, 2, -3))
+    assert_equals(events[0].timestamp, 5)
+    assert_equals(events[1].bnum, 3)
+
+@with_daemon
+def test_poll_views(daemon):
+    arrive(daemon, MOTION, PRESS)
+    views = unixsock.spnav_poll_views()
+    assert_equals([view.ev_type for view in views],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON])
+    assert views[0].timestamp > 0
+    assert_equals(len(unixsock.spnav_poll_views()), 0)
+
+@with_daemon
+def test_poll_views_survive_later_reads(daemon):
+    arrive(daemon, MOTION, MOTION, PRESS)
+    first = unixsock.spnav_poll_views(max_events=2)
+    # Enough data to make the connection compact and grow its buffer
+    arrive(daemon, *[RELEASE] * 200)
+    rest = unixsock.spnav_poll_events(as_array=False)
+    assert_equals(len(rest), 201)
+    assert_equals(rest[0].press, True)
+    assert_equals([tuple(view.translation) for view in first],
+                  [(-1, 2, -3)] * 2)
+
+@with_daemon
+def test_empty_poll_views_kept(daemon):
+    empty = unixsock.spnav_poll_views()
+    arrive(daemon, *[RELEASE] * 200)
+    assert_equals(len(unixsock.spnav_poll_events(as_array=False)), 200)
+    assert_equals(len(empty), 0)
+
+@with_daemon
+def test_poll_views_stats(daemon):
+    stats = unixsock.spnav_stats()
+    arrive(daemon, MOTION, PRESS)
+    unixsock.spnav_poll_views()
+    assert_equals(stats.delivered, 2)
@@ -1,22 +1,40 @@
 from nose.tools import raises, assert_equals
 from util import *
 import spnav
-from ctypes import pythonapi, c_void_p, py_object
-pythonapi.PyCObject_FromVoidPtr.restype = py_object
-pythonapi.PyCObject_FromVoidPtr.argtypes = [c_void_p, c_void_p]
+from ctypes import pythonapi, c_char_p, c_void_p, py_object
+pythonapi.PyCapsule_New.restype = py_object
+pythonapi.PyCapsule_New.argtypes = [c_void_p, c_char_p, c_void_p]
 
-def create_dummy_pycobject():
-    return pythonapi.PyCObject_FromVoidPtr(0,0)
+DISPLAY = 0x1234
+
+def create_dummy_capsule(name=b'display'):
+    return pythonapi.PyCapsule_New(DISPLAY, name, None)
 
 def test_spnav_x11_open_success():
     m = mock_libspnav({'spnav_x11_open' : 0 })
-    spnav.spnav_x11_open(create_dummy_pycobject(), 0)
+    spnav.spnav_x11_open(create_dummy_capsule(), 0)
     assert m.spnav_x11_open.called
+    assert_equals(m.spnav_x11_open.call_args[0], (DISPLAY, 0))
+
+def test_spnav_x11_open_unnamed_capsule():
+    m = mock_libspnav({'spnav_x11_open' : 0 })
+    spnav.spnav_x11_open(create_dummy_capsule(None), 7)
+    assert_equals(m.spnav_x11_open.call_args[0], (DISPLAY, 7))
+
+def test_spnav_x11_open_address():
+    m = mock_libspnav({'spnav_x11_open' : 0 })
+    spnav.spnav_x11_open(DISPLAY, 0)
+    assert_equals(m.spnav_x11_open.call_args[0], (DISPLAY, 0))
+
+@raises(spnav.SpnavException)
+def test_spnav_x11_open_bad_display():
+    m = mock_libspnav({'spnav_x11_open' : 0 })
+    spnav.spnav_x11_open('display', 0)
 
 @raises(spnav.SpnavConnectionException)
 def test_spnav_x11_open_fail():
     m = mock_libspnav({'spnav_x11_open' : -1 })
-    spnav.spnav_x11_open(create_dummy_pycobject(),0)
+    spnav.spnav_x11_open(create_dummy_capsule(),0)
 
 def test_spnav_x11_window():
     m = mock_libspnav({'spnav_x11_window' : 0 })
@@ -33,7 +51,7 @@ def test_spnav_x11_event_motion():
         fill_motion_event(event)
         return 1
     m = mock_libspnav({'spnav_x11_event' : motion })
-    event = spnav.spnav_x11_event(create_dummy_pycobject())
+    event = spnav.spnav_x11_event(create_dummy_capsule())
     assert event is not None
     assert_equals(event.translation, (-1,2,-3))
     assert_equals(event.rotation, (10,-20,30))
@@ -43,7 +61,86 @@ def test_spnav_x11_event_button():
         fill_button_event(event)
         return 1
     m = mock_libspnav({'spnav_x11_event' : button })
-    event = spnav.spnav_x11_event(create_dummy_pycobject())
+    event = spnav.spnav_x11_event(create_dummy_capsule())
     assert event is not None
     assert_equals(event.bnum, 0)
     assert_equals(event.press, True)
+
+class SysWMEvent(object):
+    '''Stands in for a Pygame SYSWMEVENT.'''
+    def __init__(self, event):
+        self.event = event
+
+def x11_events(xevent, event):
+    if xevent == b'motion':
+        fill_motion_event(event)
+    elif xevent == b'button':
+        fill_button_event(event)
+    else:
+        return 0
+    return 1
+
+def test_spnav_x11_events():
+    m = mock_libspnav({'spnav_x11_event' : x11_events })
+    xevents = [SysWMEvent(b'motion'), SysWMEvent(b'other'),
+               SysWMEvent(b'button'), b'motion', b'motion']
+    events = spnav.spnav_x11_events(xevents)
+    assert_equals([event.ev_type for event in events],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON,
+                   spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_MOTION])
+    assert_equals(events[0].rotation, (10,-20,30))
+    assert_equals(events[1].bnum, 0)
+    assert events[0].timestamp == events[3].timestamp is not None
+
+def test_spnav_x11_events_coalesce():
+    m = mock_libspnav({'spnav_x11_event' : x11_events })
+    events = spnav.spnav_x11_events([b'motion', b'motion', b'button',
+                                     b'motion', b'motion'],
+                                    coalesce=spnav.SPNAV_COALESCE_LATEST)
+    assert_equals([event.ev_type for event in events],
+                  [spnav.SPNAV_EVENT_MOTION, spnav.SPNAV_EVENT_BUTTON,
+                   spnav.SPNAV_EVENT_MOTION])
+    assert_equals(events[2].translation, (-1,2,-3))
+
+def test_spnav_x11_events_array():
+    if spnav.numpy is None:
+        return
+    m = mock_libspnav({'spnav_x11_event' : x11_events })
+    events = spnav.spnav_x11_events([b'button', b'motion'], as_array=True)
+    assert_equals(list(events['type']),
+                  [spnav.SPNAV_EVENT_BUTTON, spnav.SPNAV_EVENT_MOTION])
+    assert_equals(events[1]['rz'], 30)
+
+def test_spnav_x11_events_empty():
+    m = mock_libspnav({'spnav_x11_event' : x11_events })
+    assert_equals(spnav.spnav_x11_events([b'other']), [])
+
+def x11_open(methods):
+    methods = dict(methods, spnav_x11_open=0, spnav_fd=-1)
+    m = mock_libspnav(methods)
+    spnav.spnav_x11_open(DISPLAY, 0)
+    return m
+
+def test_spnav_wait_event_x11():
+    def motion(event):
+        fill_motion_event(event)
+        return 1
+    m = x11_open({'spnav_wait_event' : motion })
+    event = spnav.spnav_wait_event()
+    assert_equals(event.translation, (-1,2,-3))
+    assert m.spnav_wait_event.called
+
+def test_spnav_wait_events_x11():
+    def button(event):
+        fill_button_event(event)
+        return 1
+    m = x11_open({'spnav_wait_event' : button,
+                  'spnav_poll_event' : queued_events(fill_motion_event) })
+    events = spnav.spnav_wait_events(as_array=False)
+    assert_equals([event.ev_type for event in events],
+                  [spnav.SPNAV_EVENT_BUTTON, spnav.SPNAV_EVENT_MOTION])
+
+@raises(spnav.SpnavWaitException)
+def test_spnav_wait_event_x11_timeout():
+    x11_open({})
+    spnav.spnav_wait_event(timeout=0.01)
@@ -1,6 +1,8 @@
 import mock
 import spnav
 import ctypes
+from spnav import unixsock
+from spnav.testing import FakeDaemon
 
 def mock_libspnav(methods):
     '''Replace spnav.libspnav with a mock object containing the supplied method
@@ -22,8 +24,20 @@ def mock_libspnav(methods):
         else:
             mock_method.return_value = value
     spnav.libspnav = m
+    spnav._x11 = False
     return m
 
+def queued_events(*fills):
+    '''Returns a mock spnav_poll_event that delivers one event per
+    fill function, then reports an empty queue.'''
+    fills = list(fills)
+    def poll(event):
+        if not fills:
+            return 0
+        fills.pop(0)(event)
+        return 1
+    return poll
+
 def fill_button_event(event_ref):
     event = event_ref.contents
     event.type = spnav.SPNAV_EVENT_BUTTON
@@ -40,3 +54,21 @@ def fill_motion_event(event_ref):
     event.motion.ry = -20
     event.motion.rz = 30
     event.motion.period = 0
+
+MOTION = (unixsock.UEV_MOTION, -1, 2, -3, 10, -20, 30, 16)
+PRESS = (unixsock.UEV_PRESS, 3, 0, 0, 0, 0, 0, 0)
+RELEASE = (unixsock.UEV_RELEASE, 3, 0, 0, 0, 0, 0, 0)
+
+def with_daemon(test):
+    '''Runs the test with a ``FakeDaemon`` and the ``spnav.unixsock``
+    connection to it.'''
+    def wrapper():
+        with FakeDaemon() as daemon:
+            unixsock.spnav_open(daemon.path)
+            daemon.wait_for_clients(1)
+            try:
+                test(daemon)
+            finally:
+                unixsock.spnav_close()
+    wrapper.__name__ = test.__name__
+    return wrapper